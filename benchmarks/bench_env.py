@@ -0,0 +1,324 @@
+"""Throughput benchmark for GenericPyBoyEnv across vec-env backends.
+
+For every backend it measures:
+
+- env steps/sec and emulator frames/sec (steps x frame_skip)
+- resets/sec
+- per-step latency percentiles (p50/p90/p99 of one step of all envs, in microseconds)
+- resident memory per env (RSS growth of this process for in-process backends,
+  RSS of the worker processes for subprocess backends; Linux only)
+
+Backends: ``single`` (one env, no vec env), ``dummy`` (SB3 DummyVecEnv),
+``subproc`` (SB3 SubprocVecEnv) and ``batched-pipe`` / ``batched-shm``
+(``env.batched_env.BatchedEnvPool``). The SB3 backends are skipped when
+Stable-Baselines3 is not installed.
+
+``--emulator dummy`` uses the DummyPyBoy from the unit tests, so it runs without
+the ROM and measures only the Python side of the env and the IPC; ``--emulator rom``
+runs PyBoy with data/MedarotKabuto.gb and data/zero_state.state. The default
+(``auto``) runs both when the ROM and state are present.
+
+Run:
+    python benchmarks/bench_env.py run --output bench.json
+    python benchmarks/bench_env.py compare baseline.json bench.json [--threshold 0.1]
+
+``compare`` exits with status 1 when any metric is worse than the baseline by more
+than the threshold (relative), so it can gate CI or a pre-merge check.
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# ensure project root is importable when running this script from benchmarks/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from env.batched_env import BatchedEnvPool  # noqa: E402
+from env.generic_env import ACTIONS, GenericPyBoyEnv  # noqa: E402
+from env.profiler import rss_bytes  # noqa: E402
+
+ROM_PATH = PROJECT_ROOT / "data" / "MedarotKabuto.gb"
+STATE_PATH = PROJECT_ROOT / "data" / "zero_state.state"
+BACKENDS = ("single", "dummy", "subproc", "batched-pipe", "batched-shm")
+EMULATORS = ("dummy", "rom")
+
+# metric name -> True if higher is better
+METRICS = {
+    "steps_per_sec": True,
+    "frames_per_sec": True,
+    "resets_per_sec": True,
+    "latency_p50_us": False,
+    "latency_p90_us": False,
+    "latency_p99_us": False,
+    "rss_per_env_bytes": False,
+}
+
+
+def make_dummy_env(state_path: str, frame_skip: int):
+    from tests.test_generic_env import DummyPyBoy
+    return GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_path, frame_skip=frame_skip)
+
+
+def make_rom_env(frame_skip: int):
+    from pyboy import PyBoy
+    pyboy = PyBoy(str(ROM_PATH), window="null")
+    return GenericPyBoyEnv(pyboy, debug=False, render_mode=False, state_path=STATE_PATH, frame_skip=frame_skip)
+
+
+def sb3_available() -> bool:
+    try:
+        import stable_baselines3  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_backend(backend: str, env_fn, num_envs: int, envs_per_worker: int):
+    """Return (vec, worker pids); ``vec`` has reset() and step(actions)."""
+    env_fns = [env_fn] * num_envs
+    if backend == "dummy":
+        from stable_baselines3.common.vec_env import DummyVecEnv
+        return DummyVecEnv(env_fns), []
+    if backend == "subproc":
+        from stable_baselines3.common.vec_env import SubprocVecEnv
+        vec = SubprocVecEnv(env_fns)
+        return vec, [p.pid for p in vec.processes]
+    transport = backend.split("-", 1)[1]
+    pool = BatchedEnvPool(env_fns, envs_per_worker=envs_per_worker, transport=transport)
+    return pool, [p.pid for p in pool.processes]
+
+
+def percentiles_us(latencies_ns):
+    p50, p90, p99 = np.percentile(np.asarray(latencies_ns, dtype=np.float64) / 1e3, [50, 90, 99])
+    return {"latency_p50_us": float(p50), "latency_p90_us": float(p90), "latency_p99_us": float(p99)}
+
+
+def bench_single(env_fn, steps: int, resets: int, frame_skip: int, seed: int = 0):
+    rss_before = rss_bytes()
+    env = env_fn()
+    env.reset()
+    rss_after = rss_bytes()
+    actions = np.random.default_rng(seed).integers(0, len(ACTIONS), size=steps).tolist()
+    latencies = np.empty(steps, dtype=np.int64)
+    clock = time.perf_counter_ns
+    start = clock()
+    for i, action in enumerate(actions):
+        t0 = clock()
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            env.reset()
+        latencies[i] = clock() - t0
+    elapsed = (clock() - start) / 1e9
+
+    start = time.perf_counter()
+    for _ in range(resets):
+        env.reset()
+    reset_elapsed = time.perf_counter() - start
+    env.close()
+
+    result = {
+        "num_envs": 1,
+        "steps_per_sec": steps / elapsed,
+        "frames_per_sec": steps * frame_skip / elapsed,
+        "resets_per_sec": resets / reset_elapsed,
+        "rss_per_env_bytes": rss_after - rss_before if rss_before is not None else None,
+    }
+    result.update(percentiles_us(latencies))
+    return result
+
+
+def bench_vec(backend: str, env_fn, num_envs: int, envs_per_worker: int, steps: int, resets: int, frame_skip: int,
+              seed: int = 0):
+    rss_before = rss_bytes()
+    vec, pids = build_backend(backend, env_fn, num_envs, envs_per_worker)
+    try:
+        vec.reset()
+        if pids:
+            worker_rss = [rss_bytes(pid) for pid in pids]
+            rss = sum(worker_rss) if None not in worker_rss else None
+        else:
+            rss_after = rss_bytes()
+            rss = rss_after - rss_before if rss_before is not None else None
+
+        # each vec step advances every env, so steps are counted in rounds of num_envs
+        rounds = max(1, steps // num_envs)
+        actions = np.random.default_rng(seed).integers(0, len(ACTIONS), size=(rounds, num_envs))
+        latencies = np.empty(rounds, dtype=np.int64)
+        clock = time.perf_counter_ns
+        start = clock()
+        for i in range(rounds):
+            t0 = clock()
+            vec.step(actions[i])
+            latencies[i] = clock() - t0
+        elapsed = (clock() - start) / 1e9
+
+        reset_rounds = max(1, resets // num_envs)
+        start = time.perf_counter()
+        for _ in range(reset_rounds):
+            vec.reset()
+        reset_elapsed = time.perf_counter() - start
+    finally:
+        vec.close()
+
+    result = {
+        "num_envs": num_envs,
+        "steps_per_sec": rounds * num_envs / elapsed,
+        "frames_per_sec": rounds * num_envs * frame_skip / elapsed,
+        "resets_per_sec": reset_rounds * num_envs / reset_elapsed,
+        "rss_per_env_bytes": rss / num_envs if rss is not None else None,
+    }
+    result.update(percentiles_us(latencies))
+    return result
+
+
+def resolve_emulators(choice: str):
+    have_rom = ROM_PATH.exists() and STATE_PATH.exists()
+    if choice == "auto":
+        return ["dummy", "rom"] if have_rom else ["dummy"]
+    if choice == "rom" and not have_rom:
+        raise SystemExit(f"--emulator rom needs {ROM_PATH} and {STATE_PATH}")
+    return [choice]
+
+
+def run(args):
+    backends = args.backends.split(",")
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        raise SystemExit(f"Unknown backends {sorted(unknown)}; choose from {BACKENDS}")
+    if not sb3_available():
+        skipped = [b for b in backends if b in ("dummy", "subproc")]
+        if skipped:
+            print(f"stable-baselines3 not installed, skipping {skipped}")
+        backends = [b for b in backends if b not in ("dummy", "subproc")]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        dummy_state = Path(tmp) / "zero_state.state"
+        dummy_state.write_bytes(b"dummy")
+        for emulator in resolve_emulators(args.emulator):
+            if emulator == "dummy":
+                env_fn = functools.partial(make_dummy_env, str(dummy_state), args.frame_skip)
+                steps, resets = args.steps, args.resets
+            else:
+                env_fn = functools.partial(make_rom_env, args.frame_skip)
+                steps, resets = args.rom_steps, args.rom_resets
+            for backend in backends:
+                if backend == "single":
+                    result = bench_single(env_fn, steps, resets, args.frame_skip, seed=args.seed)
+                else:
+                    result = bench_vec(backend, env_fn, args.num_envs, args.envs_per_worker, steps, resets,
+                                       args.frame_skip, seed=args.seed)
+                key = f"{emulator}/{backend}"
+                results[key] = result
+                print(format_result(key, result))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "num_envs": args.num_envs,
+            "envs_per_worker": args.envs_per_worker,
+            "frame_skip": args.frame_skip,
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Saved results to {args.output}")
+    return report
+
+
+def format_result(key: str, result) -> str:
+    rss = result["rss_per_env_bytes"]
+    rss_text = f"{rss / 2**20:.1f} MiB/env" if rss is not None else "n/a"
+    return (f"{key:<20} {result['steps_per_sec']:>12,.0f} steps/s {result['frames_per_sec']:>14,.0f} frames/s "
+            f"{result['resets_per_sec']:>10,.0f} resets/s  p50 {result['latency_p50_us']:.1f}us "
+            f"p99 {result['latency_p99_us']:.1f}us  {rss_text}")
+
+
+def compare_reports(baseline, current, threshold: float, metrics=None):
+    """Return (rows, regressions); rows are (key, metric, baseline, current, relative change)."""
+    rows, regressions = [], []
+    for key, base in baseline["results"].items():
+        if key not in current["results"]:
+            continue
+        cur = current["results"][key]
+        for metric, higher_is_better in METRICS.items():
+            if metrics is not None and metric not in metrics:
+                continue
+            b, c = base.get(metric), cur.get(metric)
+            if b is None or c is None or b == 0:
+                continue
+            change = (c - b) / b
+            row = (key, metric, b, c, change)
+            rows.append(row)
+            worse = -change if higher_is_better else change
+            if worse > threshold:
+                regressions.append(row)
+    return rows, regressions
+
+
+def compare(args):
+    baseline = json.loads(Path(args.baseline).read_text())
+    current = json.loads(Path(args.current).read_text())
+    metrics = args.metrics.split(",") if args.metrics else None
+    rows, regressions = compare_reports(baseline, current, args.threshold, metrics)
+    flagged = set(id(row) for row in regressions)
+    for row in rows:
+        key, metric, b, c, change = row
+        mark = "  REGRESSION" if id(row) in flagged else ""
+        print(f"{key:<20} {metric:<18} {b:>14.1f} -> {c:>14.1f} ({change:+.1%}){mark}")
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print("No regressions")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Run the benchmark and optionally save JSON results")
+    p_run.add_argument("--backends", default=",".join(BACKENDS), help=f"Comma-separated subset of {BACKENDS}")
+    p_run.add_argument("--emulator", choices=("auto",) + EMULATORS, default="auto",
+                       help="dummy (no ROM), rom (PyBoy) or auto (both when the ROM is present)")
+    p_run.add_argument("--num-envs", type=int, default=4, help="Envs for the vec backends (default: 4)")
+    p_run.add_argument("--envs-per-worker", type=int, default=2, help="Envs per worker for batched backends")
+    p_run.add_argument("--frame-skip", type=int, default=60, help="Emulator frames per step (default: 60)")
+    p_run.add_argument("--steps", type=int, default=20_000, help="Env steps per backend with the dummy emulator")
+    p_run.add_argument("--resets", type=int, default=2_000, help="Resets per backend with the dummy emulator")
+    p_run.add_argument("--rom-steps", type=int, default=2_000, help="Env steps per backend with the ROM")
+    p_run.add_argument("--rom-resets", type=int, default=100, help="Resets per backend with the ROM")
+    p_run.add_argument("--seed", type=int, default=0, help="Seed for the random action sequence")
+    p_run.add_argument("--output", "-o", default=None, help="Write results as JSON to this path")
+
+    p_cmp = sub.add_parser("compare", help="Flag regressions of a run against a stored baseline")
+    p_cmp.add_argument("baseline", help="Baseline JSON written by `run --output`")
+    p_cmp.add_argument("current", help="JSON of the run to check")
+    p_cmp.add_argument("--threshold", type=float, default=0.10,
+                       help="Relative change counted as a regression (default: 0.10)")
+    p_cmp.add_argument("--metrics", default=None,
+                       help=f"Comma-separated subset of metrics to check (default: all of {tuple(METRICS)})")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Micro-benchmark of memory allocations in GenericPyBoyEnv.step().
+
+Runs the env against the DummyPyBoy used by the unit tests (no ROM required), so
+the numbers only cover the Python side of a step: RAM reads, reward logic and
+observation building. For each mode it reports, via tracemalloc:
+
+- bytes of freshly allocated objects returned by a step (observation, info, ...)
+- mean and max peak bytes allocated during a single step (transient allocations)
+- bytes still held after N steps, per step (retained allocations)
+
+Run: python benchmarks/bench_step_alloc.py [--steps 10000]
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# ensure project root is importable when running this script from benchmarks/
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from env.generic_env import GenericPyBoyEnv  # noqa: E402
+from tests.test_generic_env import DummyPyBoy  # noqa: E402
+
+
+def measure(state_file: Path, steps: int, reuse_buffers: bool):
+    env = GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file, reuse_buffers=reuse_buffers)
+    env.reset()
+    # warm up caches (state cache, numpy internals) before measuring
+    for _ in range(100):
+        env.step(1)
+
+    tracemalloc.start()
+    peaks, returned = [], []
+    result = None
+    for _ in range(min(steps, 1000)):
+        # drop the previous result first, like a consumer that copied it into a buffer
+        result = None
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        result = env.step(1)
+        after, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        returned.append(after - before)
+    del result
+
+    start_bytes, _ = tracemalloc.get_traced_memory()
+    start_snapshot = tracemalloc.take_snapshot()
+    for _ in range(steps):
+        env.step(1)
+    end_bytes, _ = tracemalloc.get_traced_memory()
+    stats = tracemalloc.take_snapshot().compare_to(start_snapshot, "lineno")
+    tracemalloc.stop()
+    retained_blocks = sum(stat.count_diff for stat in stats)
+
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        env.step(1)
+    elapsed = time.perf_counter() - t0
+    env.close()
+    return {
+        "returned_bytes_per_step": sum(returned) / len(returned),
+        "mean_peak_bytes_per_step": sum(peaks) / len(peaks),
+        "max_peak_bytes_per_step": max(peaks),
+        "retained_bytes_per_step": (end_bytes - start_bytes) / steps,
+        "retained_blocks_per_step": retained_blocks / steps,
+        "steps_per_sec": steps / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=10_000, help="Steps measured per mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_file = Path(tmp) / "zero_state.state"
+        state_file.write_bytes(b"dummy")
+        for reuse_buffers in (False, True):
+            result = measure(state_file, args.steps, reuse_buffers)
+            mode = "reuse_buffers=True " if reuse_buffers else "reuse_buffers=False"
+            print(f"{mode}: returned {result['returned_bytes_per_step']:.0f} B/step, "
+                  f"peak {result['mean_peak_bytes_per_step']:.0f} B/step "
+                  f"(max {result['max_peak_bytes_per_step']}), "
+                  f"retained {result['retained_bytes_per_step']:.2f} B/step "
+                  f"({result['retained_blocks_per_step']:.3f} blocks/step), "
+                  f"{result['steps_per_sec']:,.0f} steps/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""Worker pool that steps blocks of environments in batches.
+
+Each worker process hosts a block of ``envs_per_worker`` environments and steps
+the whole block per command, so one message crosses the pipe per worker instead
+of one per env. Workers write observations, rewards and termination flags into
+preallocated NumPy arrays for their block and the parent copies each block into
+preallocated arrays covering all envs.
+
+With ``transport="shm"`` the block results are written straight into shared
+memory instead (see ``env.shm_transport``) and the pipe is only used for
+non-step commands and for the occasional non-empty info dict.
+
+This module only depends on gymnasium/numpy so it can be used from evaluation or
+benchmark code without pulling in Stable-Baselines3; ``env.batched_vec_env``
+wraps it as an SB3 ``VecEnv``.
+"""
+import multiprocessing as mp
+import signal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cloudpickle
+import numpy as np
+from gymnasium import Wrapper, spaces
+
+from env.shm_transport import CMD_STEP, CMD_PIPE, SharedStepBuffers
+
+TRANSPORTS = ("pipe", "shm")
+
+
+def observation_layout(space: spaces.Space) -> List[Tuple[Optional[str], Tuple[int, ...], np.dtype]]:
+    """Return (key, shape, dtype) for every array in an observation.
+
+    Dict spaces give one entry per key; any other Box-like space gives a single entry
+    with key None.
+    """
+    if isinstance(space, spaces.Dict):
+        return [(key, tuple(sub.shape), np.dtype(sub.dtype)) for key, sub in space.spaces.items()]
+    return [(None, tuple(space.shape), np.dtype(space.dtype))]
+
+
+def allocate_observations(layout, n: int) -> Dict[Optional[str], np.ndarray]:
+    return {key: np.zeros((n,) + shape, dtype=dtype) for key, shape, dtype in layout}
+
+
+def write_observation(buffers, index: int, obs):
+    for key, buf in buffers.items():
+        buf[index] = obs if key is None else obs[key]
+
+
+def read_observation(buffers, index: int):
+    """Copy one env's observation out of batched buffers (e.g. for terminal observations)."""
+    if None in buffers:
+        return buffers[None][index].copy()
+    return {key: buf[index].copy() for key, buf in buffers.items()}
+
+
+def is_wrapped(env, wrapper_class) -> bool:
+    while isinstance(env, Wrapper):
+        if isinstance(env, wrapper_class):
+            return True
+        env = env.env
+    return False
+
+
+def get_env_attr(env, name: str):
+    # gymnasium>=1.0 wrappers no longer forward attribute lookups to the inner env
+    if hasattr(env, "get_wrapper_attr"):
+        return env.get_wrapper_attr(name)
+    return getattr(env, name)
+
+
+def set_env_attr(env, name: str, value):
+    if hasattr(env, "set_wrapper_attr"):
+        env.set_wrapper_attr(name, value)
+    else:
+        setattr(env, name, value)
+
+
+class EnvBlock:
+    """A block of envs stepped together, with auto-reset following the SB3 VecEnv convention.
+
+    On episode end the final observation is stored in ``info["terminal_observation"]``
+    and the env is reset; the observation written to the block is the first one of the
+    new episode. Info dicts are left untouched on ordinary steps so that they stay empty
+    (and cheap to transport) for the common case.
+    """
+
+    def __init__(self, env_fns: Sequence[Callable]):
+        self.envs = [fn() for fn in env_fns]
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self.layout = observation_layout(self.observation_space)
+        n = len(self.envs)
+        self.obs = allocate_observations(self.layout, n)
+        self.rewards = np.zeros(n, dtype=np.float32)
+        self.terminated = np.zeros(n, dtype=bool)
+        self.truncated = np.zeros(n, dtype=bool)
+        self.infos: List[Dict[str, Any]] = [{} for _ in range(n)]
+        self.reset_infos: List[Dict[str, Any]] = [{} for _ in range(n)]
+
+    def bind(self, obs, rewards, terminated, truncated):
+        """Write results into the given arrays (e.g. shared-memory views) from now on."""
+        self.obs, self.rewards, self.terminated, self.truncated = obs, rewards, terminated, truncated
+
+    def step(self, actions):
+        for i, env in enumerate(self.envs):
+            obs, reward, terminated, truncated, info = env.step(actions[i])
+            if terminated or truncated:
+                info["TimeLimit.truncated"] = truncated and not terminated
+                info["terminal_observation"] = obs
+                obs, self.reset_infos[i] = env.reset()
+            write_observation(self.obs, i, obs)
+            self.rewards[i] = reward
+            self.terminated[i] = terminated
+            self.truncated[i] = truncated
+            self.infos[i] = info
+
+    def reset(self, seeds=None, options=None):
+        for i, env in enumerate(self.envs):
+            seed = seeds[i] if seeds is not None else None
+            opts = options[i] if options is not None else None
+            kwargs = {"options": opts} if opts else {}
+            obs, self.reset_infos[i] = env.reset(seed=seed, **kwargs)
+            write_observation(self.obs, i, obs)
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def _handle_command(block: EnvBlock, cmd: str, data):
+    """Handle the commands shared by both transports and return the reply."""
+    if cmd == "env_method":
+        name, indices, args, kwargs = data
+        return [get_env_attr(block.envs[i], name)(*args, **kwargs) for i in indices]
+    if cmd == "get_attr":
+        name, indices = data
+        return [get_env_attr(block.envs[i], name) for i in indices]
+    if cmd == "has_attr":
+        name, indices = data
+        result = []
+        for i in indices:
+            try:
+                get_env_attr(block.envs[i], name)
+                result.append(True)
+            except AttributeError:
+                result.append(False)
+        return result
+    if cmd == "set_attr":
+        name, indices, value = data
+        for i in indices:
+            set_env_attr(block.envs[i], name, value)
+        return None
+    if cmd == "is_wrapped":
+        wrapper_class, indices = data
+        return [is_wrapped(block.envs[i], wrapper_class) for i in indices]
+    raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+
+
+def build_block(env_fns_bytes: bytes) -> EnvBlock:
+    """Build an ``EnvBlock`` in a worker process from cloudpickled env factories."""
+    block = EnvBlock(cloudpickle.loads(env_fns_bytes))
+    # PyBoy's SDL window plugin installs a C-level SIGTERM handler that only queues a
+    # quit event, so Process.terminate() (used on interpreter exit for daemon workers
+    # that were never closed) would leave the parent waiting forever in join().
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    return block
+
+
+def _worker(remote, parent_remote, env_fns_bytes: bytes):
+    parent_remote.close()
+    block = build_block(env_fns_bytes)
+    # Report the spaces once the envs are built; this also tells the parent we are ready
+    remote.send((block.observation_space, block.action_space))
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                block.step(data)
+                remote.send((block.obs, block.rewards, block.terminated, block.truncated, block.infos,
+                             block.reset_infos))
+            elif cmd == "reset":
+                block.reset(*data)
+                remote.send((block.obs, block.reset_infos))
+            elif cmd == "close":
+                block.close()
+                remote.close()
+                break
+            else:
+                remote.send(_handle_command(block, cmd, data))
+        except (EOFError, KeyboardInterrupt):
+            break
+
+
+def _shm_worker(remote, parent_remote, env_fns_bytes: bytes, worker: int, start: int, stop: int, request, done):
+    parent_remote.close()
+    block = build_block(env_fns_bytes)
+    remote.send((block.observation_space, block.action_space))
+    # The parent sizes the shared-memory block from the spaces and sends back its spec
+    buffers = SharedStepBuffers.attach(remote.recv())
+    slot_views = [buffers.slot_views(slot, start, stop) for slot in range(buffers.slots)]
+    actions = buffers.actions[start:stop]
+    try:
+        while True:
+            request.acquire()
+            if buffers.command[worker] == CMD_STEP:
+                block.bind(*slot_views[buffers.slot[worker]])
+                block.step(actions)
+                has_info = any(block.infos)
+                buffers.has_info[worker] = has_info
+                # Signal completion before sending infos: a large message would otherwise
+                # block in send() while the parent is still waiting on the semaphore.
+                done.release()
+                if has_info:
+                    remote.send((block.infos, block.reset_infos))
+                continue
+
+            cmd, data = remote.recv()
+            if cmd == "reset":
+                block.bind(*slot_views[buffers.slot[worker]])
+                block.reset(*data)
+                remote.send(block.reset_infos)
+            elif cmd == "close":
+                block.close()
+                remote.close()
+                break
+            else:
+                remote.send(_handle_command(block, cmd, data))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        block.bind(None, None, None, None)
+        slot_views = actions = None
+        buffers.close()
+
+
+def default_start_method() -> str:
+    # Same choice as SB3's SubprocVecEnv: forkserver where available, else spawn.
+    return "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+
+
+class BatchedEnvPool:
+    """Step ``len(env_fns)`` envs in worker processes holding ``envs_per_worker`` envs each.
+
+    ``step_wait()`` and ``reset()`` return the pool's own preallocated arrays. With the
+    pipe transport they are overwritten by the next call, so copy anything that must
+    outlive it. With the shm transport they are views into a ring of shared-memory
+    slots and stay valid for ``shm_slots - 1`` further calls (``zero_copy`` is True).
+    """
+
+    def __init__(self, env_fns: Sequence[Callable], envs_per_worker: int = 1, start_method: Optional[str] = None,
+                 transport: str = "pipe", shm_slots: int = 2):
+        if envs_per_worker < 1:
+            raise ValueError(f"envs_per_worker must be >= 1, got {envs_per_worker}")
+        if transport not in TRANSPORTS:
+            raise ValueError(f"transport must be one of {TRANSPORTS}, got {transport!r}")
+        self.num_envs = len(env_fns)
+        self.envs_per_worker = envs_per_worker
+        self.transport = transport
+        self.zero_copy = transport == "shm"
+        # (start, stop) env index range handled by each worker
+        self.slices = [(i, min(i + envs_per_worker, self.num_envs)) for i in range(0, self.num_envs, envs_per_worker)]
+        # workers of the step in flight (all unless step_async got an ``active`` mask)
+        self._stepped = list(range(len(self.slices)))
+        self.closed = False
+        self.waiting = False
+        self.infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+        self.reset_infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+
+        ctx = mp.get_context(start_method or default_start_method())
+        self.remotes, self.processes = [], []
+        self.shm = None
+        if self.zero_copy:
+            self.requests = [ctx.Semaphore(0) for _ in self.slices]
+            self.dones = [ctx.Semaphore(0) for _ in self.slices]
+        for worker, (start, stop) in enumerate(self.slices):
+            remote, work_remote = ctx.Pipe()
+            args = (work_remote, remote, cloudpickle.dumps(list(env_fns[start:stop])))
+            if self.zero_copy:
+                target = _shm_worker
+                args += (worker, start, stop, self.requests[worker], self.dones[worker])
+            else:
+                target = _worker
+            # daemon: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=target, args=args, daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+        # Every worker reports its spaces once its envs are built
+        for remote in self.remotes:
+            self.observation_space, self.action_space = remote.recv()
+        self.layout = observation_layout(self.observation_space)
+
+        if self.zero_copy:
+            self.shm = SharedStepBuffers(self.layout, self.num_envs, len(self.slices),
+                                         action_shape=self.action_space.shape, action_dtype=self.action_space.dtype,
+                                         slots=shm_slots)
+            for remote in self.remotes:
+                remote.send(self.shm.spec())
+            self._slot = 0
+            self._slot_views = [self.shm.slot_views(slot) for slot in range(shm_slots)]
+            self.obs, self.rewards, self.terminated, self.truncated = self._slot_views[self._slot]
+        else:
+            self.obs = allocate_observations(self.layout, self.num_envs)
+            self.rewards = np.zeros(self.num_envs, dtype=np.float32)
+            self.terminated = np.zeros(self.num_envs, dtype=bool)
+            self.truncated = np.zeros(self.num_envs, dtype=bool)
+
+    def _send(self, worker: int, msg):
+        """Send a non-step command to a worker."""
+        if self.zero_copy:
+            # Ring the doorbell first: the worker only reads the pipe once it is woken up,
+            # so a large message would otherwise block here forever.
+            self.shm.command[worker] = CMD_PIPE
+            self.requests[worker].release()
+        self.remotes[worker].send(msg)
+
+    def _next_slot(self):
+        self._slot = (self._slot + 1) % self.shm.slots
+        self.shm.slot[:] = self._slot
+        self.obs, self.rewards, self.terminated, self.truncated = self._slot_views[self._slot]
+
+    def _copy_block(self, start: int, stop: int, obs):
+        for key, buf in self.obs.items():
+            buf[start:stop] = obs[key]
+
+    def step_async(self, actions, active=None):
+        """Start a step of all envs, or with ``active`` (a bool per env) only of the workers
+        hosting at least one active env.
+
+        Envs of workers left out are not stepped: they keep their last observation and
+        report a zero reward, no episode end and an empty info dict. The evaluation uses
+        this to stop envs that have run their share of episodes.
+        """
+        actions = np.asarray(actions)
+        if active is None:
+            self._stepped = list(range(len(self.slices)))
+        else:
+            active = np.asarray(active, dtype=bool)
+            self._stepped = [w for w, (start, stop) in enumerate(self.slices) if active[start:stop].any()]
+        if self.zero_copy:
+            previous_obs = self.obs
+            self._next_slot()
+            self.shm.actions[:] = actions
+            for worker in self._stepped:
+                self.shm.command[worker] = CMD_STEP
+                self.requests[worker].release()
+            if len(self._stepped) < len(self.slices):
+                # the new slot holds older results; carry the idle envs' observations over
+                for worker in set(range(len(self.slices))) - set(self._stepped):
+                    start, stop = self.slices[worker]
+                    for key, buf in self.obs.items():
+                        buf[start:stop] = previous_obs[key][start:stop]
+        else:
+            for worker in self._stepped:
+                start, stop = self.slices[worker]
+                self.remotes[worker].send(("step", actions[start:stop]))
+        self.waiting = True
+
+    def _clear_idle(self):
+        # results of the envs whose workers were not stepped
+        if len(self._stepped) == len(self.slices):
+            return
+        for worker in set(range(len(self.slices))) - set(self._stepped):
+            start, stop = self.slices[worker]
+            self.rewards[start:stop] = 0.0
+            self.terminated[start:stop] = False
+            self.truncated[start:stop] = False
+            self.infos[start:stop] = [{} for _ in range(stop - start)]
+
+    def step_wait(self):
+        if self.zero_copy:
+            for worker in self._stepped:
+                start, stop = self.slices[worker]
+                self.dones[worker].acquire()
+                if self.shm.has_info[worker]:
+                    self.infos[start:stop], self.reset_infos[start:stop] = self.remotes[worker].recv()
+                else:
+                    self.infos[start:stop] = [{} for _ in range(stop - start)]
+            self._clear_idle()
+            self.waiting = False
+            return self.obs, self.rewards, self.terminated, self.truncated, self.infos
+
+        for worker in self._stepped:
+            start, stop = self.slices[worker]
+            obs, rewards, terminated, truncated, infos, reset_infos = self.remotes[worker].recv()
+            self._copy_block(start, stop, obs)
+            self.rewards[start:stop] = rewards
+            self.terminated[start:stop] = terminated
+            self.truncated[start:stop] = truncated
+            self.infos[start:stop] = infos
+            self.reset_infos[start:stop] = reset_infos
+        self._clear_idle()
+        self.waiting = False
+        return self.obs, self.rewards, self.terminated, self.truncated, self.infos
+
+    def step(self, actions, active=None):
+        self.step_async(actions, active)
+        return self.step_wait()
+
+    def reset(self, seeds=None, options=None):
+        if self.zero_copy:
+            self._next_slot()
+        for worker, (start, stop) in enumerate(self.slices):
+            block_seeds = seeds[start:stop] if seeds is not None else None
+            block_options = options[start:stop] if options is not None else None
+            self._send(worker, ("reset", (block_seeds, block_options)))
+        for remote, (start, stop) in zip(self.remotes, self.slices):
+            if self.zero_copy:
+                self.reset_infos[start:stop] = remote.recv()
+            else:
+                obs, reset_infos = remote.recv()
+                self._copy_block(start, stop, obs)
+                self.reset_infos[start:stop] = reset_infos
+        return self.obs
+
+    def _indices_by_worker(self, indices):
+        """Group global env indices into (worker, local indices) pairs."""
+        if indices is None:
+            indices = range(self.num_envs)
+        elif isinstance(indices, int):
+            indices = [indices]
+        grouped: Dict[int, List[int]] = {}
+        for i in indices:
+            grouped.setdefault(i // self.envs_per_worker, []).append(i % self.envs_per_worker)
+        return grouped.items()
+
+    def _call(self, cmd: str, make_data, indices) -> List[Any]:
+        grouped = list(self._indices_by_worker(indices))
+        for worker, local in grouped:
+            self._send(worker, (cmd, make_data(local)))
+        results = []
+        for worker, _ in grouped:
+            results.extend(self.remotes[worker].recv())
+        return results
+
+    def get_attr(self, name: str, indices=None) -> List[Any]:
+        return self._call("get_attr", lambda local: (name, local), indices)
+
+    def has_attr(self, name: str, indices=None) -> List[bool]:
+        return self._call("has_attr", lambda local: (name, local), indices)
+
+    def set_attr(self, name: str, value, indices=None):
+        for worker, local in self._indices_by_worker(indices):
+            self._send(worker, ("set_attr", (name, local, value)))
+            self.remotes[worker].recv()
+
+    def env_method(self, name: str, *args, indices=None, **kwargs) -> List[Any]:
+        return self._call("env_method", lambda local: (name, local, args, kwargs), indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return self._call("is_wrapped", lambda local: (wrapper_class, local), indices)
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self.step_wait()
+        for worker in range(len(self.remotes)):
+            self._send(worker, ("close", None))
+        for process in self.processes:
+            process.join()
+        if self.shm is not None:
+            self.obs = self.rewards = self.terminated = self.truncated = None
+            self._slot_views = []
+            self.shm.close()
+        self.closed = True
@@ -0,0 +1,69 @@
+"""Stable-Baselines3 ``VecEnv`` over ``BatchedEnvPool``.
+
+``SubprocVecEnv`` runs one env per process and pickles every observation, reward
+and info dict separately. ``BatchedVecEnv`` instead hosts ``envs_per_worker``
+envs per worker process and moves each block's results as a few NumPy arrays,
+so dozens of emulators can run on one machine without IPC dominating.
+
+``transport="shm"`` moves step results through shared memory instead of the
+pipe; the observations are then returned without any copy.
+"""
+from typing import Callable, Sequence
+
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from env.batched_env import BatchedEnvPool
+
+
+class BatchedVecEnv(VecEnv):
+    def __init__(self, env_fns: Sequence[Callable], envs_per_worker: int = 1, start_method: str = None,
+                 transport: str = "pipe"):
+        self.pool = BatchedEnvPool(env_fns, envs_per_worker=envs_per_worker, start_method=start_method,
+                                   transport=transport)
+        super().__init__(len(env_fns), self.pool.observation_space, self.pool.action_space)
+
+    def _obs_copy(self, obs):
+        # The pipe transport reuses its buffers on every step while SB3 keeps the previous
+        # observation around (model._last_obs), so hand out copies. Shared-memory results
+        # live in a ring of slots and stay valid for the next step already.
+        if self.pool.zero_copy:
+            return obs[None] if None in obs else dict(obs)
+        if None in obs:
+            return obs[None].copy()
+        return {key: buf.copy() for key, buf in obs.items()}
+
+    def step_async(self, actions: np.ndarray):
+        self.pool.step_async(actions)
+
+    def step_wait(self):
+        obs, rewards, terminated, truncated, infos = self.pool.step_wait()
+        self.reset_infos = list(self.pool.reset_infos)
+        rewards = rewards if self.pool.zero_copy else rewards.copy()
+        return self._obs_copy(obs), rewards, terminated | truncated, list(infos)
+
+    def reset(self):
+        obs = self.pool.reset(self._seeds, self._options)
+        self.reset_infos = list(self.pool.reset_infos)
+        # Seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs_copy(obs)
+
+    def close(self):
+        self.pool.close()
+
+    def get_attr(self, attr_name: str, indices=None):
+        return self.pool.get_attr(attr_name, indices)
+
+    def has_attr(self, attr_name: str) -> bool:
+        return all(self.pool.has_attr(attr_name))
+
+    def set_attr(self, attr_name: str, value, indices=None):
+        self.pool.set_attr(attr_name, value, indices)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs):
+        return self.pool.env_method(method_name, *method_args, indices=indices, **method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return self.pool.env_is_wrapped(wrapper_class, indices)
@@ -0,0 +1,151 @@
+"""Append-only columnar log files with a background writer thread.
+
+A log is a directory holding one raw binary file per column (``<name>.bin``)
+plus ``schema.json`` with the column names and dtypes. Rows are appended to
+preallocated in-memory chunks on the caller's thread; full chunks are handed
+to a writer thread that appends them to the column files, so logging does not
+wait for disk I/O. At most ``max_pending`` full chunks queue up for the writer;
+only when the disk falls that far behind does ``append`` block until a chunk is
+written, which keeps memory bounded. Because every column file is a flat array of a fixed dtype,
+``ColumnarReader`` can memory-map columns and read them lazily in chunks.
+"""
+import json
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+SCHEMA_FILE = "schema.json"
+
+
+class ColumnarWriter:
+    """Append rows of ``columns`` (a sequence of (name, dtype)) to the log in ``directory``.
+
+    An existing log with the same schema is appended to.
+    """
+
+    def __init__(self, directory, columns: Sequence[Tuple[str, object]], chunk_rows: int = 65_536,
+                 max_pending: int = 8):
+        if max_pending < 1:
+            raise ValueError(f"max_pending must be >= 1, got {max_pending}")
+        self.directory = Path(directory)
+        self.columns = [(name, np.dtype(dtype)) for name, dtype in columns]
+        self.names = [name for name, _ in self.columns]
+        self.chunk_rows = chunk_rows
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        schema = {"columns": [[name, dtype.str] for name, dtype in self.columns]}
+        schema_path = self.directory / SCHEMA_FILE
+        if schema_path.exists():
+            existing = json.loads(schema_path.read_text())
+            if existing != schema:
+                raise ValueError(f"{self.directory} already holds a log with a different schema: {existing}")
+        else:
+            schema_path.write_text(json.dumps(schema))
+
+        self._files = {name: open(self.directory / f"{name}.bin", "ab") for name in self.names}
+        self._free: "queue.SimpleQueue[Dict[str, np.ndarray]]" = queue.SimpleQueue()
+        # bounded: flush() blocks once max_pending chunks wait for the writer thread
+        self._pending: "queue.Queue[Optional[Tuple[Dict[str, np.ndarray], int]]]" = queue.Queue(maxsize=max_pending)
+        self._chunk = self._new_chunk()
+        self._rows = 0
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name=f"columnar-writer-{self.directory.name}", daemon=True)
+        self._thread.start()
+        self.closed = False
+
+    def _new_chunk(self) -> Dict[str, np.ndarray]:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return {name: np.empty(self.chunk_rows, dtype=dtype) for name, dtype in self.columns}
+
+    def append(self, *values):
+        """Append one row; values are given in column order."""
+        chunk, row = self._chunk, self._rows
+        for name, value in zip(self.names, values):
+            chunk[name][row] = value
+        self._rows = row + 1
+        if self._rows == self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Hand the rows buffered so far to the writer thread."""
+        if self._error is not None:
+            raise RuntimeError("Columnar writer thread failed") from self._error
+        if self._rows:
+            self._pending.put((self._chunk, self._rows))
+            self._chunk = self._new_chunk()
+            self._rows = 0
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            chunk, rows = item
+            try:
+                for name in self.names:
+                    self._files[name].write(chunk[name][:rows].tobytes())
+                    self._files[name].flush()
+            except BaseException as e:  # surfaced on the next flush()/close()
+                self._error = e
+            self._free.put(chunk)
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self._pending.put(None)
+        self._thread.join()
+        for f in self._files.values():
+            f.close()
+        self.closed = True
+        if self._error is not None:
+            raise RuntimeError("Columnar writer thread failed") from self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ColumnarReader:
+    """Lazy reader for a log written by ``ColumnarWriter``."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        schema = json.loads((self.directory / SCHEMA_FILE).read_text())
+        self.columns = [(name, np.dtype(dtype)) for name, dtype in schema["columns"]]
+        self.names = [name for name, _ in self.columns]
+        # a writer may still be appending; only rows complete in every column are visible
+        sizes = []
+        for name, dtype in self.columns:
+            path = self.directory / f"{name}.bin"
+            sizes.append(path.stat().st_size // dtype.itemsize if path.exists() else 0)
+        self.num_rows = min(sizes) if sizes else 0
+
+    @staticmethod
+    def is_log(path) -> bool:
+        return (Path(path) / SCHEMA_FILE).exists()
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped view of one column."""
+        dtype = dict(self.columns)[name]
+        if self.num_rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.directory / f"{name}.bin", dtype=dtype, mode="r", shape=(self.num_rows,))
+
+    def iter_chunks(self, names: Optional[Sequence[str]] = None, chunk_rows: int = 1_000_000
+                    ) -> Iterator[Dict[str, np.ndarray]]:
+        """Yield dicts of column slices with at most ``chunk_rows`` rows each."""
+        names = list(names) if names is not None else self.names
+        maps = {name: self.column(name) for name in names}
+        for start in range(0, self.num_rows, chunk_rows):
+            yield {name: np.asarray(col[start:start + chunk_rows]) for name, col in maps.items()}
+
+    def __len__(self) -> int:
+        return self.num_rows
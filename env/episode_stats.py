@@ -0,0 +1,112 @@
+"""Episode statistics gathered in the training process instead of per-env CSV files.
+
+``EpisodeStatsWrapper`` replaces Stable-Baselines3's ``Monitor`` around a
+``GenericPyBoyEnv``. It does no file I/O: at the end of an episode it puts a
+summary into ``info["episode"]``, which travels back to the training process with
+the other step results of any vec env. Besides the ``r``/``l``/``t`` keys that
+SB3 reads for ``rollout/ep_rew_mean`` and ``ep_len_mean``, the summary holds the
+number of visited maps and positions and whether the target was reached.
+
+``EpisodeStatsAggregator`` lives in the training process: it appends every
+summary as a row of a ``env.columnar.ColumnarWriter`` log (one writer for all
+envs, written in batches on a background thread) and keeps rolling means over
+the last ``window`` episodes. ``training.callbacks.EpisodeStatsCallback`` feeds
+it from the vec env's infos and logs the means to TensorBoard.
+"""
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+from gymnasium import Wrapper
+
+from env.columnar import ColumnarWriter
+
+EPISODE_COLUMNS = (
+    ("timestep", np.int64),
+    ("env", np.uint16),
+    ("return", np.float32),
+    ("length", np.uint32),
+    ("maps", np.uint16),
+    ("positions", np.uint32),
+    ("target", np.uint8),
+    ("time", np.float32),
+)
+
+
+class EpisodeStatsWrapper(Wrapper):
+    """Summarize each episode into ``info["episode"]`` (SB3 ``Monitor`` format plus
+    ``maps``, ``positions`` and ``target``)."""
+
+    def __init__(self, env):
+        super().__init__(env)
+        self.t_start = time.time()
+        self.episode_return = 0.0
+        self.episode_length = 0
+
+    def reset(self, **kwargs):
+        self.episode_return = 0.0
+        self.episode_length = 0
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.episode_return += float(reward)
+        self.episode_length += 1
+        if terminated or truncated:
+            exploration = self.env.unwrapped.exploration
+            info["episode"] = {
+                "r": round(self.episode_return, 6),
+                "l": self.episode_length,
+                "t": round(time.time() - self.t_start, 6),
+                "maps": exploration.num_maps,
+                "positions": exploration.num_positions,
+                # the env only terminates when it reaches the target
+                "target": bool(terminated),
+            }
+        return obs, reward, terminated, truncated, info
+
+
+class EpisodeStatsAggregator:
+    """Collect episode summaries from all envs into one columnar log in ``directory``
+    and keep rolling means over the last ``window`` episodes.
+
+    Rows are buffered in memory and handed to the writer thread by ``flush()`` (or
+    whenever ``chunk_rows`` are buffered). Without ``directory`` nothing is written.
+    """
+
+    def __init__(self, directory=None, window: int = 100, chunk_rows: int = 4096):
+        self.writer = ColumnarWriter(directory, EPISODE_COLUMNS, chunk_rows=chunk_rows) if directory else None
+        self.recent = deque(maxlen=window)
+        self.episodes = 0
+
+    def add(self, episode: Dict, timestep: int = 0, env_index: int = 0):
+        """Record one ``info["episode"]`` summary."""
+        row = (float(episode["r"]), int(episode["l"]), int(episode.get("maps", 0)),
+               int(episode.get("positions", 0)), bool(episode.get("target", False)))
+        self.recent.append(row)
+        self.episodes += 1
+        if self.writer is not None:
+            self.writer.append(timestep, env_index, *row, episode.get("t", 0.0))
+
+    def summary(self) -> Optional[Dict[str, float]]:
+        """Means over the recent episodes, or None before the first one."""
+        if not self.recent:
+            return None
+        returns, lengths, maps, positions, target = np.asarray(self.recent, dtype=np.float64).T
+        return {
+            "return_mean": float(returns.mean()),
+            "return_max": float(returns.max()),
+            "length_mean": float(lengths.mean()),
+            "maps_mean": float(maps.mean()),
+            "positions_mean": float(positions.mean()),
+            "target_rate": float(target.mean()),
+        }
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
@@ -0,0 +1,121 @@
+"""Fixed-size bit arrays tracking which maps and positions an episode has visited.
+
+Python sets of position tuples grow without bound over long episodes and are
+expensive to clear. ``ExplorationTracker`` keeps one bit per map and one bit per
+(map_id, x, y, orientation) cell in preallocated NumPy arrays instead: visiting
+and testing a cell is O(1), memory per env stays flat, and ``reset()`` only
+zeroes the rows of maps that were actually visited.
+
+The position array covers the whole byte range of map_id, x and y (8 MiB with
+the default 2 orientation bits). It is allocated with ``np.zeros``, so the OS only
+backs the pages of maps that get visited.
+"""
+import numpy as np
+
+
+class ExplorationTracker:
+    """Visited maps and positions of one env.
+
+    Only the low ``orientation_bits`` bits of the orientation byte are used; the
+    game only uses values 0-3 for the player's facing direction.
+    """
+
+    def __init__(self, orientation_bits: int = 2):
+        if not 0 <= orientation_bits <= 8:
+            raise ValueError(f"orientation_bits must be in [0, 8], got {orientation_bits}")
+        self.orientation_bits = orientation_bits
+        self._orientation_mask = (1 << orientation_bits) - 1
+        # bytes per map row: 256 x * 256 y * 2**orientation_bits cells, one bit each
+        self.row_bytes = (256 * 256 << orientation_bits) // 8
+        self.map_bits = np.zeros(256 // 8, dtype=np.uint8)
+        self.position_bits = np.zeros((256, self.row_bytes), dtype=np.uint8)
+        # number of visited positions per map, kept up to date by visit()
+        self.position_counts = np.zeros(256, dtype=np.int64)
+        # memoryviews index to plain ints, which is much cheaper than NumPy scalars
+        self._maps = memoryview(self.map_bits)
+        self._positions = memoryview(self.position_bits.reshape(-1))
+        self._counts = memoryview(self.position_counts)
+
+    def _cell(self, x: int, y: int, map_id: int, orientation: int):
+        bit = (((x << 8) | y) << self.orientation_bits) | (orientation & self._orientation_mask)
+        return map_id * self.row_bytes + (bit >> 3), 1 << (bit & 7)
+
+    def visit_map(self, map_id: int) -> bool:
+        """Mark ``map_id`` as visited; returns True if it was not visited before."""
+        byte, mask = map_id >> 3, 1 << (map_id & 7)
+        current = self._maps[byte]
+        if current & mask:
+            return False
+        self._maps[byte] = current | mask
+        return True
+
+    def visit(self, x: int, y: int, map_id: int, orientation: int) -> bool:
+        """Mark a position (and its map) as visited; returns True if the position is new."""
+        self.visit_map(map_id)
+        byte, mask = self._cell(x, y, map_id, orientation)
+        current = self._positions[byte]
+        if current & mask:
+            return False
+        self._positions[byte] = current | mask
+        self._counts[map_id] += 1
+        return True
+
+    def has_visited_map(self, map_id: int) -> bool:
+        return bool(self._maps[map_id >> 3] & (1 << (map_id & 7)))
+
+    def has_visited(self, x: int, y: int, map_id: int, orientation: int) -> bool:
+        byte, mask = self._cell(x, y, map_id, orientation)
+        return bool(self._positions[byte] & mask)
+
+    def maps(self) -> np.ndarray:
+        """Ids of the visited maps."""
+        return np.flatnonzero(np.unpackbits(self.map_bits, bitorder="little"))
+
+    def positions(self):
+        """Visited positions as (x, y, map_id, orientation) tuples."""
+        result = []
+        for map_id in self.maps().tolist():
+            cells = np.flatnonzero(np.unpackbits(self.position_bits[map_id], bitorder="little"))
+            orientation = cells & self._orientation_mask
+            xy = cells >> self.orientation_bits
+            for x, y, o in zip((xy >> 8).tolist(), (xy & 0xFF).tolist(), orientation.tolist()):
+                result.append((x, y, map_id, o))
+        return result
+
+    def coverage(self):
+        """Number of visited positions per visited map, as {map_id: count}."""
+        return {map_id: int(self.position_counts[map_id]) for map_id in self.maps().tolist()}
+
+    @property
+    def num_maps(self) -> int:
+        return int(np.unpackbits(self.map_bits).sum())
+
+    @property
+    def num_positions(self) -> int:
+        return int(self.position_counts.sum())
+
+    def get_state(self) -> dict:
+        """Picklable copy of the visited bits; only the rows of visited maps are included."""
+        return {
+            "orientation_bits": self.orientation_bits,
+            "map_bits": self.map_bits.tobytes(),
+            "rows": {map_id: self.position_bits[map_id].tobytes() for map_id in self.maps().tolist()},
+        }
+
+    def set_state(self, state: dict):
+        """Restore bits saved by ``get_state()`` from a tracker with the same ``orientation_bits``."""
+        if state["orientation_bits"] != self.orientation_bits:
+            raise ValueError(f"Cannot restore a tracker with orientation_bits={state['orientation_bits']} "
+                             f"into one with orientation_bits={self.orientation_bits}")
+        self.reset()
+        self.map_bits[:] = np.frombuffer(state["map_bits"], dtype=np.uint8)
+        for map_id, row in state["rows"].items():
+            self.position_bits[map_id] = np.frombuffer(row, dtype=np.uint8)
+            self.position_counts[map_id] = int(np.unpackbits(self.position_bits[map_id]).sum())
+
+    def reset(self):
+        # Only rows of visited maps can have bits set
+        for map_id in self.maps().tolist():
+            self.position_bits[map_id] = 0
+            self.position_counts[map_id] = 0
+        self.map_bits[:] = 0
@@ -1,8 +1,19 @@
+from io import BytesIO
 from pathlib import Path
+from time import perf_counter_ns
+from typing import Callable, Optional
 import numpy as np
 from gymnasium import Env, spaces
 from gymnasium.spaces import Box, Dict
 
+from env.exploration import ExplorationTracker
+from env.profiler import STEP_PHASES, PhaseProfiler
+from env.ram_schema import OBSERVATION_FIELDS, RAM_FIELDS, RamExtractor
+from env.screen import ScreenStack
+from env.snapshot_pool import SnapshotPool
+from env.state_cache import SHARED_STATE_CACHE, StateCache
+from env.transition_cache import Transition, TransitionCache
+
 
 # Action mapping used by PyBoy; these strings correspond to PyBoy.button() names
 ACTIONS = ["a", "b", "left", "right", "up", "down"]
@@ -14,6 +25,12 @@ TARGET_POSITIONS = [
     (17, 9, 80, 2),
     (16, 10, 80, 0),
 ]
+# Hash set for the per-step lookup
+TARGET_SET = frozenset(TARGET_POSITIONS)
+
+# Bump whenever the reward or termination logic below changes; cached evaluation
+# results (evaluation/eval_cache.py) of other versions are then no longer used.
+REWARD_VERSION = 1
 
 # Data directory and default state file path
 # The zero_state.state file should be placed inside data/ before running.
@@ -30,53 +47,146 @@ class GenericPyBoyEnv(Env):
         render_mode: bool = False,
         max_gameplay_time: int = 1_080_000,
         state_path: Path = DEFAULT_STATE,
+        state_cache: Optional[StateCache] = None,
+        frame_skip: int = 60,
+        emulation_speed: Optional[int] = None,
+        frame_hooks=None,
+        reuse_buffers: bool = False,
+        snapshot_pool: Optional[SnapshotPool] = None,
+        snapshot_interval: int = 0,
+        profile: bool = False,
+        screen_obs: bool = False,
+        screen_frames: int = 4,
+        screen_downsample: int = 2,
+        release_emulator: Optional[Callable] = None,
+        transition_cache: Optional[TransitionCache] = None,
     ):
         super().__init__()
         self.pyboy = pyboy
+        # Called with the emulator on close() instead of stopping it, e.g. to hand it to
+        # the next env built in this process (see training/worker_pool.py)
+        self.release_emulator = release_emulator
         self.debug = debug
         self.render_mode = render_mode
         self.max_gameplay_time = max_gameplay_time
         self.current_gameplay_time = 0
         self.state_path = Path(state_path)
+        # Save states are read from disk once and restored from memory afterwards.
+        # By default all envs in a process share one cache.
+        self.state_cache = state_cache if state_cache is not None else SHARED_STATE_CACHE
+
+        # Number of emulator frames advanced per action (action repeat).
+        if frame_skip < 1:
+            raise ValueError(f"frame_skip must be >= 1, got {frame_skip}")
+        self.frame_skip = int(frame_skip)
+        # Optional callables hook(env) run after every emulated frame. Without hooks the
+        # whole frame skip is advanced in a single emulator call.
+        self.frame_hooks = list(frame_hooks) if frame_hooks else []
 
         # Discrete action space: index maps into ACTIONS above
         self.action_space = spaces.Discrete(len(ACTIONS))
 
+        # All RAM values are read through one extractor compiled from the declarative
+        # schema in env/ram_schema.py.
+        self.ram = RamExtractor(RAM_FIELDS)
+        self._obs_index = self.ram.indices(OBSERVATION_FIELDS)
+        # Same layout as the TARGET_POSITIONS tuples
+        self._pos_index = tuple(self.ram.indices(("pos_x", "pos_y", "map_id", "orientation")).tolist())
+
+        # Low-allocation mode: step()/reset() return the same observation dict, array and
+        # info dict every time, overwritten in place. Consumers that keep observations
+        # around (rather than copying them into a buffer, as the SB3 vec envs do) must
+        # copy them before the next step. The exception is the last step of an episode:
+        # vec envs keep its observation as info["terminal_observation"] across the
+        # auto-reset, so that step returns a fresh observation and info dict.
+        self.reuse_buffers = reuse_buffers
+        # Gather the observation fields with a slice when they are contiguous in the schema
+        obs_index = self._obs_index.tolist()
+        if obs_index == list(range(obs_index[0], obs_index[0] + len(obs_index))):
+            self._obs_select = slice(obs_index[0], obs_index[0] + len(obs_index))
+        else:
+            self._obs_select = self._obs_index
+        self._obs_buffer = np.zeros(len(OBSERVATION_FIELDS), dtype=np.float32)
+        self._obs = {"info": self._obs_buffer}
+        self._info = {}
+
         # Observation is a small numeric vector: [pos_x, pos_y, map_id, orientation]
         # Values are in byte-range (0-255) so Box(0,255,(4,)) is used.
-        self.observation_space = Dict({
-            "info": Box(0, 255, (4,), dtype=np.float32)
-        })
+        low, high = self.ram.bounds(OBSERVATION_FIELDS)
+        obs_spaces = {"info": Box(low, high, dtype=np.float32)}
+        # Optional pixel observations: the last `screen_frames` screens, grayscale and
+        # downsampled (see env/screen.py), under a "screen" key next to "info".
+        self.screen = None
+        if screen_obs:
+            self.screen = ScreenStack(screen_frames, screen_downsample)
+            obs_spaces["screen"] = Box(0, 255, self.screen.shape, dtype=np.uint8)
+        self.observation_space = Dict(obs_spaces)
 
-        self.visited_maps = set()
-        self.visited_positions = set()
+        # Visited maps and positions are kept in fixed-size bit arrays (see env/exploration.py)
+        self.exploration = ExplorationTracker()
         self.last_pos = None
+        self.episode_steps = 0
+
+        # In-memory emulator snapshots that reset() can restart from (Go-Explore style).
+        # With snapshot_interval > 0 a snapshot is taken every that many steps.
+        self.snapshot_pool = snapshot_pool if snapshot_pool is not None else SnapshotPool()
+        self.snapshot_interval = snapshot_interval
+
+        # Optional memoized transitions (see env/transition_cache.py): a step whose state
+        # and action were seen before restores the stored result instead of emulating.
+        # Frame hooks need every frame emulated, so they cannot be combined with it.
+        if transition_cache is not None and self.frame_hooks:
+            raise ValueError("transition_cache cannot be used with frame_hooks")
+        self.transition_cache = transition_cache
+        # state key of the current emulator state, known after a cached step
+        self._cache_key = None
+
+        # Opt-in per-phase timing of step() (see env/profiler.py). The instrumented step
+        # replaces the plain one on this instance only, so unprofiled envs pay nothing.
+        self.profiler = None
+        if profile:
+            self.profiler = PhaseProfiler(STEP_PHASES)
+            self.step = self._profiled_step
 
         if not self.debug:
-            # Lower emulation speed for faster, headless runs.
+            # Headless runs are not throttled at all (0 = no speed limit in PyBoy).
             # When rendering (render_mode=True) we slow down the emulation to make
-            # UI updates visible (3 fps here).
-            self.pyboy.set_emulation_speed(60 if not self.render_mode else 3)
+            # UI updates visible (3x real time here).
+            if emulation_speed is None:
+                emulation_speed = 3 if self.render_mode else 0
+            self.pyboy.set_emulation_speed(emulation_speed)
 
         self.load_state()
 
-    def load_state(self):
-        if not self.state_path.exists():
-            raise FileNotFoundError(f"State file not found: {self.state_path}. Place zero_state.state inside data/.")
-        with open(self.state_path, "rb") as f:
-            # PyBoy.load_state accepts file-like objects
-            self.pyboy.load_state(f)
-
-    def get_observation(self):
-        # Memory offsets are Game Boy addresses observed empirically from the ROM.
-        # These are "magic" values specific to this game; document and keep them together
-        # to make future maintenance easier.
-        pos_x = int(self.pyboy.memory[0xC0D4])
-        pos_y = int(self.pyboy.memory[0xC0D5])
-        map_id = int(self.pyboy.memory[0xC92D])
-        orientation = int(self.pyboy.memory[0xC0D8])
+    def load_state(self, state=None):
+        # `state` is a start-state name registered on the cache or a path to a state
+        # file; by default the env's own state_path is restored.
+        source = self.state_path if state is None else state
+        try:
+            buf = self.state_cache.open(source)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"{e} Place zero_state.state inside data/.") from None
+        # PyBoy.load_state accepts file-like objects
+        self.pyboy.load_state(buf)
+        self._cache_key = None
+
+    def get_observation(self, values=None, fresh: bool = False):
+        # `values` are the decoded RAM fields from self.ram.read(); the memory is only
+        # read here when the caller has not done so already. With `fresh` new arrays are
+        # returned even in reuse_buffers mode.
+        if values is None:
+            values = self.ram.read(self.pyboy.memory)
+        if self.reuse_buffers and not fresh:
+            self._obs_buffer[:] = values[self._obs_select]
+            if self.screen is not None:
+                # the stack is a view that moves along the ring on every push
+                self._obs["screen"] = self.screen.observation()
+            return self._obs
         # Return the observation as a dict to match gymnasium.Dict observation space
-        return {"info": np.array([pos_x, pos_y, map_id, orientation], dtype=np.float32)}
+        obs = {"info": values[self._obs_index].astype(np.float32)}
+        if self.screen is not None:
+            obs["screen"] = self.screen.observation().copy()
+        return obs
 
     def step(self, action):
         # Accept vector/array actions commonly returned by vectorized envs and
@@ -86,58 +196,239 @@ class GenericPyBoyEnv(Env):
         elif isinstance(action, np.ndarray):
             action = int(action)
 
-        # Send button press to emulator and advance several ticks to let the game state update.
-        # The "60" here is empirical (number of internal ticks to step); making this a
-        # class parameter may help tune speed/response.
+        # Send button press to emulator and advance `frame_skip` frames to let the game
+        # state update. The default of 60 is empirical.
+        if self.transition_cache is not None:
+            values = self._cached_step(action)
+        else:
+            self.pyboy.button(ACTIONS[action])
+            self._advance_frames()
+            # One block read of the RAM fields feeds both the reward and the observation
+            values = self.ram.read(self.pyboy.memory)
+        reward, terminated, truncated = self._update_progress(values, action)
+        done = terminated or truncated
+        return self.get_observation(values, fresh=done), reward, terminated, truncated, self._step_info(fresh=done)
+
+    def _cached_step(self, action):
+        """Advance one step through the transition cache; returns the decoded RAM fields."""
+        cache = self.transition_cache
+        key = self._cache_key if self._cache_key is not None else cache.key(self.pyboy.memory)
+        entry, verify = cache.lookup(key, action)
+        if entry is not None and not verify:
+            self.pyboy.load_state(BytesIO(entry.snapshot))
+            self.current_gameplay_time += self.frame_skip
+            if self.screen is not None:
+                self.screen.push_gray(entry.screen)
+            self._cache_key = entry.next_key
+            return entry.values
+
         self.pyboy.button(ACTIONS[action])
-        for _ in range(60):
-            self.pyboy.tick()
-            self.current_gameplay_time += 1
+        self._advance_frames()
+        values = self.ram.read(self.pyboy.memory)
+        self._cache_key = cache.key(self.pyboy.memory)
+        if entry is not None:
+            cache.verify(key, action, entry, values, self._cache_key)
+        elif cache.admit(key, action):
+            buf = BytesIO()
+            self.pyboy.save_state(buf)
+            screen = self.screen.latest().copy() if self.screen is not None else None
+            cache.put(key, action, Transition(buf.getvalue(), values.copy(), screen, self._cache_key))
+        return values
+
+    def get_transition_stats(self):
+        """``TransitionCache.stats()``, or None without a transition cache."""
+        return self.transition_cache.stats() if self.transition_cache is not None else None
+
+    def _profiled_step(self, action):
+        # Same as step(), with each phase timed into self.profiler
+        clock = perf_counter_ns
+        record = self.profiler.record
+        t0 = clock()
+        if isinstance(action, (list, tuple, np.ndarray)):
+            action = int(action[0])
+        if self.transition_cache is not None:
+            # a cached step is timed as a whole under "tick"
+            t1 = clock()
+            values = self._cached_step(action)
+            t2 = t3 = clock()
+        else:
+            self.pyboy.button(ACTIONS[action])
+            t1 = clock()
+            self._advance_frames()
+            t2 = clock()
+            values = self.ram.read(self.pyboy.memory)
+            t3 = clock()
+        reward, terminated, truncated = self._update_progress(values, action)
+        t4 = clock()
+        done = terminated or truncated
+        obs = self.get_observation(values, fresh=done)
+        info = self._step_info(fresh=done)
+        t5 = clock()
+        record(0, t1 - t0)
+        record(1, t2 - t1)
+        record(2, t3 - t2)
+        record(3, t4 - t3)
+        record(4, t5 - t4)
+        return obs, reward, terminated, truncated, info
 
-        pos_x = int(self.pyboy.memory[0xC0D4])
-        pos_y = int(self.pyboy.memory[0xC0D5])
-        map_id = int(self.pyboy.memory[0xC92D])
-        orientation = int(self.pyboy.memory[0xC0D8])
-        full_pos = (pos_x, pos_y, map_id, orientation)
+    def _update_progress(self, values, action):
+        """Reward, exploration and termination bookkeeping for one step; returns (reward, terminated, truncated)."""
+        # values.item() returns plain ints (byte-range values are cached by Python)
+        ix, iy, imap, iorient = self._pos_index
+        full_pos = (values.item(ix), values.item(iy), values.item(imap), values.item(iorient))
+        map_id = full_pos[2]
+        # The check `action == 0` requires that the agent use the 'a' button to trigger
+        # the goal (e.g. to interact/confirm). Adjust if your goal should be action-agnostic.
+        reached_target = action == 0 and full_pos in TARGET_SET
 
         # Reward design:
         # - small negative step penalty to encourage short solutions
         # - +1.0 for visiting a new map (map discovery)
         # - +10.0 for reaching a target position (and using action 0 — which corresponds to 'a')
         reward = -0.001
-        if map_id not in self.visited_maps:
+        if self.exploration.visit_map(map_id):
             reward += 1.0
-        # The check `action == 0` requires that the agent use the 'a' button to trigger
-        # the goal (e.g. to interact/confirm). Adjust if your goal should be action-agnostic.
-        if full_pos in TARGET_POSITIONS and action == 0:
+        if reached_target:
             reward += 10.0
 
-        self.visited_maps.add(map_id)
-        self.visited_positions.add(full_pos)
+        self.exploration.visit(*full_pos)
         self.last_pos = full_pos
+        self.episode_steps += 1
+        if self.snapshot_interval and self.episode_steps % self.snapshot_interval == 0:
+            self.take_snapshot()
 
         # Termination/truncation: we treat reaching the target as terminated;
         # reaching max gameplay time as truncated
-        terminated = False
-        truncated = False
-        if self.current_gameplay_time >= self.max_gameplay_time:
-            truncated = True
-        if full_pos in TARGET_POSITIONS and action == 0:
-            terminated = True
+        terminated = reached_target
+        truncated = self.current_gameplay_time >= self.max_gameplay_time
+        return float(reward), terminated, truncated
+
+    def _step_info(self, fresh: bool = False):
+        if self.reuse_buffers and not fresh:
+            info = self._info
+            info.clear()
+            return info
+        return {}
+
+    def get_profile(self, reset: bool = False):
+        """Raw step-phase counters (``PhaseProfiler.snapshot()``), or None when profiling is off.
+
+        With ``reset=True`` the counters start over afterwards, so periodic callers
+        get the timings of the interval since their last call.
+        """
+        if self.profiler is None:
+            return None
+        snapshot = self.profiler.snapshot()
+        if reset:
+            self.profiler.reset()
+        return snapshot
+
+    @property
+    def visited_maps(self):
+        # Read-only snapshot; the env tracks maps in self.exploration
+        return set(self.exploration.maps().tolist())
 
-        return self.get_observation(), float(reward), terminated, truncated, {}
+    @property
+    def visited_positions(self):
+        return set(self.exploration.positions())
 
-    def reset(self, seed=None, **kwargs):
+    def _advance_frames(self):
+        # Only the last frame is rendered, and only when rendering or screen observations
+        # are enabled; the intermediate frames are never looked at.
+        render = bool(self.render_mode) or self.screen is not None
+        if self.frame_hooks:
+            # Per-frame path, only taken when a hook needs to see every frame.
+            for _ in range(self.frame_skip):
+                self.pyboy.tick(1, render)
+                self.current_gameplay_time += 1
+                for hook in self.frame_hooks:
+                    hook(self)
+        else:
+            self.pyboy.tick(self.frame_skip, render)
+            self.current_gameplay_time += self.frame_skip
+        if self.screen is not None:
+            self.screen.push(self.pyboy.screen.ndarray)
+
+    def take_snapshot(self, score: Optional[float] = None) -> int:
+        """Save the emulator state into the snapshot pool and return the snapshot id."""
+        buf = BytesIO()
+        self.pyboy.save_state(buf)
+        return self.snapshot_pool.add(buf.getvalue(), gameplay_time=self.current_gameplay_time,
+                                      position=self.last_pos, score=score)
+
+    def get_state(self) -> dict:
+        """Everything needed to continue the current episode elsewhere: the emulator
+        snapshot, episode counters, the exploration bits and the env's RNG state.
+
+        The result is picklable, so vec envs can fetch it with ``env_method("get_state")``.
+        The snapshot pool is not included.
+        """
+        buf = BytesIO()
+        self.pyboy.save_state(buf)
+        return {
+            "emulator": buf.getvalue(),
+            "current_gameplay_time": self.current_gameplay_time,
+            "episode_steps": self.episode_steps,
+            "last_pos": self.last_pos,
+            "exploration": self.exploration.get_state(),
+            "np_random": self.np_random.bit_generator.state,
+        }
+
+    def set_state(self, state: dict):
+        """Continue from a ``get_state()`` result; returns the observation of the restored state."""
+        self.pyboy.load_state(BytesIO(state["emulator"]))
+        self._cache_key = None
+        self.current_gameplay_time = state["current_gameplay_time"]
+        self.episode_steps = state["episode_steps"]
+        self.last_pos = state["last_pos"]
+        self.exploration.set_state(state["exploration"])
+        if self.screen is not None:
+            self.screen.reset(self.pyboy.screen.ndarray)
+        rng_state = state["np_random"]
+        generator = np.random.Generator(getattr(np.random, rng_state["bit_generator"])())
+        generator.bit_generator.state = rng_state
+        self.np_random = generator
+        return self.get_observation()
+
+    def reset(self, seed=None, options=None, **kwargs):
         if seed is not None:
             self.reset_seed = seed
-        self.load_state()
-        self.current_gameplay_time = 0
-        self.visited_maps.clear()
-        self.visited_positions.clear()
+            # seeds self.np_random, used to sample snapshots
+            super().reset(seed=seed)
+        # options={"start_state": name} restores one of the named start states
+        # registered on self.state_cache instead of state_path.
+        # options={"snapshot": id} restores a pooled snapshot and
+        # options={"snapshot": "sample"} picks one weighted by novelty.
+        options = options or {}
+        snapshot_id = options.get("snapshot")
+        if snapshot_id is not None:
+            if snapshot_id == "sample":
+                snapshot = self.snapshot_pool.sample(self.np_random)
+            else:
+                snapshot = self.snapshot_pool.get(snapshot_id)
+            snapshot.restores += 1
+            self.pyboy.load_state(snapshot.open())
+            # keep counting towards max_gameplay_time from where the snapshot was taken
+            self.current_gameplay_time = snapshot.gameplay_time
+        else:
+            self.load_state(options.get("start_state"))
+            self.current_gameplay_time = 0
+        self.exploration.reset()
+        self.last_pos = None
+        self.episode_steps = 0
+        self._cache_key = None
+        if self.screen is not None:
+            self.screen.reset(self.pyboy.screen.ndarray)
         # Gymnasium reset returns (obs, info)
         return self.get_observation(), {}
 
     def close(self):
+        if self.release_emulator is not None:
+            # the emulator now belongs to someone else; a second close() must not touch it
+            release, self.release_emulator = self.release_emulator, None
+            release(self.pyboy)
+            self.pyboy = None
+            return
         try:
             self.pyboy.stop()
         except Exception:
@@ -0,0 +1,105 @@
+"""Low-overhead timing of the phases of GenericPyBoyEnv.step().
+
+``PhaseProfiler`` keeps, per phase, a call count, the total time and a histogram
+of durations in power-of-two nanosecond buckets (bucket ``b`` holds durations in
+``[2**(b-1), 2**b)`` ns). Recording is a handful of list operations on plain ints,
+so it is cheap enough to leave on for whole training runs.
+
+Profiling is opt-in: ``GenericPyBoyEnv(profile=True)`` binds an instrumented step
+method to the instance, and envs created without it run the plain step with no
+timing code at all. Profilers from several envs are combined by merging their
+``snapshot()`` dicts.
+
+``rss_bytes`` reads the resident memory of a process, for the memory columns of
+the benchmarks and the autotuner.
+"""
+import os
+from typing import Dict, Optional, Sequence
+
+# Phases of GenericPyBoyEnv.step(), in order
+STEP_PHASES = ("button", "tick", "ram", "reward", "observation")
+
+# 2**63 ns is far beyond any step duration
+NUM_BUCKETS = 64
+
+
+class PhaseProfiler:
+    def __init__(self, phases: Sequence[str] = STEP_PHASES):
+        self.phases = tuple(phases)
+        self.reset()
+
+    def reset(self):
+        n = len(self.phases)
+        self.counts = [0] * n
+        self.totals_ns = [0] * n
+        self.max_ns = [0] * n
+        self.histograms = [[0] * NUM_BUCKETS for _ in range(n)]
+
+    def record(self, phase: int, ns: int):
+        """Add one duration (in ns) to the phase at index ``phase``."""
+        self.counts[phase] += 1
+        self.totals_ns[phase] += ns
+        if ns > self.max_ns[phase]:
+            self.max_ns[phase] = ns
+        self.histograms[phase][ns.bit_length()] += 1
+
+    def snapshot(self) -> Dict:
+        """Raw counters as plain lists (picklable, e.g. to send from a worker process)."""
+        return {
+            "phases": list(self.phases),
+            "counts": list(self.counts),
+            "totals_ns": list(self.totals_ns),
+            "max_ns": list(self.max_ns),
+            "histograms": [list(h) for h in self.histograms],
+        }
+
+    def merge(self, snapshot: Dict):
+        """Add the counters of a ``snapshot()`` with the same phases."""
+        if tuple(snapshot["phases"]) != self.phases:
+            raise ValueError(f"Cannot merge profile of phases {snapshot['phases']} into {self.phases}")
+        for i in range(len(self.phases)):
+            self.counts[i] += snapshot["counts"][i]
+            self.totals_ns[i] += snapshot["totals_ns"][i]
+            self.max_ns[i] = max(self.max_ns[i], snapshot["max_ns"][i])
+            hist = self.histograms[i]
+            for b, c in enumerate(snapshot["histograms"][i]):
+                hist[b] += c
+
+    def percentile_ns(self, phase: int, q: float) -> int:
+        """Upper bound of the histogram bucket holding the ``q``-th percentile (0-100)."""
+        count = self.counts[phase]
+        if not count:
+            return 0
+        rank = q / 100 * count
+        seen = 0
+        for b, c in enumerate(self.histograms[phase]):
+            seen += c
+            if c and seen >= rank:
+                return min(1 << b, self.max_ns[phase])
+        return self.max_ns[phase]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-phase count, total/mean/max time, approximate p50/p99 and share of the total."""
+        total = sum(self.totals_ns)
+        result = {}
+        for i, phase in enumerate(self.phases):
+            count = self.counts[i]
+            result[phase] = {
+                "count": count,
+                "total_ns": self.totals_ns[i],
+                "mean_ns": self.totals_ns[i] / count if count else 0.0,
+                "p50_ns": self.percentile_ns(i, 50),
+                "p99_ns": self.percentile_ns(i, 99),
+                "max_ns": self.max_ns[i],
+                "fraction": self.totals_ns[i] / total if total else 0.0,
+            }
+        return result
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size of a process from /proc, or None where that is unavailable."""
+    try:
+        with open(f"/proc/{pid or os.getpid()}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,110 @@
+"""Declarative map of the game RAM used for observations and rewards.
+
+Every value the env reads from the Game Boy memory is described once here as a
+``RamField`` (name, address, width and value range). ``RamExtractor`` compiles a
+set of fields into a few contiguous block reads of WRAM into a reusable NumPy
+buffer, so growing the observation adds entries to ``RAM_FIELDS`` rather than
+extra per-byte reads in the step loop.
+"""
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+
+class RamField(NamedTuple):
+    name: str
+    address: int
+    # number of bytes, little-endian
+    width: int = 1
+    low: int = 0
+    high: int = 255
+    description: str = ""
+
+
+# Memory offsets are Game Boy addresses observed empirically from the ROM.
+# These are "magic" values specific to this game; keep them together here and
+# document new ones as they are found.
+RAM_FIELDS = (
+    RamField("pos_x", 0xC0D4, description="player x position on the current map"),
+    RamField("pos_y", 0xC0D5, description="player y position on the current map"),
+    RamField("map_id", 0xC92D, description="id of the current map"),
+    RamField("orientation", 0xC0D8, description="direction the player is facing"),
+)
+
+# Fields exposed to the policy as the "info" observation vector, in order.
+OBSERVATION_FIELDS = ("pos_x", "pos_y", "map_id", "orientation")
+
+
+class RamExtractor:
+    """Read a set of ``RamField`` values with as few memory slice reads as possible.
+
+    Fields whose addresses are at most ``max_gap`` bytes apart are merged into one
+    contiguous range. ``read()`` copies every range into ``buffer`` and decodes all
+    fields into ``values`` (one entry per field, in the order given); both arrays are
+    reused between calls.
+    """
+
+    def __init__(self, fields: Sequence[RamField] = RAM_FIELDS, max_gap: int = 16):
+        self.fields = tuple(fields)
+        names = [f.name for f in self.fields]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate RAM field names: {names}")
+        self._index = {name: i for i, name in enumerate(names)}
+
+        # Merge the byte ranges of all fields into contiguous (start, stop) blocks
+        blocks = []
+        for f in sorted(self.fields, key=lambda f: f.address):
+            start, stop = f.address, f.address + f.width
+            if blocks and start <= blocks[-1][1] + max_gap:
+                blocks[-1][1] = max(blocks[-1][1], stop)
+            else:
+                blocks.append([start, stop])
+
+        # (start, stop, offset into buffer) for each block
+        self.ranges = []
+        offset = 0
+        for start, stop in blocks:
+            self.ranges.append((start, stop, offset))
+            offset += stop - start
+        self.buffer = np.zeros(offset, dtype=np.uint8)
+
+        def buffer_offset(address):
+            for start, stop, off in self.ranges:
+                if start <= address < stop:
+                    return off + address - start
+            raise AssertionError("address not covered by any block")
+
+        # byte_index[j][k] is the buffer offset of byte j of the k-th field wider than j
+        max_width = max(f.width for f in self.fields)
+        self._byte_index = []
+        self._byte_fields = []
+        for j in range(max_width):
+            wide = [i for i, f in enumerate(self.fields) if f.width > j]
+            self._byte_index.append(np.array([buffer_offset(self.fields[i].address + j) for i in wide], dtype=np.intp))
+            self._byte_fields.append(np.array(wide, dtype=np.intp))
+        self._low_bytes = np.zeros(len(self.fields), dtype=np.uint8)
+        self.values = np.zeros(len(self.fields), dtype=np.int64)
+
+    def index(self, name: str) -> int:
+        return self._index[name]
+
+    def indices(self, names: Sequence[str]) -> np.ndarray:
+        """Positions of ``names`` in ``values``, for gathering several fields at once."""
+        return np.array([self._index[name] for name in names], dtype=np.intp)
+
+    def bounds(self, names: Sequence[str]):
+        """(low, high) arrays for ``names``, e.g. to build an observation Box."""
+        fields = [self.fields[self._index[name]] for name in names]
+        return (np.array([f.low for f in fields], dtype=np.float32),
+                np.array([f.high for f in fields], dtype=np.float32))
+
+    def read(self, memory) -> np.ndarray:
+        """Read all blocks from ``memory`` (e.g. ``pyboy.memory``) and decode the fields."""
+        buffer = self.buffer
+        for start, stop, offset in self.ranges:
+            buffer[offset:offset + stop - start] = memory[start:stop]
+        np.take(buffer, self._byte_index[0], out=self._low_bytes)
+        self.values[:] = self._low_bytes
+        for j in range(1, len(self._byte_index)):
+            self.values[self._byte_fields[j]] += buffer[self._byte_index[j]].astype(np.int64) << (8 * j)
+        return self.values
@@ -0,0 +1,389 @@
+"""Env workers on other machines, reached over TCP.
+
+``RemoteEnvServer`` hosts a ``BatchedEnvPool`` of envs on one machine and serves
+them to a single client at a time; ``RemoteEnvPool`` connects to several servers
+and steps all of their envs as one batch, so emulation scales past one
+machine's cores. ``env.remote_vec_env.RemoteVecEnv`` wraps the client as an SB3
+``VecEnv`` and ``training/remote_env_server.py`` starts a server.
+
+Connections are ``multiprocessing.connection`` sockets: length-prefixed messages
+and an HMAC challenge on connect, so only clients holding the server's
+``authkey`` get in. Traffic is not encrypted. Control messages (``env_method``
+and friends, reset options, info dicts) are pickled, so only run servers on
+trusted networks or behind an SSH tunnel.
+
+Every message starts with a two-byte header (message kind, flags). The hot path
+is plain binary:
+
+- ``MSG_STEP``: the server's slice of the actions as raw bytes in the action
+  space's dtype
+- ``MSG_RESULT``: rewards (float32), terminated and truncated flags (bool) and
+  every observation array, at fixed 8-byte aligned offsets given by
+  ``BatchCodec``. Only when some env returned a non-empty info dict (an episode
+  ended) does a pickled ``(infos, reset_infos)`` follow, flagged ``FLAG_EXTRA``
+
+``step_async`` sends every server its actions before any result is read, so the
+servers step concurrently, and ``step_wait`` decodes results in the order they
+arrive straight into preallocated arrays.
+
+Like ``env.batched_env`` this module only depends on gymnasium/numpy.
+"""
+import os
+import pickle
+import socket
+import struct
+import traceback
+from multiprocessing import AuthenticationError, BufferTooShort
+from multiprocessing.connection import Client, Listener, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from env.batched_env import BatchedEnvPool, allocate_observations, observation_layout
+
+HEADER = struct.Struct("<BB")
+# client -> server
+MSG_STEP = 1
+MSG_RESET = 2
+MSG_CALL = 3
+MSG_CLOSE = 4
+# server -> client
+MSG_HELLO = 5
+MSG_RESULT = 6
+MSG_REPLY = 7
+MSG_ERROR = 8
+
+FLAG_EXTRA = 1
+
+# Pool methods a client may call on the server with MSG_CALL
+CALLS = ("get_attr", "has_attr", "set_attr", "env_method", "env_is_wrapped")
+
+Address = Union[str, Tuple[str, int]]
+
+# where the scripts read the shared secret from when none is given on the command line
+AUTHKEY_ENV = "PYBOY_ENV_AUTHKEY"
+
+
+class RemoteEnvError(RuntimeError):
+    pass
+
+
+def parse_address(address: Address) -> Tuple[str, int]:
+    """``"host:port"`` or ``(host, port)`` to ``(host, port)``."""
+    if isinstance(address, str):
+        host, _, port = address.rpartition(":")
+        if not host:
+            raise ValueError(f"Expected host:port, got {address!r}")
+        return host, int(port)
+    host, port = address
+    return host, int(port)
+
+
+def resolve_authkey(value: Optional[str] = None) -> bytes:
+    """``value``, or else the ``PYBOY_ENV_AUTHKEY`` environment variable, as bytes."""
+    key = value or os.environ.get(AUTHKEY_ENV)
+    if not key:
+        raise ValueError(f"No authkey given and {AUTHKEY_ENV} is not set")
+    return key.encode()
+
+
+class BatchCodec:
+    """Byte layout of a ``MSG_RESULT`` message for ``num_envs`` envs.
+
+    ``layout`` is an observation layout from ``env.batched_env.observation_layout``.
+    """
+
+    def __init__(self, layout, num_envs: int):
+        fields = [("rewards", (num_envs,), np.dtype(np.float32)),
+                  ("terminated", (num_envs,), np.dtype(bool)),
+                  ("truncated", (num_envs,), np.dtype(bool))]
+        fields += [(("obs", key), (num_envs,) + shape, dtype) for key, shape, dtype in layout]
+        self.fields = []
+        # arrays start after the header, each on an 8-byte boundary
+        offset = 8
+        for name, shape, dtype in fields:
+            self.fields.append((name, offset, shape, dtype))
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            offset += (nbytes + 7) // 8 * 8
+        self.size = offset
+
+    def views(self, buf) -> Dict[Any, np.ndarray]:
+        """Arrays over the fields of a message held in ``buf``."""
+        return {name: np.ndarray(shape, dtype, buffer=buf, offset=offset)
+                for name, offset, shape, dtype in self.fields}
+
+
+def _pack(kind: int, obj, flags: int = 0) -> bytes:
+    return HEADER.pack(kind, flags) + pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _unpack(msg) -> Any:
+    return pickle.loads(memoryview(msg)[HEADER.size:])
+
+
+class RemoteEnvServer:
+    """Serve a ``BatchedEnvPool`` of ``env_fns`` on ``address``.
+
+    ``envs_per_worker``, ``transport`` and ``start_method`` configure the local
+    pool. ``address`` is a ``(host, port)``; port 0 picks a free port, see
+    ``self.address``. Clients are served one after another; the envs outlive a
+    client, and the next one starts by resetting them.
+    """
+
+    def __init__(self, env_fns: Sequence[Callable], address: Address = ("127.0.0.1", 0), authkey: bytes = None,
+                 envs_per_worker: int = 1, transport: str = "pipe", start_method: Optional[str] = None):
+        if not authkey:
+            raise ValueError("authkey is required")
+        self.pool = BatchedEnvPool(env_fns, envs_per_worker=envs_per_worker, start_method=start_method,
+                                   transport=transport)
+        self.num_envs = self.pool.num_envs
+        self.listener = Listener(parse_address(address), family="AF_INET", authkey=authkey)
+        self.address = self.listener.address
+        self.codec = BatchCodec(self.pool.layout, self.num_envs)
+        self._out = bytearray(self.codec.size)
+        self._views = self.codec.views(self._out)
+        self._action_shape = (self.num_envs,) + tuple(self.pool.action_space.shape)
+        self._action_dtype = np.dtype(self.pool.action_space.dtype)
+        self.clients = 0
+        self.closed = False
+
+    def serve(self, max_clients: Optional[int] = None):
+        """Accept and serve clients until ``max_clients`` have been served (forever by default)."""
+        while not self.closed and (max_clients is None or self.clients < max_clients):
+            try:
+                conn = self.listener.accept()
+            except (AuthenticationError, OSError, EOFError):
+                # close() makes accept() fail at once, every time
+                if self.closed:
+                    break
+                # failed handshake (e.g. wrong authkey) or a client that went away
+                continue
+            self.clients += 1
+            with conn:
+                self._serve_client(conn)
+
+    def _result(self, obs, rewards, terminated, truncated, extra=None) -> bytes:
+        views = self._views
+        views["rewards"][:] = rewards
+        views["terminated"][:] = terminated
+        views["truncated"][:] = truncated
+        for key, buf in obs.items():
+            views[("obs", key)][:] = buf
+        flags = FLAG_EXTRA if extra is not None else 0
+        HEADER.pack_into(self._out, 0, MSG_RESULT, flags)
+        if extra is None:
+            return self._out
+        return bytes(self._out) + pickle.dumps(extra, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _serve_client(self, conn):
+        conn.send_bytes(_pack(MSG_HELLO, {"observation_space": self.pool.observation_space,
+                                          "action_space": self.pool.action_space,
+                                          "num_envs": self.num_envs}))
+        while True:
+            try:
+                msg = conn.recv_bytes()
+            except (EOFError, OSError):
+                return
+            kind, _ = HEADER.unpack_from(msg)
+            try:
+                if kind == MSG_STEP:
+                    actions = np.frombuffer(msg, dtype=self._action_dtype, offset=HEADER.size)
+                    obs, rewards, terminated, truncated, infos = self.pool.step(actions.reshape(self._action_shape))
+                    extra = (infos, self.pool.reset_infos) if any(infos) else None
+                    reply = self._result(obs, rewards, terminated, truncated, extra)
+                elif kind == MSG_RESET:
+                    seeds, options = _unpack(msg)
+                    obs = self.pool.reset(seeds, options)
+                    zeros = np.zeros(self.num_envs, dtype=bool)
+                    infos = [{} for _ in range(self.num_envs)]
+                    reply = self._result(obs, 0.0, zeros, zeros, (infos, self.pool.reset_infos))
+                elif kind == MSG_CALL:
+                    method, args, kwargs = _unpack(msg)
+                    if method not in CALLS:
+                        raise ValueError(f"Unknown call {method!r}")
+                    reply = _pack(MSG_REPLY, getattr(self.pool, method)(*args, **kwargs))
+                elif kind == MSG_CLOSE:
+                    return
+                else:
+                    raise ValueError(f"Unknown message kind {kind}")
+            except Exception:
+                reply = _pack(MSG_ERROR, traceback.format_exc())
+            conn.send_bytes(reply)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # closing the listening socket does not interrupt an accept() blocked in another
+        # thread; a connection that hangs up right away does, and serve() then stops
+        try:
+            socket.create_connection(self.address, timeout=1).close()
+        except OSError:
+            pass
+        self.listener.close()
+        self.pool.close()
+
+
+class RemoteEnvPool:
+    """Step the envs of several ``RemoteEnvServer`` instances as one batch.
+
+    Env indices run over the servers in the order of ``addresses``. Has the same
+    interface as ``BatchedEnvPool``; the returned arrays are overwritten by the
+    next call.
+    """
+
+    zero_copy = False
+
+    def __init__(self, addresses: Sequence[Address], authkey: bytes):
+        if not addresses:
+            raise ValueError("At least one server address is required")
+        self.conns = [Client(parse_address(a), family="AF_INET", authkey=authkey) for a in addresses]
+        self.closed = False
+        self.waiting = False
+        self.slices, self.codecs, self._bufs, self._views = [], [], [], []
+        start = 0
+        for conn in self.conns:
+            hello = self._recv_reply(conn)
+            if start == 0:
+                self.observation_space, self.action_space = hello["observation_space"], hello["action_space"]
+            elif hello["observation_space"] != self.observation_space or hello["action_space"] != self.action_space:
+                raise RemoteEnvError("Servers host envs with different observation or action spaces")
+            stop = start + hello["num_envs"]
+            self.slices.append((start, stop))
+            start = stop
+        self.num_envs = start
+        self.layout = observation_layout(self.observation_space)
+        for start, stop in self.slices:
+            codec = BatchCodec(self.layout, stop - start)
+            self.codecs.append(codec)
+            self._bufs.append(bytearray(codec.size))
+            self._views.append(codec.views(self._bufs[-1]))
+        self._server_of = {id(conn): i for i, conn in enumerate(self.conns)}
+        self._action_dtype = np.dtype(self.action_space.dtype)
+
+        self.obs = allocate_observations(self.layout, self.num_envs)
+        self.rewards = np.zeros(self.num_envs, dtype=np.float32)
+        self.terminated = np.zeros(self.num_envs, dtype=bool)
+        self.truncated = np.zeros(self.num_envs, dtype=bool)
+        self.infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+        self.reset_infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+
+    @staticmethod
+    def _recv_reply(conn):
+        msg = conn.recv_bytes()
+        kind, _ = HEADER.unpack_from(msg)
+        if kind == MSG_ERROR:
+            raise RemoteEnvError(f"Env server error:\n{_unpack(msg)}")
+        return _unpack(msg)
+
+    def _recv_result(self, server: int):
+        """Read a ``MSG_RESULT`` from ``server`` into the batch arrays."""
+        conn, buf = self.conns[server], self._bufs[server]
+        try:
+            size = conn.recv_bytes_into(buf)
+            msg = buf
+        except BufferTooShort as e:
+            # the result carries pickled infos (or an error); the message is in the exception
+            msg = e.args[0]
+            size = len(msg)
+        kind, flags = HEADER.unpack_from(msg)
+        if kind == MSG_ERROR:
+            raise RemoteEnvError(f"Env server error:\n{_unpack(msg[:size])}")
+        views = self._views[server] if msg is buf else self.codecs[server].views(msg)
+        start, stop = self.slices[server]
+        self.rewards[start:stop] = views["rewards"]
+        self.terminated[start:stop] = views["terminated"]
+        self.truncated[start:stop] = views["truncated"]
+        for key, out in self.obs.items():
+            out[start:stop] = views[("obs", key)]
+        if flags & FLAG_EXTRA:
+            self.infos[start:stop], self.reset_infos[start:stop] = pickle.loads(
+                memoryview(msg)[self.codecs[server].size:size])
+        else:
+            self.infos[start:stop] = [{} for _ in range(stop - start)]
+
+    def _wait_all(self):
+        pending = list(self.conns)
+        while pending:
+            for conn in wait(pending):
+                pending.remove(conn)
+                self._recv_result(self._server_of[id(conn)])
+
+    def step_async(self, actions):
+        actions = np.asarray(actions, dtype=self._action_dtype)
+        header = HEADER.pack(MSG_STEP, 0)
+        for conn, (start, stop) in zip(self.conns, self.slices):
+            conn.send_bytes(header + np.ascontiguousarray(actions[start:stop]).tobytes())
+        self.waiting = True
+
+    def step_wait(self):
+        self._wait_all()
+        self.waiting = False
+        return self.obs, self.rewards, self.terminated, self.truncated, self.infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def reset(self, seeds=None, options=None):
+        for conn, (start, stop) in zip(self.conns, self.slices):
+            block_seeds = seeds[start:stop] if seeds is not None else None
+            block_options = options[start:stop] if options is not None else None
+            conn.send_bytes(_pack(MSG_RESET, (block_seeds, block_options)))
+        self._wait_all()
+        return self.obs
+
+    def _indices_by_server(self, indices):
+        """Group global env indices into (server, local indices) pairs."""
+        if indices is None:
+            indices = range(self.num_envs)
+        elif isinstance(indices, int):
+            indices = [indices]
+        grouped: Dict[int, List[int]] = {}
+        for i in indices:
+            for server, (start, stop) in enumerate(self.slices):
+                if start <= i < stop:
+                    grouped.setdefault(server, []).append(i - start)
+                    break
+            else:
+                raise IndexError(f"env index {i} out of range for {self.num_envs} envs")
+        return grouped.items()
+
+    def _call(self, method: str, args, kwargs, indices) -> List[Any]:
+        grouped = list(self._indices_by_server(indices))
+        for server, local in grouped:
+            self.conns[server].send_bytes(_pack(MSG_CALL, (method, args, dict(kwargs, indices=local))))
+        results = []
+        for server, _ in grouped:
+            reply = self._recv_reply(self.conns[server])
+            if reply is not None:
+                results.extend(reply)
+        return results
+
+    def get_attr(self, name: str, indices=None) -> List[Any]:
+        return self._call("get_attr", (name,), {}, indices)
+
+    def has_attr(self, name: str, indices=None) -> List[bool]:
+        return self._call("has_attr", (name,), {}, indices)
+
+    def set_attr(self, name: str, value, indices=None):
+        self._call("set_attr", (name, value), {}, indices)
+
+    def env_method(self, name: str, *args, indices=None, **kwargs) -> List[Any]:
+        return self._call("env_method", (name,) + args, kwargs, indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return self._call("env_is_wrapped", (wrapper_class,), {}, indices)
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self.step_wait()
+        for conn in self.conns:
+            try:
+                conn.send_bytes(HEADER.pack(MSG_CLOSE, 0))
+            except OSError:
+                pass
+            conn.close()
+        self.closed = True
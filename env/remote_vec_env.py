@@ -0,0 +1,19 @@
+"""Stable-Baselines3 ``VecEnv`` over envs hosted by ``RemoteEnvServer`` instances.
+
+Start one server per machine with ``training/remote_env_server.py`` and pass their
+``host:port`` addresses here; the envs of all servers form one vec env, in the
+order of the addresses. See ``env.remote_env`` for the protocol.
+"""
+from typing import Sequence
+
+from stable_baselines3.common.vec_env import VecEnv
+
+from env.batched_vec_env import BatchedVecEnv
+from env.remote_env import Address, RemoteEnvPool
+
+
+class RemoteVecEnv(BatchedVecEnv):
+    def __init__(self, addresses: Sequence[Address], authkey: bytes):
+        # Same VecEnv logic as BatchedVecEnv, over a pool of remote servers instead of local workers
+        self.pool = RemoteEnvPool(addresses, authkey)
+        VecEnv.__init__(self, self.pool.num_envs, self.pool.observation_space, self.pool.action_space)
@@ -0,0 +1,194 @@
+"""Compact action logs of episodes and deterministic replay.
+
+The emulator is deterministic, so an episode is fully described by its start
+state, the frame skip and the action sequence. ``ActionRecorder`` wraps a
+``GenericPyBoyEnv`` and saves every episode as an ``ActionLog``: one byte per
+action plus a CRC32 checksum of work RAM every ``checksum_interval`` steps and
+after the last step, in a small compressed ``.npz``. Start states are stored once
+per distinct state under ``states/<sha256>.state`` next to the logs, so snapshot
+starts (``reset(options={"snapshot": ...})``) can be replayed too.
+
+``replay()`` feeds a log back through an env, headless and without a speed cap,
+and compares the checksums on the way, raising ``ReplayDivergence`` at the first
+mismatch. Frames, RAM traces or trajectories are regenerated on demand by
+wrapping the replay env (e.g. in ``TrajectoryRecorder``) or from the ``on_step``
+callback. ``evaluation/replay.py`` is the command-line front end.
+"""
+import hashlib
+import json
+import os
+import zlib
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+from gymnasium import Wrapper
+
+REPLAY_FORMAT = 1
+# Work RAM, where the game keeps its state; cheap to checksum (8 KiB)
+CHECKSUM_RANGE = (0xC000, 0xE000)
+STATE_DIR = "states"
+
+
+class ReplayDivergence(RuntimeError):
+    pass
+
+
+def ram_checksum(memory) -> int:
+    """CRC32 of work RAM, e.g. ``ram_checksum(pyboy.memory)``."""
+    start, stop = CHECKSUM_RANGE
+    return zlib.crc32(bytes(memory[start:stop]))
+
+
+class ActionLog(NamedTuple):
+    start_state: str
+    frame_skip: int
+    start_gameplay_time: int
+    checksum_interval: int
+    actions: np.ndarray
+    # after steps checksum_interval, 2 * checksum_interval, ...
+    checksums: np.ndarray
+    final_checksum: int
+    total_reward: float
+    terminated: bool
+
+    def save(self, path):
+        header = {
+            "format": REPLAY_FORMAT,
+            "start_state": self.start_state,
+            "frame_skip": self.frame_skip,
+            "start_gameplay_time": self.start_gameplay_time,
+            "checksum_interval": self.checksum_interval,
+            "final_checksum": self.final_checksum,
+            "total_reward": self.total_reward,
+            "terminated": self.terminated,
+        }
+        tmp = Path(path).with_name(f".{Path(path).name}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, header=np.array(json.dumps(header)), actions=self.actions,
+                                checksums=self.checksums)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path) -> "ActionLog":
+        with np.load(path) as data:
+            header = json.loads(str(data["header"]))
+            if header.pop("format") != REPLAY_FORMAT:
+                raise ValueError(f"{path} is not a replay log of format {REPLAY_FORMAT}")
+            return cls(actions=data["actions"], checksums=data["checksums"], **header)
+
+    @property
+    def num_steps(self) -> int:
+        return len(self.actions)
+
+
+def state_path(directory, digest: str) -> Path:
+    return Path(directory) / STATE_DIR / f"{digest}.state"
+
+
+class ActionRecorder(Wrapper):
+    """Save each episode of the wrapped env as ``episode_<n>.npz`` in ``directory``.
+
+    With ``only_terminated=True`` only episodes that end by termination (reaching a
+    target) are kept. When several envs record at the same time each needs its own
+    directory.
+    """
+
+    def __init__(self, env, directory, checksum_interval: int = 100, only_terminated: bool = False):
+        super().__init__(env)
+        if checksum_interval < 1:
+            raise ValueError(f"checksum_interval must be >= 1, got {checksum_interval}")
+        self.directory = Path(directory)
+        (self.directory / STATE_DIR).mkdir(parents=True, exist_ok=True)
+        self.checksum_interval = checksum_interval
+        self.only_terminated = only_terminated
+        self.episode = -1
+        self.saved = []
+        self._actions = bytearray()
+        self._checksums = []
+        self._start = None
+
+    def _store_start_state(self) -> str:
+        buf = BytesIO()
+        self.env.unwrapped.pyboy.save_state(buf)
+        data = buf.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        path = state_path(self.directory, digest)
+        if not path.exists():
+            tmp = path.with_name(f".{path.name}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return digest
+
+    def _finish(self, terminated: bool = False):
+        if self._start is None or not self._actions:
+            return
+        if terminated or not self.only_terminated:
+            digest, gameplay_time, total_reward = self._start
+            log = ActionLog(digest, self.env.unwrapped.frame_skip, gameplay_time, self.checksum_interval,
+                            np.frombuffer(bytes(self._actions), dtype=np.uint8),
+                            np.array(self._checksums, dtype=np.uint32),
+                            ram_checksum(self.env.unwrapped.pyboy.memory), total_reward, terminated)
+            path = self.directory / f"episode_{self.episode:06d}.npz"
+            log.save(path)
+            self.saved.append(path)
+        self._start = None
+
+    def reset(self, **kwargs):
+        self._finish()
+        result = self.env.reset(**kwargs)
+        self.episode += 1
+        self._actions = bytearray()
+        self._checksums = []
+        self._start = [self._store_start_state(), self.env.unwrapped.current_gameplay_time, 0.0]
+        return result
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        if isinstance(action, (list, tuple, np.ndarray)):
+            action = np.asarray(action).reshape(-1)[0]
+        self._actions.append(int(action))
+        self._start[2] += float(reward)
+        if len(self._actions) % self.checksum_interval == 0:
+            self._checksums.append(ram_checksum(self.env.unwrapped.pyboy.memory))
+        if terminated or truncated:
+            self._finish(terminated)
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+def replay(env, log: ActionLog, state_dir, verify: bool = True,
+           on_step: Optional[Callable[[int, object], None]] = None) -> float:
+    """Replay ``log`` on ``env`` (a ``GenericPyBoyEnv``, possibly wrapped) and return the total reward.
+
+    ``state_dir`` is the directory the log was recorded into (holding ``states/``).
+    ``on_step(step, env)`` is called after every step, with ``step`` counting from 1.
+    """
+    unwrapped = env.unwrapped
+    if unwrapped.frame_skip != log.frame_skip:
+        raise ValueError(f"Log was recorded with frame_skip={log.frame_skip}, env has {unwrapped.frame_skip}")
+    path = state_path(state_dir, log.start_state)
+    if not path.exists():
+        raise FileNotFoundError(f"Start state {log.start_state} not found in {path.parent}")
+    unwrapped.state_cache.register(log.start_state, path)
+    env.reset(options={"start_state": log.start_state})
+    unwrapped.current_gameplay_time = log.start_gameplay_time
+
+    total_reward = 0.0
+    interval = log.checksum_interval
+    for step, action in enumerate(log.actions.tolist(), start=1):
+        _, reward, _, _, _ = env.step(action)
+        total_reward += reward
+        if verify and step % interval == 0:
+            expected = int(log.checksums[step // interval - 1])
+            if ram_checksum(unwrapped.pyboy.memory) != expected:
+                raise ReplayDivergence(f"RAM checksum mismatch after step {step}")
+        if on_step is not None:
+            on_step(step, env)
+    if verify and ram_checksum(unwrapped.pyboy.memory) != log.final_checksum:
+        raise ReplayDivergence(f"RAM checksum mismatch after the last step ({log.num_steps})")
+    return total_reward
@@ -0,0 +1,77 @@
+"""Downsampled grayscale screen frames for pixel observations.
+
+``ScreenStack`` turns PyBoy's RGBA screen buffer (``pyboy.screen.ndarray``, a view
+of the emulator's frame buffer, so reading it copies nothing) into a stack of the
+last ``frames`` screens:
+
+- downsampling averages ``downsample x downsample`` pixel blocks through a reshape
+  view and one ``sum``, with no Python loop
+- grayscale uses integer luma weights (the DMG palette is gray anyway, so nothing
+  is lost)
+- frames live in a preallocated uint8 ring of ``2 * frames`` slots. Every frame is
+  written twice, to slots ``i`` and ``i + frames``, so the stack in time order
+  (oldest first) is always one contiguous slice of the ring and is returned
+  without reordering or copying
+
+All intermediate buffers are allocated once; with the defaults (4 frames, 2x
+downsampling to 72x80) a stack uses about 100 KiB per env.
+"""
+import numpy as np
+
+SCREEN_HEIGHT = 144
+SCREEN_WIDTH = 160
+
+# ITU-R BT.601 luma weights scaled to sum to 256
+LUMA = np.array([77, 150, 29], dtype=np.uint32)
+
+
+class ScreenStack:
+    def __init__(self, frames: int = 4, downsample: int = 2):
+        if frames < 1:
+            raise ValueError(f"frames must be >= 1, got {frames}")
+        if downsample < 1 or SCREEN_HEIGHT % downsample or SCREEN_WIDTH % downsample:
+            raise ValueError(f"downsample must divide the {SCREEN_WIDTH}x{SCREEN_HEIGHT} screen, got {downsample}")
+        self.frames = frames
+        self.downsample = downsample
+        h, w = SCREEN_HEIGHT // downsample, SCREEN_WIDTH // downsample
+        # channels first, as SB3's CNN feature extractor expects
+        self.shape = (frames, h, w)
+        self._ring = np.zeros((2 * frames, h, w), dtype=np.uint8)
+        self._next = 0
+        # per-block channel sums fit in uint16 for blocks of up to 16x16 pixels
+        self._sums = np.zeros((h, w, 3), dtype=np.uint16)
+        self._gray = np.zeros((h, w), dtype=np.uint32)
+        self._divisor = 256 * downsample * downsample
+
+    def _convert(self, screen: np.ndarray) -> np.ndarray:
+        d = self.downsample
+        _, h, w = self.shape
+        blocks = screen.reshape(h, d, w, d, screen.shape[-1])[..., :3]
+        np.sum(blocks, axis=(1, 3), dtype=np.uint16, out=self._sums)
+        np.matmul(self._sums, LUMA, out=self._gray)
+        self._gray //= self._divisor
+        return self._gray
+
+    def push(self, screen: np.ndarray):
+        """Add a (144, 160, 3 or 4) uint8 RGB(A) screen as the newest frame."""
+        self.push_gray(self._convert(screen))
+
+    def push_gray(self, gray: np.ndarray):
+        """Add an already converted frame, e.g. one kept from ``latest()``."""
+        i = self._next
+        self._ring[i] = gray
+        self._ring[i + self.frames] = gray
+        self._next = (i + 1) % self.frames
+
+    def reset(self, screen: np.ndarray):
+        """Fill the whole stack with ``screen``, e.g. at the start of an episode."""
+        self._ring[:] = self._convert(screen)
+        self._next = 0
+
+    def latest(self) -> np.ndarray:
+        """The newest converted frame (a view)."""
+        return self._ring[(self._next - 1) % self.frames]
+
+    def observation(self) -> np.ndarray:
+        """The stack, oldest frame first. A view that changes on the next push; copy it to keep it."""
+        return self._ring[self._next:self._next + self.frames]
@@ -0,0 +1,134 @@
+"""Shared-memory transport for step results of worker processes.
+
+With the pipe transport every step result is pickled in the worker and
+unpickled in the parent. ``SharedStepBuffers`` puts actions, observations,
+rewards and termination flags for all envs into a single
+``multiprocessing.shared_memory`` block instead. Workers write their block's
+results in place and the parent reads them without copying; only a semaphore
+per worker is used to signal that a step was requested or completed.
+
+Results are kept in a ring of ``slots`` buffers and every step or reset moves to
+the next slot, so arrays returned for step ``t`` stay valid while step ``t + 1``
+runs. SB3 relies on this: it still holds the previous observation
+(``model._last_obs``) when the next step's results come in.
+"""
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Values of the per-worker command word
+CMD_STEP = 0
+CMD_PIPE = 1
+
+_ALIGN = 64
+
+
+class _SharedMemory(SharedMemory):
+    def close(self):
+        try:
+            super().close()
+        except BufferError:
+            # Views handed out to callers are still alive; the mapping is released
+            # once they are garbage collected.
+            pass
+
+
+def _attach(name: str) -> SharedMemory:
+    try:
+        return _SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        pass
+    # Older versions register every attached block with the resource tracker, which
+    # would then unlink it (or complain) when the worker exits. Only the creating
+    # process owns the block, so skip the registration here.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return _SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedStepBuffers:
+    """NumPy views over one shared-memory block holding step results for ``num_envs`` envs.
+
+    ``layout`` is the observation layout from ``env.batched_env.observation_layout``,
+    ``action_shape``/``action_dtype`` describe a single env's action.
+    """
+
+    def __init__(self, layout, num_envs: int, num_workers: int, action_shape: Tuple[int, ...] = (),
+                 action_dtype=np.int64, slots: int = 2, name: Optional[str] = None):
+        if slots < 2:
+            raise ValueError(f"slots must be >= 2 so the previous step's results stay valid, got {slots}")
+        self.layout = layout
+        self.num_envs = num_envs
+        self.num_workers = num_workers
+        self.action_shape = tuple(action_shape)
+        self.action_dtype = np.dtype(action_dtype)
+        self.slots = slots
+
+        fields: List[Tuple[str, Tuple[int, ...], np.dtype]] = [
+            ("actions", (num_envs,) + self.action_shape, self.action_dtype),
+            ("rewards", (slots, num_envs), np.dtype(np.float32)),
+            ("terminated", (slots, num_envs), np.dtype(bool)),
+            ("truncated", (slots, num_envs), np.dtype(bool)),
+            # per worker: command word, slot to write to and whether infos follow on the pipe
+            ("command", (num_workers,), np.dtype(np.int32)),
+            ("slot", (num_workers,), np.dtype(np.int32)),
+            ("has_info", (num_workers,), np.dtype(bool)),
+        ]
+        for key, shape, dtype in layout:
+            fields.append((f"obs:{key}", (slots, num_envs) + shape, dtype))
+
+        offsets, size = [], 0
+        for _, shape, dtype in fields:
+            offsets.append(size)
+            nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            size += (nbytes + _ALIGN - 1) // _ALIGN * _ALIGN
+
+        if name is None:
+            self.shm = _SharedMemory(create=True, size=max(size, 1))
+            self.owner = True
+        else:
+            self.shm = _attach(name)
+            self.owner = False
+
+        self.arrays: Dict[str, np.ndarray] = {}
+        for (field, shape, dtype), offset in zip(fields, offsets):
+            # np.frombuffer (unlike np.ndarray(buffer=...)) holds a buffer export, so the
+            # mapping cannot be closed underneath a view that is still alive.
+            count = int(np.prod(shape, dtype=np.int64))
+            self.arrays[field] = np.frombuffer(self.shm.buf, dtype=dtype, count=count, offset=offset).reshape(shape)
+        self.actions = self.arrays["actions"]
+        self.rewards = self.arrays["rewards"]
+        self.terminated = self.arrays["terminated"]
+        self.truncated = self.arrays["truncated"]
+        self.command = self.arrays["command"]
+        self.slot = self.arrays["slot"]
+        self.has_info = self.arrays["has_info"]
+        self.obs = {key: self.arrays[f"obs:{key}"] for key, _, _ in layout}
+
+    def spec(self):
+        """Picklable description used by workers to attach to the same block."""
+        return (self.shm.name, self.layout, self.num_envs, self.num_workers, self.action_shape,
+                self.action_dtype.str, self.slots)
+
+    @classmethod
+    def attach(cls, spec) -> "SharedStepBuffers":
+        name, layout, num_envs, num_workers, action_shape, action_dtype, slots = spec
+        return cls(layout, num_envs, num_workers, action_shape, np.dtype(action_dtype), slots, name=name)
+
+    def slot_views(self, slot: int, start: int = 0, stop: Optional[int] = None):
+        """Return (obs, rewards, terminated, truncated) views for one slot and env range."""
+        obs = {key: buf[slot, start:stop] for key, buf in self.obs.items()}
+        return obs, self.rewards[slot, start:stop], self.terminated[slot, start:stop], self.truncated[slot, start:stop]
+
+    def close(self):
+        self.arrays = self.obs = {}
+        self.actions = self.rewards = self.terminated = self.truncated = None
+        self.command = self.slot = self.has_info = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,101 @@
+"""In-memory pool of emulator snapshots for branch-and-restore resets.
+
+``GenericPyBoyEnv`` can save the emulator state mid-episode into a
+``SnapshotPool`` and later reset from any pooled snapshot (Go-Explore style
+restarts) instead of the single start state. Snapshots are kept as ``bytes`` and
+restored from a ``BytesIO`` view, so a restore never touches the disk.
+
+When the pool is full one snapshot is evicted: the oldest one with
+``eviction="age"``, or the least novel one with ``eviction="novelty"``. Unless the
+caller passes its own score, novelty is ``1 / sqrt(1 + n)`` where ``n`` is the number
+of pooled snapshots already taken at the same position, so snapshots from rarely
+reached positions are kept (and sampled) preferentially.
+"""
+from collections import Counter
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+EVICTION_POLICIES = ("age", "novelty")
+
+
+class Snapshot:
+    __slots__ = ("id", "data", "gameplay_time", "position", "score", "restores")
+
+    def __init__(self, id: int, data: bytes, gameplay_time: int = 0, position: Optional[Tuple] = None,
+                 score: float = 1.0):
+        self.id = id
+        self.data = data
+        self.gameplay_time = gameplay_time
+        self.position = position
+        self.score = score
+        self.restores = 0
+
+    def open(self) -> BytesIO:
+        return BytesIO(self.data)
+
+
+class SnapshotPool:
+    def __init__(self, capacity: int = 32, eviction: str = "age"):
+        if capacity < 1:
+            raise ValueError(f"capacity must be >= 1, got {capacity}")
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"eviction must be one of {EVICTION_POLICIES}, got {eviction!r}")
+        self.capacity = capacity
+        self.eviction = eviction
+        # ids increase monotonically, so dict order is also age order
+        self._snapshots: Dict[int, Snapshot] = {}
+        self._position_counts: Counter = Counter()
+        self._next_id = 0
+
+    def add(self, data: bytes, gameplay_time: int = 0, position: Optional[Tuple] = None,
+            score: Optional[float] = None) -> int:
+        """Add a snapshot and return its id, evicting one first if the pool is full."""
+        if score is None:
+            score = 1.0 / np.sqrt(1 + self._position_counts[position])
+        if len(self._snapshots) >= self.capacity:
+            self.remove(self._victim())
+        snapshot = Snapshot(self._next_id, bytes(data), gameplay_time, position, float(score))
+        self._next_id += 1
+        self._snapshots[snapshot.id] = snapshot
+        self._position_counts[position] += 1
+        return snapshot.id
+
+    def _victim(self) -> int:
+        if self.eviction == "age":
+            return next(iter(self._snapshots))
+        # least novel; min() keeps the first (oldest) one on ties
+        return min(self._snapshots.values(), key=lambda s: s.score).id
+
+    def remove(self, snapshot_id: int):
+        snapshot = self._snapshots.pop(snapshot_id)
+        self._position_counts[snapshot.position] -= 1
+        if not self._position_counts[snapshot.position]:
+            del self._position_counts[snapshot.position]
+
+    def get(self, snapshot_id: int) -> Snapshot:
+        return self._snapshots[snapshot_id]
+
+    def sample(self, rng: np.random.Generator) -> Snapshot:
+        """Pick a snapshot at random, weighted by score."""
+        if not self._snapshots:
+            raise LookupError("Snapshot pool is empty")
+        snapshots = list(self._snapshots.values())
+        weights = np.array([s.score for s in snapshots], dtype=np.float64)
+        total = weights.sum()
+        p = weights / total if total > 0 else None
+        return snapshots[rng.choice(len(snapshots), p=p)]
+
+    def ids(self):
+        return list(self._snapshots)
+
+    def clear(self):
+        self._snapshots.clear()
+        self._position_counts.clear()
+
+    def __contains__(self, snapshot_id: int) -> bool:
+        return snapshot_id in self._snapshots
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
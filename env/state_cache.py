@@ -0,0 +1,103 @@
+"""In-memory cache for emulator save states.
+
+Every ``GenericPyBoyEnv.reset()`` restores a save state. Opening and reading the
+state file each time adds file I/O to every reset, which adds up with many
+parallel envs and short episodes. ``StateCache`` reads each state file once into
+an immutable ``bytes`` buffer and hands out ``BytesIO`` views over it, which
+``PyBoy.load_state`` accepts like a regular file object.
+
+Several named start states can be held at once; the least recently used entry is
+evicted when the cache is full, and an entry is re-read automatically when the
+modification time of its file changes.
+"""
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+
+StateKey = Union[str, Path]
+
+
+class StateCache:
+    """LRU cache of save-state buffers keyed by name (or by resolved file path)."""
+
+    def __init__(self, max_entries: int = 8):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be >= 1, got {max_entries}")
+        self.max_entries = max_entries
+        # name -> path for start states registered with register()
+        self._paths: Dict[str, Path] = {}
+        # name -> (mtime_ns, size, data); ordered from least to most recently used
+        self._entries: "OrderedDict[str, Tuple[int, int, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name: str, path: StateKey):
+        """Register a named start state. The file is read lazily on first use."""
+        with self._lock:
+            self._paths[name] = Path(path)
+            # drop any buffer cached under this name for a previous path
+            self._entries.pop(name, None)
+
+    def names(self):
+        return list(self._paths)
+
+    def _resolve(self, key: StateKey) -> Tuple[str, Path]:
+        if isinstance(key, str) and key in self._paths:
+            return key, self._paths[key]
+        path = Path(key)
+        return str(path.resolve()), path
+
+    def get(self, key: StateKey) -> bytes:
+        """Return the contents of a state file, reading it from disk only when needed."""
+        name, path = self._resolve(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"State file not found: {path}.") from None
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return entry[2]
+
+        # Read outside the lock so a slow disk doesn't block other lookups.
+        with open(path, "rb") as f:
+            data = f.read()
+
+        with self._lock:
+            self.misses += 1
+            self._entries[name] = (stat.st_mtime_ns, stat.st_size, data)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return data
+
+    def open(self, key: StateKey) -> BytesIO:
+        """Return a fresh file-like view over a cached state, suitable for ``PyBoy.load_state``."""
+        # BytesIO shares the immutable bytes buffer until it is written to, so no copy is made here.
+        return BytesIO(self.get(key))
+
+    def invalidate(self, key: Optional[StateKey] = None):
+        """Drop one cached buffer (or all of them when ``key`` is None)."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._resolve(key)[0], None)
+
+    def __contains__(self, key: StateKey) -> bool:
+        return self._resolve(key)[0] in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Process-level cache shared by every env created in this process.
+SHARED_STATE_CACHE = StateCache()
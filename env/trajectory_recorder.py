@@ -0,0 +1,56 @@
+"""Wrapper that streams per-step player positions into a columnar log.
+
+Each step of the wrapped ``GenericPyBoyEnv`` appends one row of
+(episode, step, x, y, map_id, orientation, action, reward) to a
+``env.columnar.ColumnarWriter``; the disk writes happen on the writer's
+background thread. ``evaluation/visualize_trajectory.py`` reads the resulting
+directory directly.
+
+When several envs record at the same time each needs its own directory.
+Recording again into a directory that already holds a log appends to it and
+continues the episode numbering after the last recorded episode.
+"""
+import numpy as np
+from gymnasium import Wrapper
+
+from env.columnar import ColumnarReader, ColumnarWriter
+
+TRAJECTORY_COLUMNS = (
+    ("episode", np.uint32),
+    ("step", np.uint32),
+    ("x", np.uint8),
+    ("y", np.uint8),
+    ("map_id", np.uint8),
+    ("orientation", np.uint8),
+    ("action", np.uint8),
+    ("reward", np.float32),
+)
+
+
+class TrajectoryRecorder(Wrapper):
+    def __init__(self, env, directory, chunk_rows: int = 65_536):
+        super().__init__(env)
+        self.writer = ColumnarWriter(directory, TRAJECTORY_COLUMNS, chunk_rows=chunk_rows)
+        # the first reset() starts the episode after the last one already in the log
+        episodes = ColumnarReader(directory).column("episode")
+        self.episode = int(episodes.max()) if len(episodes) else -1
+        self.episode_step = 0
+
+    def reset(self, **kwargs):
+        self.episode += 1
+        self.episode_step = 0
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        if isinstance(action, (list, tuple, np.ndarray)):
+            action = np.asarray(action).reshape(-1)[0]
+        # last_pos is the (x, y, map_id, orientation) tuple the env read for this step
+        x, y, map_id, orientation = self.env.unwrapped.last_pos
+        self.writer.append(self.episode, self.episode_step, x, y, map_id, orientation, action, reward)
+        self.episode_step += 1
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self.writer.close()
+        super().close()
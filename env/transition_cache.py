@@ -0,0 +1,162 @@
+"""Memoized emulator transitions for deterministic stretches of the game.
+
+``GenericPyBoyEnv(transition_cache=TransitionCache(...))`` looks every step up by
+a hash of the game's work and high RAM (the "state key") plus the action. On a hit
+the env restores the emulator snapshot stored for that transition instead of
+emulating ``frame_skip`` frames, and takes the RAM fields (and screen frame) of
+the result from the cache, so reward, exploration and observation are computed
+as usual.
+
+The key only covers RAM, not the CPU, video or timer state, and addresses in
+``ignore`` (e.g. frame counters found with ``volatile_addresses``) are left out
+of it on purpose so that states differing only there share entries. A cached
+result can therefore differ from what emulation would give. Every
+``verify_every``-th hit is emulated anyway and compared with the cached RAM
+fields and next state key; mismatching entries are dropped and counted.
+
+Snapshots are large (about 180 KB for this game) and saving one costs more than
+emulating a step, so a transition is only stored once its key has been seen
+``admit_after`` times, and at most ``max_entries`` are kept (least recently used
+first out). Whether the cache pays off depends on how often exact states recur:
+``stats()`` reports the hit rate.
+"""
+import hashlib
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Work RAM and high RAM
+KEY_RANGES = ((0xC000, 0xE000), (0xFF80, 0xFFFF))
+
+
+class Transition(NamedTuple):
+    snapshot: bytes
+    # decoded RAM fields (RamExtractor.read) after the step
+    values: np.ndarray
+    # newest grayscale frame of the env's ScreenStack, when it has one
+    screen: Optional[np.ndarray]
+    next_key: bytes
+
+
+class TransitionCache:
+    """LRU cache of (state key, action) -> ``Transition``."""
+
+    def __init__(self, max_entries: int = 256, verify_every: int = 64, admit_after: int = 2,
+                 key_ranges: Sequence[Tuple[int, int]] = KEY_RANGES, ignore: Iterable[int] = ()):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be >= 1, got {max_entries}")
+        self.max_entries = max_entries
+        self.verify_every = verify_every
+        self.admit_after = max(1, admit_after)
+        self.key_ranges = tuple((int(start), int(stop)) for start, stop in key_ranges)
+        self._key_buffer = np.zeros(sum(stop - start for start, stop in self.key_ranges), dtype=np.uint8)
+        # positions of the ignored addresses in the key buffer; they stay zero
+        offsets, offset = {}, 0
+        for start, stop in self.key_ranges:
+            for address in range(start, stop):
+                offsets[address] = offset + address - start
+            offset += stop - start
+        self._ignore = np.array(sorted(offsets[a] for a in set(ignore) if a in offsets), dtype=np.intp)
+        self._entries: "OrderedDict[Tuple[bytes, int], Transition]" = OrderedDict()
+        # keys seen but not stored yet -> times seen; bounded like the entries
+        self._seen: "OrderedDict[Tuple[bytes, int], int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+        self.verified = 0
+        self.mismatches = 0
+
+    def key(self, memory) -> bytes:
+        """State key of ``memory`` (e.g. ``pyboy.memory``)."""
+        buffer, offset = self._key_buffer, 0
+        for start, stop in self.key_ranges:
+            buffer[offset:offset + stop - start] = memory[start:stop]
+            offset += stop - start
+        if len(self._ignore):
+            buffer[self._ignore] = 0
+        return hashlib.blake2b(buffer, digest_size=16).digest()
+
+    def lookup(self, key: bytes, action: int) -> Tuple[Optional[Transition], bool]:
+        """The cached transition, if any, and whether this hit is due for verification."""
+        entry = self._entries.get((key, action))
+        if entry is None:
+            self.misses += 1
+            return None, False
+        self._entries.move_to_end((key, action))
+        self.hits += 1
+        return entry, bool(self.verify_every) and self.hits % self.verify_every == 0
+
+    def admit(self, key: bytes, action: int) -> bool:
+        """Count a miss of (key, action); True once it is worth storing."""
+        seen = self._seen.pop((key, action), 0) + 1
+        if seen >= self.admit_after:
+            return True
+        self._seen[(key, action)] = seen
+        while len(self._seen) > 8 * self.max_entries:
+            self._seen.popitem(last=False)
+        return False
+
+    def put(self, key: bytes, action: int, transition: Transition):
+        self._entries[(key, action)] = transition
+        self._entries.move_to_end((key, action))
+        self.inserts += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def verify(self, key: bytes, action: int, entry: Transition, values: np.ndarray, next_key: bytes) -> bool:
+        """Compare a cached transition with the emulated result; drop it when they differ."""
+        self.verified += 1
+        if entry.next_key == next_key and np.array_equal(entry.values, values):
+            return True
+        self.mismatches += 1
+        self._entries.pop((key, action), None)
+        return False
+
+    def clear(self):
+        self._entries.clear()
+        self._seen.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "inserts": self.inserts,
+            "evictions": self.evictions,
+            "verified": self.verified,
+            "mismatches": self.mismatches,
+            "snapshot_bytes": sum(len(entry.snapshot) for entry in self._entries.values()),
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def volatile_addresses(pyboy, frames: int = 600, key_ranges: Sequence[Tuple[int, int]] = KEY_RANGES) -> np.ndarray:
+    """Addresses in ``key_ranges`` that change while the game runs ``frames`` frames
+    without input, e.g. frame counters, to pass as ``TransitionCache(ignore=...)``.
+
+    The emulator is restored to its current state afterwards.
+    """
+    def read():
+        return np.concatenate([np.asarray(pyboy.memory[start:stop], dtype=np.uint8) for start, stop in key_ranges])
+
+    addresses = np.concatenate([np.arange(start, stop) for start, stop in key_ranges])
+    saved = BytesIO()
+    pyboy.save_state(saved)
+    previous = read()
+    changed = np.zeros(len(addresses), dtype=bool)
+    for _ in range(frames):
+        pyboy.tick(1, False)
+        current = read()
+        changed |= current != previous
+        previous = current
+    saved.seek(0)
+    pyboy.load_state(saved)
+    return addresses[changed]
@@ -0,0 +1,127 @@
+"""On-disk cache of evaluation episode results.
+
+Evaluating an unchanged model on an unchanged start state gives the same
+distribution of results every time, so ``evaluate_model.py`` keeps the episode
+rewards and lengths of every evaluation in an ``EvalCache`` and only runs the
+episodes that are missing.
+
+Entries are keyed by ``eval_key()``: a sha256 over the model file, the ROM and
+start-state contents, the env configuration, the seed, the deterministic flag and
+``GenericPyBoyEnv``'s ``REWARD_VERSION``. Bumping ``REWARD_VERSION`` when the
+reward or termination logic changes therefore makes old entries unreachable;
+``invalidate()`` also deletes them right away.
+
+Each entry is one small JSON file. The cache is bounded by ``max_bytes``: when it
+grows beyond that, the least recently used entries are deleted.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from env.generic_env import REWARD_VERSION
+
+DEFAULT_MAX_BYTES = 64 * 2**20
+
+# (path, size, mtime_ns) -> digest, so unchanged files are hashed once per process
+_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """sha256 of a file's contents."""
+    path = Path(path)
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = _digests[key] = h.hexdigest()
+    return digest
+
+
+def eval_key(model_digest: str, state_digest: str, env_config: Dict, seed: Optional[int],
+             deterministic: bool) -> str:
+    """Cache key of an evaluation; ``env_config`` must be JSON serializable."""
+    parts = {
+        "model": model_digest,
+        "state": state_digest,
+        "env": env_config,
+        "seed": seed,
+        "deterministic": bool(deterministic),
+        "reward_version": REWARD_VERSION,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+class EvalCache:
+    def __init__(self, directory: Union[str, Path], max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Tuple[List[float], List[int]]]:
+        """Cached (episode_rewards, episode_lengths) for ``key``, or None."""
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        # the modification time doubles as the last-use time for eviction
+        os.utime(path)
+        return entry["episode_rewards"], entry["episode_lengths"]
+
+    def put(self, key: str, episode_rewards: List[float], episode_lengths: List[int], **metadata):
+        """Store the results for ``key``, replacing any earlier entry, then evict down to ``max_bytes``."""
+        entry = {
+            "reward_version": REWARD_VERSION,
+            "created": time.time(),
+            "episode_rewards": [float(r) for r in episode_rewards],
+            "episode_lengths": [int(n) for n in episode_lengths],
+            **metadata,
+        }
+        path = self._path(key)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entry))
+        os.replace(tmp, path)
+        self.evict()
+
+    def entries(self) -> List[Path]:
+        return [p for p in self.directory.glob("*.json") if not p.name.startswith(".")]
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        for path in self.entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def invalidate(self, all_entries: bool = False) -> int:
+        """Delete entries from other reward versions (or every entry); returns how many were deleted."""
+        removed = 0
+        for path in self.entries():
+            if not all_entries:
+                try:
+                    if json.loads(path.read_text()).get("reward_version") == REWARD_VERSION:
+                        continue
+                except ValueError:
+                    pass
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
@@ -1,53 +1,198 @@
 import argparse
+import functools
+import sys
+from pathlib import Path
+
 from pyboy import PyBoy
 from gymnasium.wrappers import TransformObservation
-from stable_baselines3 import PPO
-from stable_baselines3.common.monitor import Monitor
 from gymnasium.spaces import Box, Dict
 import numpy as np
-from env.generic_env import GenericPyBoyEnv
 
+# Ensure repo root is on sys.path so `import env...` works when running this file directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from env.generic_env import DEFAULT_STATE, GenericPyBoyEnv  # noqa: E402
+from env.replay import ActionRecorder  # noqa: E402
+from env.trajectory_recorder import TrajectoryRecorder  # noqa: E402
+from evaluation.eval_cache import EvalCache, eval_key, file_digest  # noqa: E402
+from evaluation.numpy_policy import NumpyPolicy  # noqa: E402
+from evaluation.parallel_eval import confidence_interval, evaluate_parallel, make_result  # noqa: E402
+
+DEFAULT_CACHE_DIR = ROOT / "logs" / "eval_cache"
 
-def make_env(rom_path: str = "MedarotKabuto.gb"):
+
+def make_env(rom_path: str = "MedarotKabuto.gb", trajectory_dir: str = None, actions_dir: str = None,
+             frame_skip: int = 60, monitor: bool = True):
     pyboy = PyBoy(rom_path)
-    env = GenericPyBoyEnv(pyboy, debug=False, render_mode=False)
+    env = GenericPyBoyEnv(pyboy, debug=False, render_mode=False, frame_skip=frame_skip)
+    if trajectory_dir:
+        # Stream per-step positions for evaluation/visualize_trajectory.py
+        env = TrajectoryRecorder(env, trajectory_dir)
+    if actions_dir:
+        # Compact per-episode action logs for evaluation/replay.py
+        env = ActionRecorder(env, actions_dir)
     env = TransformObservation(env,
         lambda obs: {"info": obs["info"]},
         observation_space=Dict({"info": Box(0, 255, (4,), dtype=np.float32)})
     )
+    if not monitor:
+        return env
+    # imported here so that workers evaluating a NumPy policy never load torch
+    from stable_baselines3.common.monitor import Monitor
     return Monitor(env)
 
 
-def evaluate(model_path: str = "ppo_medarot", rom_path: str = "MedarotKabuto.gb", num_episodes: int = 100):
-    model = PPO.load(model_path)
-    env = make_env(rom_path)
+def _model_file(model_path: str) -> Path:
+    # PPO.load appends .zip when the path does not exist as given
+    path = Path(model_path)
+    if not path.exists() and path.suffix != ".zip":
+        path = Path(f"{model_path}.zip")
+    return path
+
+
+def _enough(rewards, num_episodes: int, ci_tolerance: float, min_episodes: int) -> bool:
+    if len(rewards) >= num_episodes:
+        return True
+    return (ci_tolerance is not None and len(rewards) >= max(min_episodes, 2)
+            and confidence_interval(rewards)[2] <= ci_tolerance)
+
+
+def evaluate(model_path: str = "ppo_medarot", rom_path: str = "MedarotKabuto.gb", num_episodes: int = 100,
+             trajectory_dir: str = None, actions_dir: str = None, num_envs: int = 1, envs_per_worker: int = 1,
+             transport: str = "pipe", deterministic: bool = False, ci_tolerance: float = None,
+             min_episodes: int = 10, verbose: bool = False, frame_skip: int = 60, seed: int = 0,
+             cache_dir: str = None, cache_max_bytes: int = None):
+    """Load the model and run num_episodes episodes on num_envs emulators, returning the rewards list.
+
+    With ``cache_dir`` set, episodes of an earlier evaluation with the same model,
+    ROM, start state, env settings, seed and policy mode are reused and only the
+    missing ones are run. Recording runs always play their episodes.
+    """
+    cache = key = None
+    cached_rewards, cached_lengths = [], []
+    if cache_dir and not (trajectory_dir or actions_dir):
+        cache = EvalCache(cache_dir, **({"max_bytes": cache_max_bytes} if cache_max_bytes else {}))
+        # a stochastic policy samples from batches of num_envs observations, which changes its draws
+        env_config = {"rom": file_digest(rom_path), "frame_skip": frame_skip,
+                      "num_envs": None if deterministic else num_envs}
+        key = eval_key(file_digest(_model_file(model_path)), file_digest(DEFAULT_STATE), env_config, seed,
+                       deterministic)
+        cached_rewards, cached_lengths = cache.get(key) or ([], [])
+        if _enough(cached_rewards, num_episodes, ci_tolerance, min_episodes):
+            rewards, lengths = cached_rewards[:num_episodes], cached_lengths[:num_episodes]
+            print(make_result(rewards, lengths).summary() + " (cached)")
+            return rewards
+
+    if _model_file(model_path).suffix == ".npz":
+        # exported with evaluation/numpy_policy.py: inference without torch
+        model = NumpyPolicy.load(_model_file(model_path))
+        # episodes added to a cached evaluation get fresh random draws
+        rng = np.random.default_rng(seed + len(cached_rewards))
+        predict = functools.partial(model.predict, deterministic=deterministic, rng=rng)
+    else:
+        from stable_baselines3 import PPO
+
+        model = PPO.load(model_path)
+        model.set_random_seed(seed + len(cached_rewards))
+        predict = functools.partial(model.predict, deterministic=deterministic)
 
-    rewards = []
-    for ep in range(num_episodes):
-        obs, _ = env.reset()
-        total = 0
-        done = False
-        while not done:
-            action, _ = model.predict(obs)
-            obs, reward, done, truncated, _ = env.step(action)
-            total += reward
-        rewards.append(total)
-        print(f"Episode {ep+1}: {total}")
+    env_fns = []
+    for i in range(num_envs):
+        # every recording env needs its own directory
+        env_dir, env_actions_dir = trajectory_dir, actions_dir
+        if num_envs > 1:
+            env_dir = trajectory_dir and str(Path(trajectory_dir) / f"env_{i}")
+            env_actions_dir = actions_dir and str(Path(actions_dir) / f"env_{i}")
+        # episode statistics come from the evaluation loop, Monitor's are not needed
+        env_fns.append(functools.partial(make_env, rom_path, env_dir, env_actions_dir, frame_skip, monitor=False))
 
-    print("Average reward:", np.mean(rewards))
+    def on_episode(env_index, reward, length):
+        print(f"Env {env_index}: episode reward {reward} ({length} steps)")
+
+    result = evaluate_parallel(
+        env_fns,
+        # one batched forward pass for all envs per step
+        lambda obs: predict(obs)[0],
+        num_episodes - len(cached_rewards),
+        envs_per_worker=envs_per_worker,
+        transport=transport,
+        ci_tolerance=ci_tolerance,
+        min_episodes=min_episodes,
+        on_episode=on_episode if verbose else None,
+    )
+    if cache is None:
+        print(result.summary())
+        return result.episode_rewards
+
+    rewards = cached_rewards + result.episode_rewards
+    lengths = cached_lengths + result.episode_lengths
+    cache.put(key, rewards, lengths, model=str(model_path), deterministic=deterministic, seed=seed)
+    summary = make_result(rewards, lengths, result.confidence, result.stopped_early, result.elapsed).summary()
+    if cached_rewards:
+        summary += f" ({len(cached_rewards)} episodes from the cache)"
+    print(summary)
     return rewards
 
 
+def add_eval_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--episodes", type=int, default=100,
+                        help="Number of episodes to run")
+    parser.add_argument("--num-envs", type=int, default=1,
+                        help="Number of emulators the episodes are spread over; a multiple of it as --episodes "
+                             "keeps every emulator busy until the end (default: 1)")
+    parser.add_argument("--envs-per-worker", type=int, default=1,
+                        help="Emulators hosted per worker process; a worker keeps emulating (and discarding "
+                             "episodes) until all of its emulators ran their share (default: 1)")
+    parser.add_argument("--transport", choices=["pipe", "shm"], default="pipe",
+                        help="How workers return step results; 'shm' uses shared memory (default: pipe)")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="Use the deterministic (greedy) policy action")
+    parser.add_argument("--ci-tolerance", type=float, default=None,
+                        help="Stop early once the 95%% confidence interval half-width of the mean reward is below this")
+    parser.add_argument("--min-episodes", type=int, default=10,
+                        help="Episodes to run before early stopping is considered (default: 10)")
+    parser.add_argument("--verbose", action="store_true", help="Print every finished episode")
+    parser.add_argument("--record-trajectory", default=None,
+                        help="Directory to stream per-step positions into (see visualize_trajectory.py)")
+    parser.add_argument("--record-actions", default=None,
+                        help="Directory to save a replayable action log of every episode into (see replay.py)")
+    parser.add_argument("--frame-skip", type=int, default=60,
+                        help="Emulator frames advanced per action; use the value the model was trained with")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the policy's action sampling (default: 0)")
+    parser.add_argument("--eval-cache", default=str(DEFAULT_CACHE_DIR),
+                        help="Directory of cached episode results (default: logs/eval_cache)")
+    parser.add_argument("--no-eval-cache", action="store_true", help="Always run every episode")
+    parser.add_argument("--eval-cache-mb", type=float, default=64, help="Size bound of the cache (default: 64 MB)")
+    parser.add_argument("--clear-eval-cache", action="store_true", help="Delete all cached results first")
+
+
+def run_from_args(args):
+    cache_dir = None if args.no_eval_cache else args.eval_cache
+    if cache_dir:
+        cache = EvalCache(cache_dir)
+        # entries of older reward versions can never be hit again
+        removed = cache.invalidate(all_entries=args.clear_eval_cache)
+        if removed:
+            print(f"Removed {removed} cached evaluation results")
+    return evaluate(model_path=args.model, rom_path=args.rom, num_episodes=args.episodes,
+                    trajectory_dir=args.record_trajectory, actions_dir=args.record_actions,
+                    num_envs=args.num_envs,
+                    envs_per_worker=args.envs_per_worker, transport=args.transport,
+                    deterministic=args.deterministic, ci_tolerance=args.ci_tolerance,
+                    min_episodes=args.min_episodes, verbose=args.verbose, frame_skip=args.frame_skip,
+                    seed=args.seed, cache_dir=cache_dir, cache_max_bytes=int(args.eval_cache_mb * 2**20))
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--model", default="ppo_medarot",
-                        help="Path to trained model")
+                        help="Path to trained model (.zip, or .npz exported by numpy_policy.py to run without torch)")
     parser.add_argument("--rom", default="MedarotKabuto.gb",
                         help="Path to ROM file")
-    parser.add_argument("--episodes", type=int, default=100,
-                        help="Number of episodes to run")
-    args = parser.parse_args()
-    evaluate(model_path=args.model, rom_path=args.rom, num_episodes=args.episodes)
+    add_eval_arguments(parser)
+    run_from_args(parser.parse_args())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+"""Torch-free inference for trained PPO policies.
+
+Loading a model with ``PPO.load`` imports PyTorch and Stable-Baselines3 (seconds of
+startup and a few hundred MB per process), and ``model.predict`` adds tensor
+conversion overhead to every call, which dominates for the small networks trained
+here. ``export_policy`` writes the weights of a ``MultiInputPolicy`` into a
+compressed ``.npz`` with a JSON description of the network, and ``NumpyPolicy``
+runs the same forward pass with NumPy on whole batches of observations.
+
+Supported are the default building blocks: ``Flatten`` and ``NatureCNN`` feature
+extractors (also unshared between actor and critic), MLPs of ``Linear`` layers
+with ``Tanh``/``ReLU`` activations, and ``Discrete`` action spaces. Exporting
+anything else raises ``ValueError``.
+
+The savings are largest for the MLP policies over the ``info`` vector: no torch
+import, and a batched forward pass an order of magnitude faster than
+``model.predict``. With a ``NatureCNN`` the convolutions dominate, and NumPy is
+about as fast as torch's CPU kernels, so only the import time and memory are saved.
+
+``check_equivalence`` compares the action log-probabilities and values of both
+implementations on sampled observations; ``export_policy`` runs it by default and
+refuses to write a file that deviates.
+
+Usage:
+    python evaluation/numpy_policy.py models/ppo_medarot_v2.zip models/ppo_medarot_v2.npz
+    python evaluation/evaluate_model.py --model models/ppo_medarot_v2.npz
+
+Only the exporter and the check import torch; loading and running a
+``NumpyPolicy`` needs NumPy alone.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+POLICY_FORMAT = 1
+
+
+def _softmax_log(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    return shifted - np.log(np.exp(shifted).sum(axis=1, keepdims=True))
+
+
+def _conv2d(x: np.ndarray, weight: np.ndarray, bias: np.ndarray, stride: int) -> np.ndarray:
+    # x (B, C, H, W), weight (O, C, kh, kw); no padding, as in NatureCNN
+    _, _, kh, kw = weight.shape
+    windows = np.lib.stride_tricks.sliding_window_view(x, (kh, kw), axis=(2, 3))[:, :, ::stride, ::stride]
+    out = np.tensordot(windows, weight, axes=([1, 4, 5], [1, 2, 3]))
+    out += bias
+    return out.transpose(0, 3, 1, 2)
+
+
+def _run(ops: List, arrays: Dict[str, np.ndarray], x: np.ndarray) -> np.ndarray:
+    for op in ops:
+        kind = op[0]
+        if kind == "linear":
+            x = x @ arrays[op[1]]
+            x += arrays[op[2]]
+        elif kind == "conv":
+            x = _conv2d(x, arrays[op[1]], arrays[op[2]], op[3])
+        elif kind == "tanh":
+            x = np.tanh(x)
+        elif kind == "relu":
+            x = np.maximum(x, 0)
+        elif kind == "flatten":
+            x = x.reshape(len(x), -1)
+        else:
+            raise ValueError(f"Unknown op {kind!r}")
+    return x
+
+
+class NumpyPolicy:
+    """Forward pass of an exported policy. Load with ``NumpyPolicy.load(path)``."""
+
+    def __init__(self, spec: Dict, arrays: Dict[str, np.ndarray]):
+        if spec.get("format") != POLICY_FORMAT:
+            raise ValueError(f"Unsupported policy format {spec.get('format')!r}")
+        self.spec = spec
+        self.arrays = {name: np.ascontiguousarray(a, dtype=np.float32) for name, a in arrays.items()}
+        self.obs_keys = [key for key, _ in spec["observation"]]
+        self._obs_shapes = dict((key, tuple(shape)) for key, shape in spec["observation"])
+        self.n_actions = spec["n_actions"]
+
+    @classmethod
+    def load(cls, path) -> "NumpyPolicy":
+        with np.load(path) as data:
+            spec = json.loads(str(data["spec"]))
+            arrays = {name: data[name] for name in data.files if name != "spec"}
+        return cls(spec, arrays)
+
+    def _features(self, extractors: Dict, obs: Dict[str, np.ndarray]) -> np.ndarray:
+        parts = []
+        for key in self.obs_keys:
+            extractor = extractors[key]
+            x = np.asarray(obs[key], dtype=np.float32)
+            if extractor["scale"] != 1.0:
+                x = x * np.float32(extractor["scale"])
+            parts.append(_run(extractor["ops"], self.arrays, x).reshape(len(x), -1))
+        return parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1)
+
+    def _batched(self, obs) -> Tuple[Dict[str, np.ndarray], bool]:
+        key = self.obs_keys[0]
+        single = np.ndim(obs[key]) == len(self._obs_shapes[key])
+        if single:
+            obs = {k: np.asarray(obs[k])[None] for k in self.obs_keys}
+        return obs, single
+
+    def forward(self, obs: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Action logits (B, n_actions) and values (B,) for a batch of observations."""
+        spec, arrays = self.spec, self.arrays
+        pi_features = self._features(spec["pi_extractors"], obs)
+        if spec["vf_extractors"] is None:
+            vf_features = pi_features
+        else:
+            vf_features = self._features(spec["vf_extractors"], obs)
+        logits = _run(spec["action_net"], arrays, _run(spec["policy_net"], arrays, pi_features))
+        values = _run(spec["value_head"], arrays, _run(spec["value_net"], arrays, vf_features))
+        return logits, values[:, 0]
+
+    def predict(self, obs, deterministic: bool = False, rng: Optional[np.random.Generator] = None):
+        """Like ``model.predict``: returns (actions, None) for a batch or a single observation."""
+        obs, single = self._batched(obs)
+        pi_features = self._features(self.spec["pi_extractors"], obs)
+        logits = _run(self.spec["action_net"], self.arrays, _run(self.spec["policy_net"], self.arrays, pi_features))
+        if deterministic:
+            actions = logits.argmax(axis=1)
+        else:
+            rng = rng if rng is not None else np.random.default_rng()
+            # Gumbel-max: argmax of logits plus Gumbel noise samples from the softmax
+            actions = (logits - np.log(-np.log(rng.random(logits.shape)))).argmax(axis=1)
+        return (actions[0] if single else actions), None
+
+
+# --- export (needs torch and Stable-Baselines3) ---
+
+def _module_ops(module, name: str, arrays: Dict[str, np.ndarray]) -> List:
+    from torch import nn
+    from stable_baselines3.common.torch_layers import FlattenExtractor, NatureCNN
+
+    if isinstance(module, nn.Sequential):
+        ops = []
+        for i, child in enumerate(module):
+            ops += _module_ops(child, f"{name}.{i}", arrays)
+        return ops
+    if isinstance(module, NatureCNN):
+        return _module_ops(module.cnn, f"{name}.cnn", arrays) + _module_ops(module.linear, f"{name}.linear", arrays)
+    if isinstance(module, FlattenExtractor):
+        return [["flatten"]]
+    if isinstance(module, nn.Linear):
+        # stored transposed so the forward pass is x @ W
+        arrays[f"{name}.w"] = module.weight.detach().cpu().numpy().T
+        arrays[f"{name}.b"] = module.bias.detach().cpu().numpy()
+        return [["linear", f"{name}.w", f"{name}.b"]]
+    if isinstance(module, nn.Conv2d):
+        if (any(module.padding) or module.dilation != (1, 1) or module.groups != 1
+                or module.stride[0] != module.stride[1]):
+            raise ValueError(f"Cannot export {module}: only unpadded, square-stride convolutions are supported")
+        arrays[f"{name}.w"] = module.weight.detach().cpu().numpy()
+        arrays[f"{name}.b"] = module.bias.detach().cpu().numpy()
+        return [["conv", f"{name}.w", f"{name}.b", module.stride[0]]]
+    if isinstance(module, nn.Tanh):
+        return [["tanh"]]
+    if isinstance(module, nn.ReLU):
+        return [["relu"]]
+    if isinstance(module, nn.Flatten):
+        return [["flatten"]]
+    if isinstance(module, nn.Identity):
+        return []
+    raise ValueError(f"Cannot export layer {type(module).__name__}")
+
+
+def _extractor_spec(policy, extractor, name: str, arrays: Dict[str, np.ndarray]) -> Dict:
+    from stable_baselines3.common.preprocessing import is_image_space
+    from stable_baselines3.common.torch_layers import CombinedExtractor
+
+    if not isinstance(extractor, CombinedExtractor):
+        raise ValueError(f"Cannot export {type(extractor).__name__}; expected the CombinedExtractor "
+                         "of a MultiInputPolicy")
+    spec = {}
+    for key, sub in extractor.extractors.items():
+        space = policy.observation_space.spaces[key]
+        scale = 1.0 / 255 if policy.normalize_images and is_image_space(space) else 1.0
+        spec[key] = {"scale": scale, "ops": _module_ops(sub, f"{name}.{key}", arrays)}
+    return spec
+
+
+def policy_spec(model) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """The JSON description and weight arrays of ``model``'s policy."""
+    from gymnasium import spaces
+
+    policy = model.policy
+    if not isinstance(policy.action_space, spaces.Discrete):
+        raise ValueError(f"Only Discrete action spaces are supported, got {policy.action_space}")
+    if not isinstance(policy.observation_space, spaces.Dict):
+        raise ValueError("Only MultiInputPolicy (Dict observation spaces) is supported")
+    arrays: Dict[str, np.ndarray] = {}
+    shared = policy.share_features_extractor
+    spec = {
+        "format": POLICY_FORMAT,
+        "algo": type(model).__name__,
+        "observation": [[key, list(space.shape)] for key, space in policy.observation_space.spaces.items()],
+        "n_actions": int(policy.action_space.n),
+        "pi_extractors": _extractor_spec(policy, policy.pi_features_extractor, "pi_features", arrays),
+        "vf_extractors": None if shared else _extractor_spec(policy, policy.vf_features_extractor, "vf_features",
+                                                             arrays),
+        "policy_net": _module_ops(policy.mlp_extractor.policy_net, "policy_net", arrays),
+        "value_net": _module_ops(policy.mlp_extractor.value_net, "value_net", arrays),
+        "action_net": _module_ops(policy.action_net, "action_net", arrays),
+        "value_head": _module_ops(policy.value_net, "value_head", arrays),
+    }
+    return spec, arrays
+
+
+def sample_observations(observation_space, n: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    observation_space.seed(seed)
+    samples = [observation_space.sample() for _ in range(n)]
+    return {key: np.stack([s[key] for s in samples]) for key in observation_space.spaces}
+
+
+def check_equivalence(model, policy: NumpyPolicy, obs: Optional[Dict[str, np.ndarray]] = None,
+                      n: int = 256, seed: int = 0) -> Dict[str, float]:
+    """Largest differences between SB3 and ``policy`` on ``obs`` (default: ``n`` sampled observations).
+
+    Returns ``log_prob`` and ``value`` (max absolute differences) and ``action_agreement``
+    (fraction of equal greedy actions).
+    """
+    import torch as th
+
+    if obs is None:
+        obs = sample_observations(model.observation_space, n, seed)
+    with th.no_grad():
+        obs_tensor, _ = model.policy.obs_to_tensor(obs)
+        log_probs = model.policy.get_distribution(obs_tensor).distribution.logits.cpu().numpy()
+        values = model.policy.predict_values(obs_tensor).cpu().numpy()[:, 0]
+    logits, np_values = policy.forward(obs)
+    np_log_probs = _softmax_log(logits)
+    return {
+        "log_prob": float(np.abs(np_log_probs - log_probs).max()),
+        "value": float(np.abs(np_values - values).max()),
+        "action_agreement": float(np.mean(np_log_probs.argmax(axis=1) == log_probs.argmax(axis=1))),
+    }
+
+
+def export_policy(model, path, check: bool = True, atol: float = 1e-4) -> Optional[Dict[str, float]]:
+    """Write ``model``'s policy to ``path`` (``.npz``) and return the equivalence check result.
+
+    With ``check`` the NumPy forward pass is compared against SB3 first and
+    ``RuntimeError`` is raised (and nothing written) when log-probabilities or
+    values differ by more than ``atol``.
+    """
+    spec, arrays = policy_spec(model)
+    report = None
+    if check:
+        report = check_equivalence(model, NumpyPolicy(spec, arrays))
+        if report["log_prob"] > atol or report["value"] > atol:
+            raise RuntimeError(f"NumPy policy deviates from the SB3 policy: {report}")
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, spec=np.array(json.dumps(spec)), **arrays)
+    os.replace(tmp, path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a trained PPO policy for torch-free inference")
+    parser.add_argument("model", help="Model zip saved by Stable-Baselines3")
+    parser.add_argument("output", help="Where to write the .npz policy")
+    parser.add_argument("--atol", type=float, default=1e-4, help="Max allowed deviation from SB3 (default: 1e-4)")
+    args = parser.parse_args()
+
+    from stable_baselines3 import PPO
+
+    model = PPO.load(args.model, device="cpu")
+    report = export_policy(model, args.output, atol=args.atol)
+    print(f"Wrote {args.output} ({Path(args.output).stat().st_size / 1024:.1f} KiB); max difference to SB3: "
+          f"log-prob {report['log_prob']:.2e}, value {report['value']:.2e}, "
+          f"greedy actions agree {report['action_agreement']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Parallel, batched policy evaluation.
+
+Episodes are spread over a ``BatchedEnvPool`` of emulator processes, and the policy
+is queried once per step for all live envs, so inference is batched instead of
+called per env. Episodes are assigned to the envs up front (env ``i`` runs
+``(num_episodes + i) // num_envs`` of them, as in SB3's ``evaluate_policy``), so fast
+envs do not bias the result towards short episodes. Workers whose envs have all run
+their share stop stepping; with ``envs_per_worker > 1`` a finished env keeps
+emulating (results discarded) until the other envs of its worker are done.
+
+Results are summarized as mean, standard deviation and a normal-approximation
+confidence interval of the episode return. With ``ci_tolerance`` set, evaluation
+stops early once the half-width of the interval is at most ``ci_tolerance`` over
+at least ``min_episodes`` episodes. The interval is only taken over a balanced
+prefix: the first ``k`` episodes of every env, where ``k`` is the number of
+episodes every unfinished env has completed. Envs that finish episodes faster
+(here: by reaching the target) would otherwise be over-represented when stopping.
+An early-stopped result holds just that prefix; later episodes of faster envs are
+discarded (``on_episode`` has already seen them).
+
+Like ``env.batched_env`` this module does not import Stable-Baselines3; ``predict``
+is any callable mapping a batch of observations to a batch of actions, e.g.
+``lambda obs: model.predict(obs, deterministic=True)[0]``.
+"""
+import time
+from statistics import NormalDist
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from env.batched_env import BatchedEnvPool
+
+
+class EvalResult(NamedTuple):
+    episode_rewards: List[float]
+    episode_lengths: List[int]
+    mean: float
+    std: float
+    # half-width of the confidence interval around mean
+    ci: float
+    confidence: float
+    stopped_early: bool
+    elapsed: float
+
+    def summary(self) -> str:
+        n = len(self.episode_rewards)
+        text = (f"{n} episodes: mean reward {self.mean:.3f} +/- {self.ci:.3f} "
+                f"({self.confidence:.0%} CI), std {self.std:.3f}, "
+                f"mean length {np.mean(self.episode_lengths) if n else 0:.1f} steps, {self.elapsed:.1f}s")
+        if self.stopped_early:
+            text += " (stopped early)"
+        return text
+
+
+def confidence_interval(values: Sequence[float], confidence: float = 0.95) -> Tuple[float, float, float]:
+    """Return (mean, std, half-width) of a normal-approximation interval for the mean."""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return float("nan"), float("nan"), float("inf")
+    mean = float(values.mean())
+    if n == 1:
+        return mean, 0.0, float("inf")
+    std = float(values.std(ddof=1))
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return mean, std, z * std / np.sqrt(n)
+
+
+def make_result(episode_rewards: List[float], episode_lengths: List[int], confidence: float = 0.95,
+                stopped_early: bool = False, elapsed: float = 0.0) -> EvalResult:
+    mean, std, ci = confidence_interval(episode_rewards, confidence)
+    return EvalResult(list(episode_rewards), list(episode_lengths), mean, std, ci, confidence, bool(stopped_early),
+                      elapsed)
+
+
+def _batch(obs):
+    # BatchedEnvPool keys a non-dict observation space as None
+    return obs[None] if None in obs else obs
+
+
+def evaluate_pool(pool: BatchedEnvPool, predict: Callable, num_episodes: int, ci_tolerance: Optional[float] = None,
+                  min_episodes: int = 10, confidence: float = 0.95,
+                  on_episode: Optional[Callable[[int, float, int], None]] = None) -> EvalResult:
+    """Run ``num_episodes`` episodes on an existing pool (which is reset first).
+
+    ``on_episode(env_index, reward, length)`` is called for every finished episode.
+    """
+    start_time = time.perf_counter()
+    n = pool.num_envs
+    targets = np.array([(num_episodes + i) // n for i in range(n)], dtype=np.int64)
+    counts = np.zeros(n, dtype=np.int64)
+    returns = np.zeros(n, dtype=np.float64)
+    lengths = np.zeros(n, dtype=np.int64)
+    episode_rewards: List[float] = []
+    episode_lengths: List[int] = []
+    # per env, for the balanced prefix
+    env_episodes: List[List[Tuple[float, int]]] = [[] for _ in range(n)]
+    checked_rounds = 0
+    stopped_early = False
+
+    obs = pool.reset()
+    while (counts < targets).any():
+        actions = np.asarray(predict(_batch(obs)))
+        # workers whose envs all ran their share are no longer stepped; idle envs that
+        # share a worker with an active one keep stepping, but their results are ignored
+        active = counts < targets
+        obs, rewards, terminated, truncated, _ = pool.step(actions, active)
+        returns += np.where(active, rewards, 0.0)
+        lengths += active
+        for i in np.flatnonzero(active & (terminated | truncated)).tolist():
+            episode_rewards.append(float(returns[i]))
+            episode_lengths.append(int(lengths[i]))
+            env_episodes[i].append((float(returns[i]), int(lengths[i])))
+            if on_episode is not None:
+                on_episode(i, float(returns[i]), int(lengths[i]))
+            counts[i] += 1
+            returns[i] = 0.0
+            lengths[i] = 0
+        unfinished = counts < targets
+        if ci_tolerance is None or not unfinished.any():
+            continue
+        # episodes every unfinished env has completed; only test when that grows
+        rounds = int(counts[unfinished].min())
+        if rounds == checked_rounds:
+            continue
+        checked_rounds = rounds
+        prefix = [episodes[r] for r in range(rounds) for episodes in env_episodes if r < len(episodes)]
+        if len(prefix) >= max(min_episodes, 2) and \
+                confidence_interval([r for r, _ in prefix], confidence)[2] <= ci_tolerance:
+            episode_rewards = [r for r, _ in prefix]
+            episode_lengths = [length for _, length in prefix]
+            stopped_early = True
+            break
+
+    return make_result(episode_rewards, episode_lengths, confidence, stopped_early,
+                       time.perf_counter() - start_time)
+
+
+def evaluate_parallel(env_fns: Sequence[Callable], predict: Callable, num_episodes: int, envs_per_worker: int = 1,
+                      transport: str = "pipe", start_method: Optional[str] = None, **kwargs) -> EvalResult:
+    """Build a ``BatchedEnvPool`` from ``env_fns``, evaluate on it and shut it down.
+
+    Keyword arguments are passed on to ``evaluate_pool``.
+    """
+    pool = BatchedEnvPool(env_fns, envs_per_worker=envs_per_worker, start_method=start_method, transport=transport)
+    try:
+        return evaluate_pool(pool, predict, num_episodes, **kwargs)
+    finally:
+        pool.close()
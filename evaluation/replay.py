@@ -0,0 +1,100 @@
+"""Replay action logs recorded with ``env.replay.ActionRecorder``.
+
+Usage:
+    python evaluation/replay.py logs/replays/episode_000003.npz --trajectory logs/replay_trajectory
+    python evaluation/replay.py logs/replays/episode_000003.npz --ram-trace logs/ram_trace
+    python evaluation/replay.py logs/replays/episode_000003.npz --frames logs/frames --frame-every 10
+
+Record logs with ``python evaluation/evaluate_model.py --record-actions logs/replays``.
+
+The episode is re-run headless at full emulator speed and checked against the RAM
+checksums stored in the log. ``--trajectory`` writes the same columnar log as
+``--record-trajectory`` (readable by ``visualize_trajectory.py``), ``--ram-trace``
+writes every ``RAM_FIELDS`` value per step as a columnar log, and ``--frames``
+saves screenshots as PNG files. Without any output option the replay only
+verifies the log.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from pyboy import PyBoy
+
+# Ensure repo root is on sys.path so `import env...` works when running this file directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from env.columnar import ColumnarWriter  # noqa: E402
+from env.generic_env import GenericPyBoyEnv  # noqa: E402
+from env.replay import ActionLog, ReplayDivergence, replay, state_path  # noqa: E402
+from env.trajectory_recorder import TrajectoryRecorder  # noqa: E402
+
+DEFAULT_ROM = ROOT / "data" / "MedarotKabuto.gb"
+
+
+def ram_trace_columns(fields):
+    # unsigned little-endian values of 1, 2 or up to 4 bytes
+    columns = [("step", np.uint32)]
+    for f in fields:
+        columns.append((f.name, np.uint8 if f.width == 1 else np.uint16 if f.width == 2 else np.uint32))
+    return columns
+
+
+def run(log_path: Path, rom_path: Path, trajectory_dir=None, ram_trace_dir=None, frames_dir=None,
+        frame_every: int = 1, verify: bool = True) -> float:
+    log = ActionLog.load(log_path)
+    render = frames_dir is not None
+    pyboy = PyBoy(str(rom_path), window="null")
+    env = GenericPyBoyEnv(pyboy, render_mode=render, state_path=state_path(log_path.parent, log.start_state),
+                          frame_skip=log.frame_skip, emulation_speed=0)
+    if trajectory_dir:
+        env = TrajectoryRecorder(env, trajectory_dir)
+
+    writer = None
+    if ram_trace_dir:
+        writer = ColumnarWriter(ram_trace_dir, ram_trace_columns(env.unwrapped.ram.fields))
+    if frames_dir:
+        Path(frames_dir).mkdir(parents=True, exist_ok=True)
+
+    def on_step(step, env):
+        if writer is not None:
+            # the values the env read from RAM during this step
+            writer.append(step, *env.unwrapped.ram.values.tolist())
+        if render and step % frame_every == 0:
+            env.unwrapped.pyboy.screen.image.save(Path(frames_dir) / f"frame_{step:07d}.png")
+
+    start = time.perf_counter()
+    try:
+        total_reward = replay(env, log, log_path.parent, verify=verify, on_step=on_step)
+    finally:
+        if writer is not None:
+            writer.close()
+        env.close()
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {log.num_steps} steps in {elapsed:.2f}s ({log.num_steps / elapsed:.0f} steps/s), "
+          f"reward {total_reward:.3f} (recorded {log.total_reward:.3f})" + (", checksums match" if verify else ""))
+    return total_reward
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded action log")
+    parser.add_argument("log", help="Action log (.npz) written by ActionRecorder")
+    parser.add_argument("--rom", default=str(DEFAULT_ROM), help="Path to ROM file")
+    parser.add_argument("--trajectory", default=None, help="Write the replayed positions to this directory")
+    parser.add_argument("--ram-trace", default=None, help="Write all RAM fields per step to this directory")
+    parser.add_argument("--frames", default=None, help="Save screenshots as PNG files into this directory")
+    parser.add_argument("--frame-every", type=int, default=1, help="Save every N-th frame with --frames")
+    parser.add_argument("--no-verify", action="store_true", help="Skip the RAM checksum comparison")
+    args = parser.parse_args()
+    try:
+        run(Path(args.log), Path(args.rom), trajectory_dir=args.trajectory, ram_trace_dir=args.ram_trace,
+            frames_dir=args.frames, frame_every=args.frame_every, verify=not args.no_verify)
+    except ReplayDivergence as e:
+        raise SystemExit(f"Replay diverged from the recording: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,45 @@
 
 Usage:
     python evaluation/visualize_trajectory.py --input path/to/trajectory.csv --output logs/trajectory.png
+    python evaluation/visualize_trajectory.py --input logs/trajectory --mode heatmap --map-id 80 --episodes 0:100
 
 If no input is provided, the script will look for `logs/ppo_medarot/monitor.csv` or `logs/ppo_medarot/trajectory.csv`.
 The input CSV is expected to have columns `x` and `y` (or `pos_x`, `pos_y`).
 
+The input can also be a trajectory directory written by `env.trajectory_recorder.TrajectoryRecorder`
+(e.g. `python evaluation/evaluate_model.py --record-trajectory logs/trajectory`); its columns are
+memory-mapped rather than loaded up front.
+
+`--mode heatmap` is meant for long runs: it streams the input in chunks (memory-mapped
+columns, or `pd.read_csv(chunksize=...)` for CSVs) and accumulates one 256x256 visit-count
+grid per map instead of plotting every point, so memory use does not grow with the log.
+`--map-id` and `--episodes` need `map_id` / `episode` columns in the input.
+
 Note: Stable Baselines' Monitor CSVs do not include position by default; you must
 emit a custom CSV with player coordinates or preprocess logs to include x,y columns.
 """
 import argparse
+import math
+import sys
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+
+# Ensure repo root is on sys.path so `import env...` works when running this file directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from env.columnar import ColumnarReader  # noqa: E402
 
 
 DEFAULT_LOG = Path(__file__).resolve().parents[1] / "logs" / "ppo_medarot" / "monitor.csv"
 
+# x, y and map_id are single RAM bytes
+GRID_SIZE = 256
+
 
 def find_coords(df: pd.DataFrame):
     for xcol in ("x", "pos_x", "player_x"):
@@ -30,6 +54,89 @@ def find_coords(df: pd.DataFrame):
     raise ValueError("No coordinate columns found in dataframe")
 
 
+def iter_chunks(in_path: Path, chunk_rows: int = 1_000_000):
+    """Yield dicts with ``x``, ``y`` and, when the input has them, ``map_id`` / ``episode`` arrays."""
+    if ColumnarReader.is_log(in_path):
+        reader = ColumnarReader(in_path)
+        names = [n for n in ("x", "y", "map_id", "episode") if n in reader.names]
+        yield from reader.iter_chunks(names, chunk_rows)
+        return
+    for df in pd.read_csv(in_path, chunksize=chunk_rows):
+        x, y = find_coords(df)
+        chunk = {"x": x, "y": y}
+        for name in ("map_id", "episode"):
+            if name in df.columns:
+                chunk[name] = df[name].to_numpy()
+        yield chunk
+
+
+def accumulate_heatmaps(chunks, map_ids=None, episodes=None):
+    """Sum visit counts per map into ``{map_id: (256, 256) int64 array}``, indexed [y, x].
+
+    ``map_ids`` is a collection of maps to keep and ``episodes`` a ``(start, stop)``
+    half-open range; either can be None. Inputs without a ``map_id`` column are
+    accumulated under map -1.
+    """
+    grids = {}
+    for chunk in chunks:
+        x = np.asarray(chunk["x"]).astype(np.int64)
+        y = np.asarray(chunk["y"]).astype(np.int64)
+        keep = (x >= 0) & (x < GRID_SIZE) & (y >= 0) & (y < GRID_SIZE)
+        if episodes is not None:
+            if "episode" not in chunk:
+                raise ValueError("--episodes needs an 'episode' column in the input")
+            episode = np.asarray(chunk["episode"])
+            keep &= (episode >= episodes[0]) & (episode < episodes[1])
+        if "map_id" in chunk:
+            maps = np.asarray(chunk["map_id"]).astype(np.int64)
+        elif map_ids is not None:
+            raise ValueError("--map-id needs a 'map_id' column in the input")
+        else:
+            maps = np.full(len(x), -1, dtype=np.int64)
+        if map_ids is not None:
+            keep &= np.isin(maps, list(map_ids))
+
+        cells = y[keep] * GRID_SIZE + x[keep]
+        maps = maps[keep]
+        for map_id in np.unique(maps).tolist():
+            counts = np.bincount(cells[maps == map_id], minlength=GRID_SIZE * GRID_SIZE)
+            grid = grids.setdefault(map_id, np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.int64))
+            grid += counts.reshape(GRID_SIZE, GRID_SIZE)
+    return grids
+
+
+def plot_heatmaps(grids, out_path: Path):
+    """One log-scaled visit-count image per map, cropped to the visited area."""
+    map_ids = sorted(grids)
+    cols = min(4, len(map_ids))
+    rows = math.ceil(len(map_ids) / cols)
+    fig, axes = plt.subplots(rows, cols, figsize=(4 * cols, 4 * rows), squeeze=False)
+    for ax in axes.flat[len(map_ids):]:
+        ax.axis("off")
+    for ax, map_id in zip(axes.flat, map_ids):
+        grid = grids[map_id]
+        ys, xs = np.nonzero(grid)
+        y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        image = ax.imshow(grid[y0:y1, x0:x1], norm=LogNorm(vmin=1, vmax=grid.max()), cmap="viridis",
+                          extent=(x0 - 0.5, x1 - 0.5, y1 - 0.5, y0 - 0.5), interpolation="nearest")
+        ax.set_title(f"map {map_id}" if map_id >= 0 else "all maps")
+        fig.colorbar(image, ax=ax, fraction=0.046, label="visits")
+    fig.suptitle("Visit counts")
+    fig.tight_layout()
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(out_path, dpi=150)
+    plt.close(fig)
+
+
+def parse_episodes(value: str):
+    """Parse ``A:B`` (either side optional) into a half-open (start, stop) range."""
+    start, sep, stop = value.partition(":")
+    if not sep:
+        start = stop = value
+        return int(start), int(stop) + 1
+    return int(start) if start else 0, int(stop) if stop else np.iinfo(np.int64).max
+
+
 def plot_trajectory(x, y, out_path: Path):
     plt.figure(figsize=(6, 6))
     plt.plot(x, y, marker="o", linewidth=1)
@@ -46,8 +153,15 @@ def plot_trajectory(x, y, out_path: Path):
 
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument("--input", "-i", help="Input CSV with coordinates (x,y)")
+    p.add_argument("--input", "-i", help="Input CSV with coordinates (x,y) or a recorded trajectory directory")
     p.add_argument("--output", "-o", default="logs/trajectory.png", help="Output PNG path")
+    p.add_argument("--mode", choices=("path", "heatmap"), default="path",
+                   help="Plot the raw path, or per-map visit-count heatmaps (for large logs)")
+    p.add_argument("--map-id", type=int, action="append", default=None,
+                   help="Heatmap only: keep this map (can be repeated)")
+    p.add_argument("--episodes", type=parse_episodes, default=None,
+                   help="Heatmap only: episode range A:B (B exclusive) or a single episode")
+    p.add_argument("--chunk-rows", type=int, default=1_000_000, help="Heatmap only: rows read per chunk")
     args = p.parse_args()
 
     in_path = Path(args.input) if args.input else DEFAULT_LOG
@@ -55,14 +169,34 @@ def main():
         print(f"Input file not found: {in_path}")
         return
 
-    df = pd.read_csv(in_path)
-    try:
-        x, y = find_coords(df)
-    except Exception as e:
-        print("Failed to extract coordinates:", e)
+    out_path = Path(args.output)
+    if args.mode == "heatmap":
+        try:
+            grids = accumulate_heatmaps(iter_chunks(in_path, args.chunk_rows), args.map_id, args.episodes)
+        except ValueError as e:
+            print("Failed to build heatmaps:", e)
+            return
+        if not grids:
+            print("No steps match the filters")
+            return
+        plot_heatmaps(grids, out_path)
+        print(f"Saved heatmaps for {len(grids)} map(s) to {out_path}")
         return
 
-    out_path = Path(args.output)
+    if ColumnarReader.is_log(in_path):
+        reader = ColumnarReader(in_path)
+        if len(reader) == 0:
+            print(f"No steps recorded in {in_path}")
+            return
+        x, y = reader.column("x"), reader.column("y")
+    else:
+        df = pd.read_csv(in_path)
+        try:
+            x, y = find_coords(df)
+        except Exception as e:
+            print("Failed to extract coordinates:", e)
+            return
+
     plot_trajectory(x, y, out_path)
     print(f"Saved trajectory plot to {out_path}")
 
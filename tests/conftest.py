@@ -0,0 +1,80 @@
+"""Shared test helpers: a PyBoy stand-in and GenericPyBoyEnv factories built on it."""
+import types
+
+import numpy as np
+import pytest
+
+from env.generic_env import GenericPyBoyEnv
+
+
+class DummyPyBoy:
+    """Minimal PyBoy-like object for unit tests: exposes memory, screen, button, tick, load_state, stop."""
+
+    def __init__(self):
+        # initialize memory with zeros and set some sensible defaults
+        self.memory = bytearray(0xFFFF)
+        # place default player pos: x=16, y=8, map=80, orientation=1
+        self.memory[0xC0D4] = 16
+        self.memory[0xC0D5] = 8
+        self.memory[0xC92D] = 80
+        self.memory[0xC0D8] = 1
+        self.frames = 0
+        # RGBA screen buffer like pyboy.screen.ndarray; rendering paints it with the frame count
+        self.screen = types.SimpleNamespace(ndarray=np.zeros((144, 160, 4), dtype=np.uint8))
+
+    def button(self, name):
+        # no-op for tests
+        pass
+
+    def tick(self, count=1, render=True):
+        # no emulation for tests - just count frames
+        self.frames += count
+        if render:
+            self.screen.ndarray[...] = self.frames % 256
+        return True
+
+    def load_state(self, f):
+        # pretend to load - remember what was read so tests can check it; buffers
+        # written by save_state() restore the memory
+        self.loaded_state = f.read()
+        if len(self.loaded_state) == len(self.memory):
+            self.memory[:] = self.loaded_state
+        return True
+
+    def save_state(self, f):
+        f.write(bytes(self.memory))
+
+    def stop(self):
+        pass
+
+
+def make_env_fn(state_file, max_gameplay_time=1_080_000):
+    """Env factory (for vec envs and worker pools) of GenericPyBoyEnv on a DummyPyBoy."""
+    def _init():
+        return GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file, frame_skip=1,
+                               max_gameplay_time=max_gameplay_time)
+
+    return _init
+
+
+@pytest.fixture
+def state_file(tmp_path):
+    """A placeholder save state; DummyPyBoy ignores its content."""
+    path = tmp_path / "zero_state.state"
+    path.write_bytes(b"state")
+    return path
+
+
+@pytest.fixture
+def recorder():
+    """An SB3 logger output keeping every dumped record, for ``model.set_logger(Logger(None, [recorder]))``."""
+    logger = pytest.importorskip("stable_baselines3.common.logger")
+
+    class Recorder(logger.KVWriter):
+        def __init__(self):
+            self.records = []
+
+        def write(self, key_values, key_excluded, step=0):
+            self.records.append(dict(key_values))
+
+    return Recorder()
@@ -23,8 +23,8 @@ class DummyPyBoy:
     def button(self, name):
         pass
 
-    def tick(self):
-        pass
+    def tick(self, count=1, render=True):
+        return True
 
     def load_state(self, f):
         return True
@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("stable_baselines3")
+from training import autotune as autotune_module  # noqa: E402
+from training.autotune import autotune  # noqa: E402
+from conftest import make_env_fn  # noqa: E402
+
+
+def run(state_file, **kwargs):
+    return autotune(make_env_fn(state_file), env_counts=(1, 2), backends=("dummy", "batched"),
+                    n_steps_options=(8, 12), batch_sizes=(8, 16, 24), calibration_steps=4,
+                    ppo_kwargs={"device": "cpu", "n_epochs": 1}, verbose=False, **kwargs)
+
+
+def test_candidates_fit_the_rollout_and_worker_budget(state_file):
+    # no worker processes allowed: only the in-process backend is measured
+    best, candidates = run(state_file, max_workers=0)
+    assert {c.backend for c in candidates} == {"dummy"}
+    # batch sizes must divide n_steps * num_envs
+    assert sorted((c.num_envs, c.n_steps, c.batch_size) for c in candidates) == [
+        (1, 8, 8), (2, 8, 8), (2, 8, 16), (2, 12, 8), (2, 12, 24)]
+    assert all(c.workers == 0 and c.sps > 0 for c in candidates)
+    assert best is max(candidates, key=lambda c: c.sps)
+
+
+def test_memory_budget(state_file, monkeypatch):
+    measure_rollout = autotune_module.measure_rollout
+
+    def fake_memory(backend, env_fn, num_envs, *args):
+        env_sps, _, spaces = measure_rollout(backend, env_fn, num_envs, *args)
+        return env_sps, num_envs * 100, spaces
+
+    monkeypatch.setattr(autotune_module, "measure_rollout", fake_memory)
+    best, candidates = run(state_file, max_workers=0, max_memory_bytes=99)
+    assert candidates and best is None
+
+    # only the single-env candidate fits
+    best, candidates = run(state_file, max_workers=0, max_memory_bytes=150)
+    assert (best.num_envs, best.memory_bytes) == (1, 100)
+    assert best is max((c for c in candidates if c.memory_bytes <= 150), key=lambda c: c.sps)
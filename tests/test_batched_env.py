@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from env.batched_env import BatchedEnvPool
+from env.generic_env import GenericPyBoyEnv
+from conftest import make_env_fn
+
+
+@pytest.mark.parametrize("transport", ["pipe", "shm"])
+def test_pool_steps_blocks_into_preallocated_arrays(state_file, transport):
+    pool = BatchedEnvPool([make_env_fn(state_file) for _ in range(5)], envs_per_worker=2, transport=transport)
+    try:
+        assert len(pool.processes) == 3
+        obs = pool.reset()
+        assert obs["info"].shape == (5, 4)
+        assert np.all(obs["info"][:, 0] == 16)
+
+        obs, rewards, terminated, truncated, infos = pool.step(np.zeros(5, dtype=np.int64))
+        assert obs["info"] is pool.obs["info"]
+        assert np.all(obs["info"][:, 2] == 80)
+        assert rewards.shape == (5,) and rewards.dtype == np.float32
+        # action 0 ('a') on a target position terminates the episode
+        assert terminated.all()
+        assert all("terminal_observation" in info for info in infos)
+
+        assert pool.get_attr("frame_skip") == [1] * 5
+        pool.set_attr("frame_skip", 2, indices=[3])
+        assert pool.get_attr("frame_skip", indices=[2, 3, 4]) == [1, 2, 1]
+        assert pool.env_method("get_observation", indices=4)[0]["info"][2] == 80
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize("transport", ["pipe", "shm"])
+def test_pool_auto_resets_truncated_envs(state_file, transport):
+    pool = BatchedEnvPool([make_env_fn(state_file, max_gameplay_time=2) for _ in range(2)], envs_per_worker=2,
+                          transport=transport)
+    try:
+        pool.reset()
+        _, _, _, truncated, infos = pool.step(np.ones(2, dtype=np.int64))
+        assert not truncated.any()
+        assert infos == [{}, {}]
+        _, _, terminated, truncated, infos = pool.step(np.ones(2, dtype=np.int64))
+        assert truncated.all() and not terminated.any()
+        assert infos[0]["TimeLimit.truncated"]
+        assert pool.get_attr("current_gameplay_time") == [0, 0]
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize("transport", ["pipe", "shm"])
+def test_pool_skips_workers_without_active_envs(state_file, transport):
+    pool = BatchedEnvPool([make_env_fn(state_file, max_gameplay_time=2) for _ in range(3)], envs_per_worker=2,
+                          transport=transport)
+    actions = np.ones(3, dtype=np.int64)
+    try:
+        pool.reset()
+        pool.step(actions)
+        obs = pool.obs["info"].copy()
+        # only the second worker (env 2) has an active env
+        _, rewards, terminated, truncated, infos = pool.step(actions, active=[False, False, True])
+        assert truncated.tolist() == [False, False, True] and not terminated.any()
+        assert rewards[:2].tolist() == [0.0, 0.0] and infos[:2] == [{}, {}]
+        np.testing.assert_array_equal(pool.obs["info"][:2], obs[:2])
+        assert pool.get_attr("current_gameplay_time") == [1, 1, 0]
+        # a worker with any active env steps all of its envs
+        _, _, _, truncated, _ = pool.step(actions, active=[True, False, False])
+        assert truncated.tolist() == [True, True, False]
+    finally:
+        pool.close()
+
+
+def test_shm_results_stay_valid_for_one_more_step(state_file):
+    pool = BatchedEnvPool([make_env_fn(state_file, max_gameplay_time=2)], transport="shm")
+    try:
+        pool.reset()
+        _, first_rewards, _, first_truncated, _ = pool.step(np.ones(1, dtype=np.int64))
+        _, _, _, truncated, _ = pool.step(np.ones(1, dtype=np.int64))
+        assert truncated[0] and not first_truncated[0]
+        assert first_rewards[0] == pytest.approx(0.999)
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize("transport", ["pipe", "shm"])
+def test_batched_vec_env(state_file, transport):
+    pytest.importorskip("stable_baselines3")
+    from env.batched_vec_env import BatchedVecEnv
+
+    vec_env = BatchedVecEnv([make_env_fn(state_file) for _ in range(4)], envs_per_worker=2, transport=transport)
+    try:
+        obs = vec_env.reset()
+        assert obs["info"].shape == (4, 4)
+        obs, rewards, dones, infos = vec_env.step(np.ones(4, dtype=np.int64))
+        assert dones.shape == (4,) and not dones.any()
+        assert len(infos) == 4
+        assert vec_env.env_is_wrapped(GenericPyBoyEnv) == [False] * 4
+    finally:
+        vec_env.close()
@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks.bench_env import compare_reports
+
+
+def report(**results):
+    return {"results": results}
+
+
+def test_regressions_at_the_threshold_boundary():
+    baseline = report(dummy={"steps_per_sec": 100.0, "latency_p99_us": 100.0})
+    # exactly 10% worse is within a 10% threshold
+    rows, regressions = compare_reports(baseline, report(dummy={"steps_per_sec": 90.0, "latency_p99_us": 110.0}), 0.1)
+    assert [(metric, change) for _, metric, _, _, change in rows] == [
+        ("steps_per_sec", pytest.approx(-0.1)), ("latency_p99_us", pytest.approx(0.1))]
+    assert regressions == []
+
+    # just past it, in the bad direction of each metric
+    rows, regressions = compare_reports(baseline, report(dummy={"steps_per_sec": 89.9, "latency_p99_us": 110.1}), 0.1)
+    assert [metric for _, metric, *_ in regressions] == ["steps_per_sec", "latency_p99_us"]
+
+    # improvements never count, however large
+    _, regressions = compare_reports(baseline, report(dummy={"steps_per_sec": 500.0, "latency_p99_us": 1.0}), 0.1)
+    assert regressions == []
+
+
+def test_missing_metrics_and_backends_are_skipped():
+    baseline = report(dummy={"steps_per_sec": 100.0, "frames_per_sec": 0.0, "resets_per_sec": 50.0},
+                      subproc={"steps_per_sec": 100.0})
+    current = report(dummy={"steps_per_sec": 50.0, "frames_per_sec": 10.0, "latency_p50_us": 5.0})
+    rows, regressions = compare_reports(baseline, current, 0.1)
+    # resets_per_sec is missing from the current run, latency_p50_us from the baseline, frames_per_sec has
+    # a zero baseline and subproc did not run at all: only steps_per_sec can be compared
+    assert [(key, metric) for key, metric, *_ in rows] == [("dummy", "steps_per_sec")]
+    assert len(regressions) == 1
+
+    # a metric subset
+    rows, regressions = compare_reports(baseline, current, 0.1, metrics=["resets_per_sec"])
+    assert rows == [] and regressions == []
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+pytest.importorskip("stable_baselines3")
+from stable_baselines3 import PPO  # noqa: E402
+from stable_baselines3.common.logger import Logger  # noqa: E402
+from stable_baselines3.common.vec_env import DummyVecEnv  # noqa: E402
+
+from env.generic_env import GenericPyBoyEnv  # noqa: E402
+from training.callbacks import EnvProfileCallback, ThroughputCallback  # noqa: E402
+from conftest import DummyPyBoy, make_env_fn  # noqa: E402
+
+
+class SlowPyBoy(DummyPyBoy):
+    def tick(self, count=1, render=True):
+        time.sleep(0.002)
+        return super().tick(count, render)
+
+
+def test_throughput_callback_records_rollout_and_update_split(state_file, recorder):
+    env = DummyVecEnv([make_env_fn(state_file) for _ in range(2)])
+    model = PPO("MultiInputPolicy", env, n_steps=16, batch_size=32, n_epochs=1, device="cpu")
+    model.set_logger(Logger(None, [recorder]))
+    callback = ThroughputCallback(start_time=time.perf_counter())
+    model.learn(total_timesteps=64, callback=callback)
+
+    assert callback.rollout_time > 0 and callback.update_time > 0
+    assert 0 < callback.cold_start_sec
+    assert callback.frame_skip == 1  # taken from the envs
+    keys = set().union(*recorder.records)
+    for key in ("rollout_sec", "env_sps", "frames_per_sec", "update_sec", "rollout_fraction",
+                "cold_start_sec"):
+        assert f"throughput/{key}" in keys
+    first = recorder.records[0]
+    assert first["throughput/frames_per_sec"] == pytest.approx(first["throughput/env_sps"])
+    # the update of the previous iteration is reported with the next rollout
+    assert "throughput/update_sec" not in first
+    assert 0 < recorder.records[1]["throughput/rollout_fraction"] < 1
+
+
+def test_env_profile_callback_records_per_env_step_times(state_file, recorder):
+    def make_env(pyboy_cls):
+        return lambda: GenericPyBoyEnv(pyboy_cls(), debug=True, state_path=state_file, frame_skip=1, profile=True)
+
+    env = DummyVecEnv([make_env(DummyPyBoy), make_env(SlowPyBoy), make_env(DummyPyBoy)])
+    model = PPO("MultiInputPolicy", env, n_steps=8, batch_size=24, n_epochs=1, device="cpu")
+    model.set_logger(Logger(None, [recorder]))
+    model.learn(total_timesteps=24, callback=EnvProfileCallback())
+
+    record = recorder.records[0]
+    means = [record[f"env_profile/env{i}_step_mean_us"] for i in range(3)]
+    assert record["env_profile/slowest_env"] == 1
+    assert record["env_profile/slowest_step_ratio"] == pytest.approx(means[1] / (sum(means) / 3))
+    assert record["env_profile/step_mean_us"] == pytest.approx(sum(means) / 3)
@@ -0,0 +1,52 @@
+import pytest
+
+from env.generic_env import GenericPyBoyEnv
+from training.checkpointing import CheckpointStore
+from conftest import DummyPyBoy
+
+
+def test_store_deduplicates_chunks_and_prunes(tmp_path):
+    store = CheckpointStore(tmp_path, chunk_size=4)
+    first = store.put(b"aaaabbbbcc")
+    assert len(first) == 3 and store.get(first) == b"aaaabbbbcc"
+    # only the changed chunk is written again
+    second = store.put(b"aaaaXbbbcc")
+    assert second[0] == first[0] and second[2] == first[2]
+    assert store.bytes_written == 14 and store.bytes_deduplicated == 6
+
+    store.write_manifest("one", {"model": first})
+    store.write_manifest("two", {"model": second})
+    assert store.latest() == "two" and store.read_manifest()["model"] == second
+    store.prune(keep=1)
+    assert store.checkpoints() == ["two"]
+    assert store.get(second) == b"aaaaXbbbcc"
+    # the chunk only "one" used is gone
+    assert not (tmp_path / "blobs" / first[1][:2] / first[1]).exists()
+
+
+def test_read_manifest_without_checkpoint(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        CheckpointStore(tmp_path).read_manifest()
+
+
+def test_env_state_round_trip_through_store(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+    env = GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file)
+    env.reset(seed=3)
+    env.step(1)
+    env.pyboy.memory[0xC0D4] = 20
+    env.step(1)
+    state = env.get_state()
+
+    store = CheckpointStore(tmp_path / "ckpt")
+    entry = store.put_env_state(state)
+    assert set(entry["blobs"]) == {"emulator"}
+
+    other = GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file)
+    other.reset(seed=7)
+    obs = other.set_state(store.get_env_state(entry))
+    assert obs["info"][0] == 20
+    assert other.episode_steps == 2 and other.current_gameplay_time == env.current_gameplay_time
+    assert other.visited_positions == env.visited_positions
+    assert other.np_random.integers(1 << 30) == env.np_random.integers(1 << 30)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from env.batched_env import BatchedEnvPool
+from env.columnar import ColumnarReader
+from env.episode_stats import EpisodeStatsAggregator, EpisodeStatsWrapper
+from conftest import make_env_fn
+
+
+def wrapped_env_fn(state_file, max_gameplay_time=1_080_000):
+    make_env = make_env_fn(state_file, max_gameplay_time)
+    return lambda: EpisodeStatsWrapper(make_env())
+
+
+def test_wrapper_summarizes_episode(state_file):
+    env = wrapped_env_fn(state_file)()
+    env.reset()
+    rewards = []
+    for action in (1, 1, 0):
+        _, reward, terminated, truncated, info = env.step(action)
+        rewards.append(reward)
+    assert terminated and "episode" in info
+    episode = info["episode"]
+    assert episode["l"] == 3 and episode["r"] == pytest.approx(sum(rewards))
+    assert episode["target"] is True
+    assert episode["maps"] == 1 and episode["positions"] >= 1
+
+    env.reset()
+    _, _, _, _, info = env.step(1)
+    assert "episode" not in info
+
+
+def test_wrapper_marks_truncated_episode(state_file):
+    env = wrapped_env_fn(state_file, max_gameplay_time=3)()
+    env.reset()
+    truncated = False
+    while not truncated:
+        _, _, terminated, truncated, info = env.step(1)
+        assert not terminated
+    assert info["episode"]["l"] == 3 and info["episode"]["target"] is False
+
+
+def test_summaries_reach_the_training_process(state_file):
+    pool = BatchedEnvPool([wrapped_env_fn(state_file) for _ in range(3)], envs_per_worker=2)
+    try:
+        pool.reset()
+        _, _, terminated, _, infos = pool.step(np.zeros(3, dtype=np.int64))
+        assert terminated.all()
+        assert [info["episode"]["l"] for info in infos] == [1, 1, 1]
+    finally:
+        pool.close()
+
+
+def test_aggregator_rolling_summary_and_log(tmp_path):
+    log = tmp_path / "episodes"
+    stats = EpisodeStatsAggregator(log, window=2)
+    assert stats.summary() is None
+    stats.add({"r": 1.0, "l": 10, "t": 0.5, "maps": 1, "positions": 4, "target": False}, timestep=10, env_index=0)
+    stats.add({"r": 3.0, "l": 20, "t": 0.7, "maps": 2, "positions": 8, "target": True}, timestep=20, env_index=1)
+    stats.add({"r": 5.0, "l": 30, "t": 0.9, "maps": 2, "positions": 6, "target": True}, timestep=30, env_index=0)
+    summary = stats.summary()
+    assert summary["return_mean"] == 4.0 and summary["length_mean"] == 25.0
+    assert summary["maps_mean"] == 2.0 and summary["target_rate"] == 1.0
+    stats.close()
+
+    reader = ColumnarReader(log)
+    assert len(reader) == 3
+    assert reader.column("return").tolist() == [1.0, 3.0, 5.0]
+    assert reader.column("env").tolist() == [0, 1, 0]
+    assert reader.column("target").tolist() == [0, 1, 1]
+
+    # a resumed run appends to the same log
+    stats = EpisodeStatsAggregator(log)
+    stats.add({"r": 0.0, "l": 1}, timestep=40)
+    stats.close()
+    assert ColumnarReader(log).column("timestep").tolist() == [10, 20, 30, 40]
+
+
+def test_callback_logs_rolling_means(tmp_path, state_file, recorder):
+    pytest.importorskip("stable_baselines3")
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.logger import Logger
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    from training.callbacks import EpisodeStatsCallback
+
+    env = DummyVecEnv([wrapped_env_fn(state_file, max_gameplay_time=4) for _ in range(2)])
+    model = PPO("MultiInputPolicy", env, n_steps=8, batch_size=16, n_epochs=1, device="cpu")
+    model.set_logger(Logger(None, [recorder]))
+    model.learn(total_timesteps=16, callback=EpisodeStatsCallback(tmp_path / "episodes"))
+
+    # every finished episode is logged once, as SB3 counts them through info["episode"]
+    lengths = ColumnarReader(tmp_path / "episodes").column("length")
+    assert len(lengths) > 0 and len(lengths) == len(model.ep_info_buffer)
+    record = recorder.records[-1]
+    assert record["episode_stats/episodes"] == len(lengths)
+    assert record["episode_stats/length_mean"] == pytest.approx(lengths.mean())
+    assert record["rollout/ep_len_mean"] == pytest.approx(lengths.mean())
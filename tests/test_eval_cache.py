@@ -0,0 +1,51 @@
+import json
+import os
+
+import env.generic_env as generic_env
+import evaluation.eval_cache as eval_cache
+from evaluation.eval_cache import EvalCache, eval_key, file_digest
+
+
+def test_key_covers_every_input(tmp_path):
+    model = tmp_path / "model.zip"
+    model.write_bytes(b"weights")
+    digest = file_digest(model)
+    key = eval_key(digest, "state", {"frame_skip": 60}, 0, True)
+    assert key == eval_key(digest, "state", {"frame_skip": 60}, 0, True)
+    assert len({key,
+                eval_key(digest, "state", {"frame_skip": 30}, 0, True),
+                eval_key(digest, "state", {"frame_skip": 60}, 1, True),
+                eval_key(digest, "state", {"frame_skip": 60}, 0, False),
+                eval_key(digest, "other", {"frame_skip": 60}, 0, True)}) == 5
+    model.write_bytes(b"retrained")
+    assert file_digest(model) != digest
+
+
+def test_get_put_and_lru_eviction(tmp_path):
+    cache = EvalCache(tmp_path, max_bytes=1 << 20)
+    assert cache.get("a") is None
+    cache.put("a", [1.0, 2.0], [10, 20])
+    assert cache.get("a") == ([1.0, 2.0], [10, 20])
+
+    cache.put("b", [3.0], [30])
+    size = max(p.stat().st_size for p in cache.entries())
+    # "a" was used last, so "b" goes first
+    os.utime(tmp_path / "b.json", ns=(0, 0))
+    cache.max_bytes = 2 * size
+    cache.put("c", [4.0], [40])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_reward_version_bump_invalidates(tmp_path, monkeypatch):
+    cache = EvalCache(tmp_path)
+    key = eval_key("model", "state", {}, 0, True)
+    cache.put(key, [1.0], [10])
+    monkeypatch.setattr(generic_env, "REWARD_VERSION", generic_env.REWARD_VERSION + 1)
+    monkeypatch.setattr(eval_cache, "REWARD_VERSION", generic_env.REWARD_VERSION)
+    assert eval_key("model", "state", {}, 0, True) != key
+    assert cache.invalidate() == 1 and cache.entries() == []
+
+    cache.put("x", [1.0], [10])
+    assert json.loads((tmp_path / "x.json").read_text())["reward_version"] == generic_env.REWARD_VERSION
+    assert cache.invalidate() == 0 and cache.invalidate(all_entries=True) == 1
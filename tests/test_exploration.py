@@ -0,0 +1,48 @@
+from env.exploration import ExplorationTracker
+
+
+def test_visit_and_test_positions():
+    tracker = ExplorationTracker()
+    assert tracker.visit(16, 8, 80, 1)
+    assert not tracker.visit(16, 8, 80, 1)
+    assert tracker.visit(16, 8, 80, 2)
+    assert tracker.visit(255, 255, 255, 3)
+
+    assert tracker.has_visited(16, 8, 80, 1)
+    assert not tracker.has_visited(8, 16, 80, 1)
+    assert tracker.has_visited_map(80) and tracker.has_visited_map(255)
+    assert not tracker.has_visited_map(81)
+    assert tracker.maps().tolist() == [80, 255]
+    assert sorted(tracker.positions()) == [(16, 8, 80, 1), (16, 8, 80, 2), (255, 255, 255, 3)]
+    assert tracker.coverage() == {80: 2, 255: 1}
+    assert tracker.num_maps == 2 and tracker.num_positions == 3
+
+
+def test_visit_map_reports_new_maps():
+    tracker = ExplorationTracker()
+    assert tracker.visit_map(3)
+    assert not tracker.visit_map(3)
+    assert tracker.positions() == []
+
+
+def test_reset_clears_everything():
+    tracker = ExplorationTracker()
+    tracker.visit(1, 2, 3, 0)
+    tracker.visit(4, 5, 6, 1)
+    tracker.reset()
+    assert tracker.num_maps == 0 and tracker.num_positions == 0
+    assert not tracker.position_bits.any()
+    assert tracker.visit(1, 2, 3, 0)
+
+
+def test_state_round_trip():
+    tracker = ExplorationTracker()
+    tracker.visit(1, 2, 3, 0)
+    tracker.visit(4, 5, 200, 1)
+    restored = ExplorationTracker()
+    restored.visit(9, 9, 9, 0)
+    restored.set_state(tracker.get_state())
+    assert restored.maps().tolist() == [3, 200]
+    assert sorted(restored.positions()) == [(1, 2, 3, 0), (4, 5, 200, 1)]
+    assert restored.coverage() == {3: 1, 200: 1}
+    assert not restored.visit(1, 2, 3, 0)
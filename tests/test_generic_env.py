@@ -1,32 +1,8 @@
-from env.generic_env import GenericPyBoyEnv
-
-
-class DummyPyBoy:
-    """Minimal PyBoy-like object for unit tests: exposes memory, button, tick, load_state, stop."""
-
-    def __init__(self):
-        # initialize memory with zeros and set some sensible defaults
-        self.memory = bytearray(0xFFFF)
-        # place default player pos: x=16, y=8, map=80, orientation=1
-        self.memory[0xC0D4] = 16
-        self.memory[0xC0D5] = 8
-        self.memory[0xC92D] = 80
-        self.memory[0xC0D8] = 1
+import numpy as np
+import pytest
 
-    def button(self, name):
-        # no-op for tests
-        pass
-
-    def tick(self):
-        # no-op for tests
-        pass
-
-    def load_state(self, f):
-        # pretend to load - no-op
-        return True
-
-    def stop(self):
-        pass
+from env.generic_env import GenericPyBoyEnv
+from conftest import DummyPyBoy
 
 
 def test_generic_env_observation_and_step(tmp_path):
@@ -50,3 +26,149 @@ def test_generic_env_observation_and_step(tmp_path):
     assert isinstance(truncated, bool)
 
     env.close()
+
+
+def test_reset_restores_state_from_cache(tmp_path):
+    from env.state_cache import StateCache
+
+    dummy = DummyPyBoy()
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+    other_file = tmp_path / "other.state"
+    other_file.write_bytes(b"other")
+
+    cache = StateCache()
+    cache.register("other", other_file)
+    env = GenericPyBoyEnv(dummy, debug=True, state_path=state_file, state_cache=cache)
+    assert dummy.loaded_state == b"state"
+
+    env.reset()
+    env.reset()
+    assert dummy.loaded_state == b"state"
+    assert cache.misses == 1 and cache.hits == 2
+
+    env.reset(options={"start_state": "other"})
+    assert dummy.loaded_state == b"other"
+
+    env.close()
+
+
+def test_frame_skip_bulk_and_per_frame_paths(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+
+    dummy = DummyPyBoy()
+    env = GenericPyBoyEnv(dummy, debug=True, state_path=state_file, frame_skip=4)
+    env.reset()
+    env.step(1)
+    assert dummy.frames == 4
+    assert env.current_gameplay_time == 4
+
+    seen = []
+    dummy = DummyPyBoy()
+    env = GenericPyBoyEnv(dummy, debug=True, state_path=state_file, frame_skip=3,
+                          frame_hooks=[lambda e: seen.append(e.current_gameplay_time)])
+    env.reset()
+    env.step(1)
+    assert seen == [1, 2, 3]
+    assert dummy.frames == 3
+
+
+def test_reuse_buffers_returns_same_objects(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+
+    dummy = DummyPyBoy()
+    env = GenericPyBoyEnv(dummy, debug=True, state_path=state_file, reuse_buffers=True)
+    obs, _ = env.reset()
+    first_array = obs["info"]
+    next_obs, _, terminated, _, info = env.step(1)
+    assert next_obs is obs and next_obs["info"] is first_array
+    assert not terminated
+
+    dummy.memory[0xC0D4] = 17
+    next_obs, _, _, _, next_info = env.step(1)
+    assert next_info is info and next_info == {}
+    assert first_array[0] == 17
+
+    # standing on a target position and pressing 'a' still terminates; the last
+    # observation of an episode is a copy that the next reset() leaves alone
+    dummy.memory[0xC0D4] = 16
+    last_obs, reward, terminated, _, last_info = env.step(0)
+    assert terminated and reward > 9
+    assert last_obs is not obs and last_obs["info"] is not first_array and last_info is not info
+
+
+def test_exploration_tracking_and_map_reward(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+
+    dummy = DummyPyBoy()
+    env = GenericPyBoyEnv(dummy, debug=True, state_path=state_file)
+    env.reset()
+    _, first_reward, _, _, _ = env.step(1)
+    dummy.memory[0xC0D4] = 17
+    _, second_reward, _, _, _ = env.step(1)
+    assert first_reward > 0.9 and second_reward < 0
+    assert env.visited_maps == {80}
+    assert env.visited_positions == {(16, 8, 80, 1), (17, 8, 80, 1)}
+
+    env.reset()
+    assert env.visited_maps == set() and env.exploration.num_positions == 0
+
+
+def test_snapshot_and_restore(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+
+    dummy = DummyPyBoy()
+    env = GenericPyBoyEnv(dummy, debug=True, state_path=state_file, frame_skip=5)
+    env.reset()
+    dummy.memory[0xC0D4] = 30
+    env.step(1)
+    snapshot_id = env.take_snapshot()
+
+    dummy.memory[0xC0D4] = 40
+    env.step(1)
+    obs, _ = env.reset(options={"snapshot": snapshot_id})
+    assert obs["info"][0] == 30
+    assert env.current_gameplay_time == 5
+    assert env.snapshot_pool.get(snapshot_id).restores == 1
+
+    obs, _ = env.reset(seed=0, options={"snapshot": "sample"})
+    assert obs["info"][0] == 30
+
+    # a plain reset still goes back to the start state
+    env.reset()
+    assert dummy.loaded_state == b"state" and env.current_gameplay_time == 0
+
+
+def test_snapshot_interval(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+
+    env = GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file, snapshot_interval=2)
+    env.reset()
+    for _ in range(5):
+        env.step(1)
+    assert len(env.snapshot_pool) == 2
+
+
+def test_reuse_buffers_keeps_terminal_observation_across_auto_reset(tmp_path):
+    pytest.importorskip("stable_baselines3")
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    # a start state holding the default memory, so reset() moves the player back to x=16
+    state_file = tmp_path / "zero_state.state"
+    dummy = DummyPyBoy()
+    state_file.write_bytes(bytes(dummy.memory))
+    env = GenericPyBoyEnv(dummy, debug=True, state_path=state_file, frame_skip=1, max_gameplay_time=2,
+                          reuse_buffers=True)
+    vec_env = DummyVecEnv([lambda: env])
+    vec_env.reset()
+    vec_env.step(np.array([1]))
+    dummy.memory[0xC0D4] = 99
+    obs, _, dones, infos = vec_env.step(np.array([1]))
+    assert dones[0] and infos[0]["TimeLimit.truncated"]
+    assert infos[0]["terminal_observation"]["info"][0] == 99
+    assert obs["info"][0, 0] == 16
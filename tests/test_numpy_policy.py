@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from evaluation.numpy_policy import POLICY_FORMAT, NumpyPolicy, _conv2d
+
+
+def tiny_policy(rng):
+    arrays = {
+        "w1": rng.normal(size=(4, 8)), "b1": rng.normal(size=8),
+        "wa": rng.normal(size=(8, 3)), "ba": rng.normal(size=3),
+        "wv": rng.normal(size=(8, 1)), "bv": rng.normal(size=1),
+    }
+    spec = {
+        "format": POLICY_FORMAT,
+        "observation": [["info", [4]]],
+        "n_actions": 3,
+        "pi_extractors": {"info": {"scale": 1.0, "ops": [["flatten"]]}},
+        "vf_extractors": None,
+        "policy_net": [["linear", "w1", "b1"], ["tanh"]],
+        "value_net": [["linear", "w1", "b1"], ["relu"]],
+        "action_net": [["linear", "wa", "ba"]],
+        "value_head": [["linear", "wv", "bv"]],
+    }
+    return NumpyPolicy(spec, arrays), arrays
+
+
+def test_forward_matches_reference():
+    rng = np.random.default_rng(0)
+    policy, a = tiny_policy(rng)
+    obs = {"info": rng.normal(size=(5, 4)).astype(np.float32)}
+    logits, values = policy.forward(obs)
+    x = obs["info"]
+    np.testing.assert_allclose(logits, np.tanh(x @ a["w1"] + a["b1"]) @ a["wa"] + a["ba"], rtol=1e-5)
+    np.testing.assert_allclose(values, (np.maximum(x @ a["w1"] + a["b1"], 0) @ a["wv"] + a["bv"])[:, 0], rtol=1e-5)
+
+    actions, _ = policy.predict(obs, deterministic=True)
+    assert actions.tolist() == logits.argmax(axis=1).tolist()
+    # a single observation gives a single action
+    assert policy.predict({"info": x[0]}, deterministic=True)[0] == actions[0]
+
+
+def test_sampling_follows_softmax():
+    rng = np.random.default_rng(1)
+    policy, _ = tiny_policy(rng)
+    obs = {"info": np.repeat(rng.normal(size=(1, 4)).astype(np.float32), 20000, axis=0)}
+    logits, _ = policy.forward({"info": obs["info"][:1]})
+    probs = np.exp(logits[0] - logits[0].max())
+    probs /= probs.sum()
+    actions, _ = policy.predict(obs, rng=np.random.default_rng(0))
+    assert np.abs(np.bincount(actions, minlength=3) / len(actions) - probs).max() < 0.02
+
+
+def test_conv2d_matches_loops():
+    rng = np.random.default_rng(2)
+    x = rng.normal(size=(2, 3, 9, 11)).astype(np.float32)
+    w = rng.normal(size=(4, 3, 3, 3)).astype(np.float32)
+    b = rng.normal(size=4).astype(np.float32)
+    out = _conv2d(x, w, b, stride=2)
+    assert out.shape == (2, 4, 4, 5)
+    for i in range(4):
+        for j in range(5):
+            patch = x[:, :, 2 * i:2 * i + 3, 2 * j:2 * j + 3]
+            expected = np.tensordot(patch, w, axes=([1, 2, 3], [1, 2, 3])) + b
+            np.testing.assert_allclose(out[:, :, i, j], expected, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("screen", [False, True])
+def test_export_matches_stable_baselines3(tmp_path, screen):
+    pytest.importorskip("stable_baselines3")
+    import gymnasium as gym
+    from gymnasium import spaces
+    from stable_baselines3 import PPO
+
+    from evaluation.numpy_policy import check_equivalence, export_policy
+
+    obs_spaces = {"info": spaces.Box(0, 255, (4,), np.float32)}
+    if screen:
+        obs_spaces["screen"] = spaces.Box(0, 255, (4, 36, 40), np.uint8)
+
+    class Env(gym.Env):
+        observation_space = spaces.Dict(obs_spaces)
+        action_space = spaces.Discrete(7)
+
+        def reset(self, seed=None, options=None):
+            return self.observation_space.sample(), {}
+
+        def step(self, action):
+            return self.observation_space.sample(), 0.0, False, False, {}
+
+    model = PPO("MultiInputPolicy", Env(), n_steps=8, batch_size=8, device="cpu",
+                policy_kwargs={"share_features_extractor": not screen})
+    report = export_policy(model, tmp_path / "policy.npz")
+    assert report["log_prob"] < 1e-4 and report["value"] < 1e-4
+    loaded = NumpyPolicy.load(tmp_path / "policy.npz")
+    assert check_equivalence(model, loaded, n=32, seed=1)["action_agreement"] == 1.0
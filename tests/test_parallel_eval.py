@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from evaluation.parallel_eval import confidence_interval, evaluate_parallel
+from conftest import make_env_fn
+
+
+def predict(obs):
+    # action 1 ('b') never reaches the target, so episodes end by truncation
+    return np.ones(len(obs["info"]), dtype=np.int64)
+
+
+def test_confidence_interval():
+    mean, std, ci = confidence_interval([1.0, 2.0, 3.0, 4.0])
+    assert mean == 2.5
+    assert std == pytest.approx(np.std([1, 2, 3, 4], ddof=1))
+    assert ci == pytest.approx(1.96 * std / 2, rel=1e-3)
+    assert confidence_interval([1.0])[2] == float("inf")
+
+
+def test_episodes_are_spread_over_envs(state_file):
+    env_fns = [make_env_fn(state_file, max_gameplay_time=3) for _ in range(3)]
+    seen = []
+    result = evaluate_parallel(env_fns, predict, num_episodes=7, envs_per_worker=2,
+                               on_episode=lambda i, reward, length: seen.append(i))
+    assert len(result.episode_rewards) == 7
+    assert sorted(seen) == [0, 0, 1, 1, 2, 2, 2]
+    assert result.episode_lengths == [3] * 7
+    # +1 for the first map, -0.001 per step
+    assert result.mean == pytest.approx(0.997)
+    assert not result.stopped_early
+
+
+def test_early_stopping(state_file):
+    env_fns = [make_env_fn(state_file, max_gameplay_time=2) for _ in range(2)]
+    result = evaluate_parallel(env_fns, predict, num_episodes=100, ci_tolerance=0.01, min_episodes=4)
+    # every episode has the same return, so the interval collapses as soon as it is allowed to stop
+    assert len(result.episode_rewards) == 4
+    assert result.stopped_early and result.ci == 0.0
+
+
+def test_early_stopping_uses_a_balanced_prefix(state_file):
+    # env 0 finishes an episode every step, env 1 every fifth step
+    env_fns = [make_env_fn(state_file, max_gameplay_time=1), make_env_fn(state_file, max_gameplay_time=5)]
+    seen = []
+    result = evaluate_parallel(env_fns, predict, num_episodes=100, ci_tolerance=0.01, min_episodes=4,
+                               on_episode=lambda i, reward, length: seen.append(i))
+    assert result.stopped_early
+    # the fast env ran ahead, but only the first two episodes of each env count
+    assert seen.count(0) > 2
+    assert sorted(result.episode_lengths) == [1, 1, 5, 5]
+    assert result.mean == pytest.approx((0.999 + 0.995) / 2)
@@ -0,0 +1,46 @@
+import pytest
+
+from env.generic_env import GenericPyBoyEnv
+from env.profiler import STEP_PHASES, PhaseProfiler
+from conftest import DummyPyBoy
+
+
+def test_profiler_summary_and_merge():
+    profiler = PhaseProfiler(("a", "b"))
+    for ns in (100, 200, 300, 5000):
+        profiler.record(0, ns)
+    summary = profiler.summary()
+    assert summary["a"]["count"] == 4
+    assert summary["a"]["mean_ns"] == 1400
+    assert summary["a"]["max_ns"] == 5000
+    # percentiles are bucket upper bounds: 200 falls in [128, 256)
+    assert summary["a"]["p50_ns"] == 256
+    assert summary["a"]["p99_ns"] == 5000
+    assert summary["a"]["fraction"] == 1.0 and summary["b"]["count"] == 0
+
+    other = PhaseProfiler(("a", "b"))
+    other.merge(profiler.snapshot())
+    other.merge(profiler.snapshot())
+    assert other.counts == [8, 0] and other.totals_ns == [11200, 0]
+    with pytest.raises(ValueError):
+        PhaseProfiler(("c",)).merge(profiler.snapshot())
+
+
+def test_env_profile_is_opt_in(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+
+    env = GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file)
+    # the plain step method is used, with no instrumentation
+    assert "step" not in vars(env)
+    assert env.get_profile() is None
+
+    env = GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file, profile=True)
+    env.reset()
+    obs, reward, _, _, _ = env.step(1)
+    env.step(1)
+    assert obs["info"][0] == 16 and reward == pytest.approx(0.999)
+    profile = env.get_profile(reset=True)
+    assert profile["phases"] == list(STEP_PHASES)
+    assert profile["counts"] == [2] * len(STEP_PHASES)
+    assert env.get_profile()["counts"] == [0] * len(STEP_PHASES)
@@ -0,0 +1,37 @@
+import numpy as np
+
+from env.ram_schema import RAM_FIELDS, RamExtractor, RamField
+
+
+def test_extractor_merges_nearby_fields_into_blocks():
+    extractor = RamExtractor(RAM_FIELDS)
+    # 0xC0D4-0xC0D8 are read as one block, 0xC92D on its own
+    assert [(start, stop) for start, stop, _ in extractor.ranges] == [(0xC0D4, 0xC0D9), (0xC92D, 0xC92E)]
+    assert extractor.buffer.shape == (6,)
+
+
+def test_extractor_reads_fields():
+    memory = bytearray(0x10000)
+    memory[0xC0D4] = 16
+    memory[0xC0D5] = 8
+    memory[0xC92D] = 80
+    memory[0xC0D8] = 1
+    extractor = RamExtractor(RAM_FIELDS)
+    values = extractor.read(memory)
+    assert values[extractor.indices(["pos_x", "pos_y", "map_id", "orientation"])].tolist() == [16, 8, 80, 1]
+    # the same arrays are reused between reads
+    memory[0xC0D4] = 17
+    assert extractor.read(memory) is values
+    assert values[extractor.index("pos_x")] == 17
+
+
+def test_extractor_decodes_multi_byte_fields():
+    memory = bytearray(0x10000)
+    memory[0xD000:0xD002] = (0x34, 0x12)
+    memory[0xD004] = 7
+    extractor = RamExtractor([RamField("hp", 0xD000, width=2, high=0xFFFF), RamField("menu", 0xD004)])
+    assert len(extractor.ranges) == 1
+    values = extractor.read(memory)
+    assert values.tolist() == [0x1234, 7]
+    low, high = extractor.bounds(["hp", "menu"])
+    assert np.array_equal(high, [0xFFFF, 255])
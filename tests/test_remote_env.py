@@ -0,0 +1,91 @@
+import threading
+from multiprocessing import AuthenticationError
+
+import numpy as np
+import pytest
+
+from env.remote_env import BatchCodec, RemoteEnvError, RemoteEnvPool, RemoteEnvServer, parse_address
+from conftest import make_env_fn
+
+AUTHKEY = b"test-key"
+
+
+@pytest.fixture
+def servers(state_file):
+    # two servers with 2 and 3 envs, each serving one client from a thread
+    started = []
+    for n in (2, 3):
+        server = RemoteEnvServer([make_env_fn(state_file, max_gameplay_time=3) for _ in range(n)],
+                                 authkey=AUTHKEY, envs_per_worker=2)
+        thread = threading.Thread(target=server.serve, kwargs={"max_clients": 1}, daemon=True)
+        thread.start()
+        started.append((server, thread))
+    yield [f"{server.address[0]}:{server.address[1]}" for server, _ in started]
+    for server, thread in started:
+        thread.join(timeout=10)
+        server.close()
+
+
+def test_codec_layout_is_aligned():
+    codec = BatchCodec([("info", (4,), np.dtype(np.float32)), ("screen", (2, 3, 5), np.dtype(np.uint8))], 3)
+    offsets = [offset for _, offset, _, _ in codec.fields]
+    assert all(offset % 8 == 0 for offset in offsets)
+    views = codec.views(bytearray(codec.size))
+    assert views[("obs", "screen")].shape == (3, 2, 3, 5)
+    assert views["rewards"].dtype == np.float32
+
+
+def test_parse_address():
+    assert parse_address("localhost:7001") == ("localhost", 7001)
+    assert parse_address(("10.0.0.2", "7002")) == ("10.0.0.2", 7002)
+    with pytest.raises(ValueError):
+        parse_address("7001")
+
+
+def test_pool_steps_envs_of_several_servers(servers):
+    pool = RemoteEnvPool(servers, AUTHKEY)
+    try:
+        assert pool.num_envs == 5 and pool.slices == [(0, 2), (2, 5)]
+        obs = pool.reset()
+        assert obs["info"].shape == (5, 4) and np.all(obs["info"][:, 0] == 16)
+
+        obs, rewards, terminated, truncated, infos = pool.step(np.ones(5, dtype=np.int64))
+        assert rewards.dtype == np.float32 and not (terminated | truncated).any()
+        assert infos == [{}] * 5
+        # action 0 ('a') on a target position terminates; the terminal observation comes with the infos
+        obs, rewards, terminated, truncated, infos = pool.step(np.zeros(5, dtype=np.int64))
+        assert terminated.all()
+        assert all(info["terminal_observation"]["info"][2] == 80 for info in infos)
+
+        assert pool.get_attr("frame_skip") == [1] * 5
+        pool.set_attr("frame_skip", 2, indices=[1, 3])
+        assert pool.get_attr("frame_skip") == [1, 2, 1, 2, 1]
+        assert pool.env_method("get_observation", indices=4)[0]["info"][2] == 80
+        # only the pool's attribute/method calls are accepted
+        with pytest.raises(RemoteEnvError, match="Unknown call 'close'"):
+            pool._call("close", (), {}, [0])
+        # the connection still works after an error
+        assert pool.has_attr("frame_skip") == [True] * 5
+    finally:
+        pool.close()
+
+
+def test_wrong_authkey_is_rejected(servers):
+    with pytest.raises(AuthenticationError):
+        RemoteEnvPool(servers[:1], b"wrong")
+    # the server keeps accepting clients
+    pool = RemoteEnvPool(servers, AUTHKEY)
+    pool.close()
+
+
+def test_close_stops_serving(state_file):
+    server = RemoteEnvServer([make_env_fn(state_file)], authkey=AUTHKEY)
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    # closing wakes the accept() the thread is blocked in, instead of leaving it there
+    # or spinning on the closed listener
+    server.close()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    server.serve()
+    assert server.clients == 0
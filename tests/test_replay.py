@@ -0,0 +1,56 @@
+import pytest
+
+from env.generic_env import GenericPyBoyEnv
+from env.replay import ActionLog, ActionRecorder, ReplayDivergence, replay
+from conftest import DummyPyBoy
+
+
+class MovingPyBoy(DummyPyBoy):
+    """DummyPyBoy whose x position follows the 'left'/'right' buttons, so actions change RAM."""
+
+    def button(self, name):
+        if name == "right":
+            self.memory[0xC0D4] += 1
+        elif name == "left":
+            self.memory[0xC0D4] -= 1
+
+
+def record(tmp_path, state_file, actions, **kwargs):
+    env = ActionRecorder(GenericPyBoyEnv(MovingPyBoy(), debug=True, state_path=state_file, frame_skip=3,
+                                         max_gameplay_time=3 * len(actions)), tmp_path / "replays", **kwargs)
+    env.reset()
+    for action in actions:
+        env.step(action)
+    env.close()
+    return env
+
+
+def test_record_and_replay(tmp_path, state_file):
+    actions = [3, 3, 2, 3, 0, 3, 3]
+    recorder = record(tmp_path, state_file, actions, checksum_interval=2)
+    assert len(recorder.saved) == 1
+    log = ActionLog.load(recorder.saved[0])
+    assert log.actions.tolist() == actions and log.frame_skip == 3
+    assert len(log.checksums) == 3 and not log.terminated
+    assert len(list((tmp_path / "replays" / "states").iterdir())) == 1
+
+    positions = []
+    env = GenericPyBoyEnv(MovingPyBoy(), debug=True, state_path=state_file, frame_skip=3)
+    total = replay(env, log, tmp_path / "replays", on_step=lambda step, env: positions.append(env.last_pos[0]))
+    assert total == pytest.approx(log.total_reward)
+    assert positions == [17, 18, 17, 18, 18, 19, 20]
+
+
+def test_replay_detects_divergence(tmp_path, state_file):
+    log = ActionLog.load(record(tmp_path, state_file, [3, 3, 3, 3], checksum_interval=2).saved[0])
+    env = GenericPyBoyEnv(MovingPyBoy(), debug=True, state_path=state_file, frame_skip=3)
+    tampered = log._replace(actions=log.actions.copy())
+    tampered.actions[1] = 2
+    with pytest.raises(ReplayDivergence, match="after step 2"):
+        replay(env, tampered, tmp_path / "replays")
+    with pytest.raises(ValueError):
+        replay(GenericPyBoyEnv(MovingPyBoy(), debug=True, state_path=state_file), log, tmp_path / "replays")
+
+
+def test_only_terminated_episodes_are_kept(tmp_path, state_file):
+    assert record(tmp_path, state_file, [1, 1], only_terminated=True).saved == []
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from env.generic_env import GenericPyBoyEnv
+from env.screen import ScreenStack
+from conftest import DummyPyBoy
+
+
+def screen(value):
+    return np.full((144, 160, 4), value, dtype=np.uint8)
+
+
+def test_downsample_and_grayscale_match_reference():
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, (144, 160, 4), dtype=np.uint8)
+    stack = ScreenStack(frames=1, downsample=4)
+    stack.push(rgba)
+    gray = rgba[..., :3].astype(np.float64) @ np.array([77, 150, 29]) / 256
+    expected = gray.reshape(36, 4, 40, 4).mean(axis=(1, 3))
+    assert stack.observation().shape == (1, 36, 40)
+    assert np.abs(stack.observation()[0] - expected).max() < 1
+
+
+def test_stack_is_in_time_order():
+    stack = ScreenStack(frames=3, downsample=2)
+    stack.reset(screen(1))
+    assert stack.observation()[:, 0, 0].tolist() == [1, 1, 1]
+    history = [1, 1, 1]
+    for value in range(2, 8):
+        stack.push(screen(value))
+        history.append(value)
+        assert stack.observation()[:, 0, 0].tolist() == history[-3:]
+    assert stack.observation().flags["C_CONTIGUOUS"]
+    with pytest.raises(ValueError):
+        ScreenStack(downsample=7)
+
+
+def test_env_screen_observation(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+
+    env = GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file, frame_skip=5, screen_obs=True,
+                          screen_frames=2)
+    assert env.observation_space["screen"].shape == (2, 72, 80)
+    obs, _ = env.reset()
+    assert env.observation_space.contains(obs)
+    obs, _, _, _, _ = env.step(1)
+    env.step(1)
+    obs2, _, _, _, _ = env.step(1)
+    # DummyPyBoy paints the screen with its frame count when a frame is rendered
+    assert obs["screen"][:, 0, 0].tolist() == [0, 5]
+    assert obs2["screen"][:, 0, 0].tolist() == [10, 15]
+    assert obs["info"][0] == 16
+
+    assert "screen" not in GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file).observation_space.spaces
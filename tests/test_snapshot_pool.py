@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from env.snapshot_pool import SnapshotPool
+
+
+def test_age_eviction_drops_oldest():
+    pool = SnapshotPool(capacity=2)
+    first = pool.add(b"a")
+    second = pool.add(b"b")
+    third = pool.add(b"c")
+    assert first not in pool
+    assert pool.ids() == [second, third]
+    assert pool.get(third).open().read() == b"c"
+
+
+def test_novelty_eviction_keeps_rare_positions():
+    pool = SnapshotPool(capacity=3, eviction="novelty")
+    rare = pool.add(b"rare", position=(1, 1, 1, 0))
+    common = pool.add(b"common", position=(2, 2, 2, 0))
+    repeated = pool.add(b"common again", position=(2, 2, 2, 0))
+    assert pool.get(repeated).score < pool.get(common).score
+
+    pool.add(b"new", position=(3, 3, 3, 0))
+    assert rare in pool and common in pool
+    assert repeated not in pool
+
+
+def test_sample_is_weighted_by_score():
+    pool = SnapshotPool()
+    low = pool.add(b"low", score=0.0)
+    high = pool.add(b"high", score=1.0)
+    rng = np.random.default_rng(0)
+    assert {pool.sample(rng).id for _ in range(20)} == {high}
+    assert low in pool
+
+
+def test_sample_empty_pool():
+    with pytest.raises(LookupError):
+        SnapshotPool().sample(np.random.default_rng(0))
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from env.state_cache import StateCache
+
+
+def test_state_cache_reads_file_once(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+    cache = StateCache()
+
+    assert cache.open(state_file).read() == b"state"
+    assert cache.open(state_file).read() == b"state"
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+
+def test_state_cache_reloads_when_mtime_changes(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"old")
+    cache = StateCache()
+    assert cache.get(state_file) == b"old"
+
+    state_file.write_bytes(b"new")
+    stat = os.stat(state_file)
+    os.utime(state_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.get(state_file) == b"new"
+    assert cache.misses == 2
+
+
+def test_state_cache_evicts_least_recently_used(tmp_path):
+    cache = StateCache(max_entries=2)
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.state"
+        path.write_bytes(name.encode())
+        cache.register(name, path)
+
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+
+
+def test_state_cache_missing_file(tmp_path):
+    cache = StateCache()
+    with pytest.raises(FileNotFoundError):
+        cache.get(tmp_path / "missing.state")
@@ -0,0 +1,115 @@
+import queue
+
+import numpy as np
+import pytest
+
+pytest.importorskip("stable_baselines3")
+import torch as th  # noqa: E402
+from stable_baselines3 import PPO  # noqa: E402
+from stable_baselines3.common.utils import obs_as_tensor  # noqa: E402
+from stable_baselines3.common.vec_env import DummyVecEnv  # noqa: E402
+from stable_baselines3.ppo import MultiInputPolicy  # noqa: E402
+
+from training.autotune import SpacesEnv  # noqa: E402
+from training.training_ppo_async import AsyncPPO, _bootstrap_timeouts  # noqa: E402
+from conftest import make_env_fn  # noqa: E402
+
+
+def spaces_of(state_file):
+    env = make_env_fn(state_file)()
+    return env.observation_space, env.action_space
+
+
+def learner(state_file, n_steps=4, envs_per_actor=2, segments_per_update=2, max_policy_lag=1):
+    # An AsyncPPO without actor processes, for the learner-side methods
+    trainer = AsyncPPO.__new__(AsyncPPO)
+    trainer.n_steps = n_steps
+    trainer.envs_per_actor = envs_per_actor
+    trainer.segments_per_update = segments_per_update
+    trainer.max_policy_lag = max_policy_lag
+    trainer.version = 0
+    trainer.dropped_segments = 0
+    trainer.rollout_queue = queue.Queue()
+    observation_space, action_space = spaces_of(state_file)
+    stub = DummyVecEnv([lambda: SpacesEnv(observation_space, action_space)] * (envs_per_actor * segments_per_update))
+    trainer.model = PPO(MultiInputPolicy, stub, n_steps=n_steps, batch_size=8, device="cpu", seed=0)
+    return trainer
+
+
+def segment(trainer, version, seed, last_done=0.0):
+    rng = np.random.default_rng(seed)
+    n, e = trainer.n_steps, trainer.envs_per_actor
+    return {
+        "version": version,
+        "obs": {"info": rng.uniform(0, 255, (n, e, 4)).astype(np.float32)},
+        "actions": rng.integers(0, 6, (n, e)),
+        "rewards": rng.normal(size=(n, e)).astype(np.float32),
+        "episode_starts": np.zeros((n, e), dtype=np.float32),
+        "log_probs": rng.normal(size=(n, e)).astype(np.float32),
+        "last_obs": {"info": rng.uniform(0, 255, (e, 4)).astype(np.float32)},
+        "last_dones": np.full(e, last_done, dtype=np.float32),
+        "episodes": [],
+    }
+
+
+def test_learn_advances_timesteps_and_version(state_file):
+    trainer = AsyncPPO(make_env_fn(state_file, max_gameplay_time=20), num_actors=2, envs_per_actor=2, n_steps=32,
+                       batch_size=64, n_epochs=1, verbose=0, device="cpu")
+    try:
+        model = trainer.learn(640)
+    finally:
+        trainer.close()
+    # 2 actors x 2 envs x 32 steps per update
+    assert model.num_timesteps == 640
+    assert trainer.version == 5
+    assert not any(p.is_alive() for p in trainer.processes)
+
+
+def test_stale_segments_are_dropped(state_file):
+    trainer = learner(state_file, max_policy_lag=1)
+    trainer.version = 3
+    for version in (1, 3, 0, 2):
+        trainer.rollout_queue.put(segment(trainer, version, seed=version))
+    segments, lags = trainer._next_segments()
+    # versions 1 and 0 lag by more than one update
+    assert [s["version"] for s in segments] == [3, 2]
+    assert lags == [0, 1]
+    assert trainer.dropped_segments == 2
+
+
+def test_fill_buffer_places_segments_in_env_columns(state_file):
+    trainer = learner(state_file)
+    segments = [segment(trainer, 0, seed=1), segment(trainer, 0, seed=2, last_done=1.0)]
+    trainer._fill_buffer(segments)
+    buffer, policy = trainer.model.rollout_buffer, trainer.model.policy
+    assert buffer.full
+    np.testing.assert_array_equal(buffer.observations["info"][:, 2:], segments[1]["obs"]["info"])
+    np.testing.assert_array_equal(buffer.actions[:, :2, 0], segments[0]["actions"])
+    np.testing.assert_array_equal(buffer.log_probs[:, 2:], segments[1]["log_probs"])
+    # values come from the learner's current policy
+    with th.no_grad():
+        values = policy.predict_values(obs_as_tensor({"info": segments[0]["obs"]["info"][0]}, policy.device))
+    np.testing.assert_allclose(buffer.values[0, :2], values.numpy()[:, 0], rtol=1e-5)
+    # the last step bootstraps from the value of the segment's last observation unless it ended
+    with th.no_grad():
+        last_values = policy.predict_values(obs_as_tensor(segments[0]["last_obs"], policy.device)).numpy()[:, 0]
+    expected = segments[0]["rewards"][-1] + trainer.model.gamma * last_values
+    np.testing.assert_allclose(buffer.returns[-1, :2], expected, rtol=1e-4)
+    np.testing.assert_allclose(buffer.returns[-1, 2:], segments[1]["rewards"][-1], rtol=1e-5)
+
+
+def test_truncated_episodes_bootstrap_from_terminal_observation(state_file):
+    observation_space, action_space = spaces_of(state_file)
+    policy = MultiInputPolicy(observation_space, action_space, lambda _: 0.0)
+    terminal = {"info": np.array([99, 8, 80, 1], dtype=np.float32)}
+    infos = [
+        {"TimeLimit.truncated": True, "terminal_observation": terminal},
+        {"TimeLimit.truncated": False, "terminal_observation": terminal},
+        {},
+    ]
+    rewards = np.array([1.0, 1.0, 1.0], dtype=np.float32)
+    _bootstrap_timeouts(policy, rewards, np.array([True, True, False]), infos, gamma=0.9)
+    with th.no_grad():
+        value = float(policy.predict_values(obs_as_tensor({"info": terminal["info"][None]}, policy.device))[0, 0])
+    # only the episode cut off by the time limit gets the value of its final state
+    np.testing.assert_allclose(rewards, [1.0 + 0.9 * value, 1.0, 1.0], rtol=1e-5)
@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+import pytest
+
+from env.columnar import ColumnarReader, ColumnarWriter
+from env.generic_env import GenericPyBoyEnv
+from env.trajectory_recorder import TrajectoryRecorder
+
+from conftest import DummyPyBoy
+
+COLUMNS = (("step", np.uint32), ("value", np.float32))
+
+
+def test_columnar_roundtrip_and_append(tmp_path):
+    log = tmp_path / "log"
+    with ColumnarWriter(log, COLUMNS, chunk_rows=4) as writer:
+        for i in range(10):
+            writer.append(i, i * 0.5)
+    with ColumnarWriter(log, COLUMNS, chunk_rows=4) as writer:
+        writer.append(10, 5.0)
+
+    reader = ColumnarReader(log)
+    assert len(reader) == 11
+    np.testing.assert_array_equal(reader.column("step"), np.arange(11))
+    chunks = list(reader.iter_chunks(["value"], chunk_rows=4))
+    assert [len(c["value"]) for c in chunks] == [4, 4, 3]
+    assert chunks[-1]["value"][-1] == 5.0
+
+
+def test_columnar_schema_mismatch(tmp_path):
+    ColumnarWriter(tmp_path, COLUMNS).close()
+    with pytest.raises(ValueError):
+        ColumnarWriter(tmp_path, (("step", np.uint8),))
+
+
+def test_recorder_logs_positions(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+
+    dummy = DummyPyBoy()
+    env = TrajectoryRecorder(GenericPyBoyEnv(dummy, debug=True, state_path=state_file), tmp_path / "trajectory")
+    env.reset()
+    env.step(1)
+    dummy.memory[0xC0D4] = 17
+    env.step(2)
+    env.reset()
+    env.step(3)
+    env.close()
+
+    reader = ColumnarReader(tmp_path / "trajectory")
+    assert len(reader) == 3
+    assert reader.column("episode").tolist() == [0, 0, 1]
+    assert reader.column("step").tolist() == [0, 1, 0]
+    assert reader.column("x").tolist() == [16, 17, 17]
+    assert reader.column("map_id").tolist() == [80, 80, 80]
+    assert reader.column("action").tolist() == [1, 2, 3]
+
+
+def test_recorder_continues_episode_numbering(tmp_path, state_file):
+    for _ in range(2):
+        env = TrajectoryRecorder(GenericPyBoyEnv(DummyPyBoy(), debug=True, state_path=state_file),
+                                 tmp_path / "trajectory")
+        for _ in range(2):
+            env.reset()
+            env.step(1)
+        env.close()
+    assert ColumnarReader(tmp_path / "trajectory").column("episode").tolist() == [0, 1, 2, 3]
+
+
+def test_columnar_writer_bounds_pending_chunks(tmp_path):
+    writer = ColumnarWriter(tmp_path / "log", COLUMNS, chunk_rows=1, max_pending=1)
+    # stall the writer thread as if the disk could not keep up
+    disk = threading.Event()
+    write = writer._files["step"].write
+    writer._files["step"].write = lambda data: disk.wait() and write(data)
+
+    def produce():
+        for i in range(4):
+            writer.append(i, 0.0)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    producer.join(timeout=0.5)
+    # one chunk in the writer, one queued: the third append waits for the disk
+    assert producer.is_alive()
+    disk.set()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+    writer.close()
+    assert ColumnarReader(tmp_path / "log").column("step").tolist() == [0, 1, 2, 3]
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from env.generic_env import GenericPyBoyEnv
+from env.transition_cache import Transition, TransitionCache, volatile_addresses
+from conftest import DummyPyBoy
+
+
+class CountingPyBoy(DummyPyBoy):
+    """DummyPyBoy that counts emulated frames in RAM and restored snapshots."""
+
+    def __init__(self):
+        super().__init__()
+        self.restored = 0
+
+    def tick(self, count=1, render=True):
+        # a frame counter the state key is told to ignore
+        self.memory[0xC000] = (self.memory[0xC000] + count) % 256
+        return super().tick(count, render)
+
+    def load_state(self, f):
+        self.restored += 1
+        return super().load_state(f)
+
+
+def make_env(state_file, cache, **kwargs):
+    return GenericPyBoyEnv(CountingPyBoy(), debug=True, state_path=state_file, frame_skip=4,
+                           transition_cache=cache, **kwargs)
+
+
+def test_key_ignores_addresses():
+    memory = bytearray(0x10000)
+    cache = TransitionCache(ignore=[0xC000])
+    key = cache.key(memory)
+    memory[0xC000] = 7
+    assert cache.key(memory) == key
+    memory[0xC001] = 7
+    assert cache.key(memory) != key
+    assert TransitionCache().key(bytearray(0x10000)) != TransitionCache().key(memory)
+
+
+def test_lru_eviction_and_admission():
+    cache = TransitionCache(max_entries=2, admit_after=2)
+    assert not cache.admit(b"k", 1)
+    assert cache.admit(b"k", 1)
+    entry = Transition(b"snap", np.zeros(3), None, b"next")
+    for key in (b"a", b"b", b"c"):
+        cache.put(key, 0, entry)
+    assert len(cache) == 2 and cache.evictions == 1
+    assert cache.lookup(b"a", 0) == (None, False)
+    assert cache.lookup(b"c", 0)[0] is entry
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_env_restores_cached_transitions(state_file):
+    cache = TransitionCache(admit_after=2, verify_every=0, ignore=[0xC000])
+    env = make_env(state_file, cache)
+    reference = make_env(state_file, None)
+    env.reset()
+    reference.reset()
+    for step in range(6):
+        obs, reward, terminated, truncated, _ = env.step(2)
+        expected = reference.step(2)
+        np.testing.assert_array_equal(obs["info"], expected[0]["info"])
+        assert (reward, terminated, truncated) == expected[1:4]
+    # seen once, stored on the second miss, restored from the third step on
+    stats = env.get_transition_stats()
+    assert stats["misses"] == 2 and stats["hits"] == 4 and stats["inserts"] == 1
+    assert env.pyboy.restored == reference.pyboy.restored + 4
+    assert env.current_gameplay_time == reference.current_gameplay_time
+
+
+def test_cached_screen_frames(state_file):
+    cache = TransitionCache(admit_after=1, verify_every=0, ignore=[0xC000])
+    env = make_env(state_file, cache, screen_obs=True)
+    env.reset()
+    env.step(3)
+    frame = env.screen.latest().copy()
+    env.pyboy.screen.ndarray[...] = 0
+    obs, *_ = env.step(3)
+    assert cache.hits == 1
+    np.testing.assert_array_equal(obs["screen"][-1], frame)
+
+
+def test_verification_drops_mismatching_entries(state_file):
+    cache = TransitionCache(admit_after=1, verify_every=1, ignore=[0xC000])
+    env = make_env(state_file, cache)
+    env.reset()
+    env.step(2)
+    (key, action), entry = next(iter(cache._entries.items()))
+    cache._entries[(key, action)] = entry._replace(values=entry.values + 1)
+    env.step(2)
+    assert cache.verified == 1 and cache.mismatches == 1 and len(cache) == 0
+    # the emulated result was used, so a fresh entry can be stored again
+    env.step(2)
+    assert len(cache) == 1
+
+
+def test_volatile_addresses_restores_emulator():
+    pyboy = CountingPyBoy()
+    memory = bytes(pyboy.memory)
+    assert volatile_addresses(pyboy, frames=3).tolist() == [0xC000]
+    assert bytes(pyboy.memory) == memory
+
+
+def test_frame_hooks_are_rejected(state_file):
+    with pytest.raises(ValueError):
+        make_env(state_file, TransitionCache(), frame_hooks=[lambda env: None])
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("matplotlib")
+from env.columnar import ColumnarWriter  # noqa: E402
+from env.trajectory_recorder import TRAJECTORY_COLUMNS  # noqa: E402
+from evaluation.visualize_trajectory import (GRID_SIZE, accumulate_heatmaps, iter_chunks,  # noqa: E402
+                                             parse_episodes)
+
+
+@pytest.fixture
+def log(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 5000
+    rows = {
+        "episode": np.repeat(np.arange(10), n // 10),
+        "step": np.tile(np.arange(n // 10), 10),
+        "x": rng.integers(0, 256, n),
+        "y": rng.integers(0, 256, n),
+        "map_id": rng.choice([3, 80, 255], n),
+        "orientation": rng.integers(0, 4, n),
+        "action": rng.integers(0, 6, n),
+        "reward": rng.normal(size=n),
+    }
+    with ColumnarWriter(tmp_path / "trajectory", TRAJECTORY_COLUMNS, chunk_rows=1024) as writer:
+        for i in range(n):
+            writer.append(*(rows[name][i] for name, _ in TRAJECTORY_COLUMNS))
+    return tmp_path / "trajectory", rows
+
+
+def direct_counts(rows, keep):
+    grids = {}
+    for map_id in np.unique(rows["map_id"][keep]).tolist():
+        grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.int64)
+        sel = keep & (rows["map_id"] == map_id)
+        np.add.at(grid, (rows["y"][sel], rows["x"][sel]), 1)
+        grids[map_id] = grid
+    return grids
+
+
+def assert_same_grids(grids, expected):
+    assert sorted(grids) == sorted(expected)
+    for map_id, grid in expected.items():
+        np.testing.assert_array_equal(grids[map_id], grid)
+
+
+def test_chunked_heatmaps_match_direct_counts(log):
+    path, rows = log
+    # a chunk size that does not divide the row count
+    grids = accumulate_heatmaps(iter_chunks(path, chunk_rows=777))
+    assert_same_grids(grids, direct_counts(rows, np.ones(len(rows["x"]), dtype=bool)))
+    assert sum(int(g.sum()) for g in grids.values()) == len(rows["x"])
+
+
+def test_map_and_episode_filters(log):
+    path, rows = log
+    grids = accumulate_heatmaps(iter_chunks(path, chunk_rows=600), map_ids={80, 3}, episodes=(2, 5))
+    keep = np.isin(rows["map_id"], [80, 3]) & (rows["episode"] >= 2) & (rows["episode"] < 5)
+    assert_same_grids(grids, direct_counts(rows, keep))
+    assert sorted(grids) == [3, 80]
+
+
+def test_csv_input_without_map_column(tmp_path):
+    path = tmp_path / "trajectory.csv"
+    path.write_text("pos_x,pos_y\n1,2\n1,2\n3,4\n")
+    grids = accumulate_heatmaps(iter_chunks(path, chunk_rows=2))
+    assert list(grids) == [-1]
+    assert grids[-1][2, 1] == 2 and grids[-1][4, 3] == 1
+    with pytest.raises(ValueError):
+        accumulate_heatmaps(iter_chunks(path), map_ids={80})
+    with pytest.raises(ValueError):
+        accumulate_heatmaps(iter_chunks(path), episodes=(0, 1))
+
+
+def test_parse_episodes():
+    assert parse_episodes("3") == (3, 4)
+    assert parse_episodes("2:5") == (2, 5)
+    assert parse_episodes(":5") == (0, 5)
+    assert parse_episodes("7:") == (7, np.iinfo(np.int64).max)
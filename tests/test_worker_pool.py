@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from env.generic_env import GenericPyBoyEnv
+from training import worker_pool
+from conftest import DummyPyBoy
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_released_emulator_is_reused(tmp_path):
+    rom = tmp_path / "game.gb"
+    pyboy = DummyPyBoy()
+    worker_pool.release_pyboy(pyboy, rom)
+    assert worker_pool.make_pyboy(rom) is pyboy
+    assert worker_pool.preload_info()["free_emulators"][str(rom.resolve())] == 0
+
+
+def test_env_close_releases_emulator(tmp_path):
+    state_file = tmp_path / "zero_state.state"
+    state_file.write_bytes(b"state")
+    released = []
+    pyboy = DummyPyBoy()
+    env = GenericPyBoyEnv(pyboy, debug=True, state_path=state_file, release_emulator=released.append)
+    env.close()
+    env.close()
+    assert released == [pyboy]
+
+
+SCRIPT = """
+import json
+import multiprocessing as mp
+import os
+import sys
+
+sys.path.insert(0, {root!r})
+with open({log!r}, "a") as f:
+    f.write(f"{{os.getpid()}}\\n")
+
+from training import worker_pool
+
+
+def report(queue):
+    queue.put((os.getpid(), worker_pool.preload_info()))
+
+
+if __name__ == "__main__":
+    worker_pool.enable_preload({rom!r}, {state!r}, emulator=False)
+    ctx = mp.get_context("forkserver")
+    queue = ctx.Queue()
+    workers = [ctx.Process(target=report, args=(queue,)) for _ in range(2)]
+    for w in workers:
+        w.start()
+    results = [queue.get(timeout=60) for _ in workers]
+    for w in workers:
+        w.join()
+    print(json.dumps({{"parent": os.getpid(), "results": results}}))
+"""
+
+
+def test_forkserver_workers_inherit_preload(tmp_path):
+    rom, state, log = tmp_path / "game.gb", tmp_path / "zero_state.state", tmp_path / "imports.log"
+    rom.write_bytes(b"rom")
+    state.write_bytes(b"state")
+    script = tmp_path / "launch.py"
+    script.write_text(textwrap.dedent(SCRIPT.format(root=str(ROOT), log=str(log), rom=str(rom), state=str(state))))
+    env = {k: v for k, v in os.environ.items() if k != worker_pool.PRELOAD_ENV}
+    out = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=120, env=env,
+                         check=True).stdout
+    report = json.loads(out)
+    parent, results = report["parent"], report["results"]
+    worker_pids = {pid for pid, _ in results}
+    for _, info in results:
+        assert info["roms"] == [str(rom.resolve())]
+        assert info["cached_states"] == 1
+    # the script ran in the launcher and once in the forkserver, never in the workers
+    imported = [int(line) for line in log.read_text().split()]
+    assert len(imported) == 2 and imported[0] == parent
+    assert not worker_pids & set(imported)
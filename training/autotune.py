@@ -0,0 +1,176 @@
+"""Pick num_envs, vec-env backend, n_steps and batch_size from measured throughput.
+
+Calibration runs in two parts:
+
+1. For every (backend, num_envs) candidate a vec env is built and stepped for a short
+   rollout with the policy's ``predict``, which gives env steps/sec including policy
+   inference, and the resident memory of the process and its workers.
+2. For every (num_envs, n_steps, batch_size) candidate one PPO update is timed on a
+   rollout buffer of that size filled with random observations. The update cost only
+   depends on the buffer and batch sizes, not on the emulator.
+
+The predicted training throughput of a full configuration is
+``n_steps * num_envs / (rollout time + update time)``. The fastest configuration whose
+memory and worker-process count fit the budget is returned.
+"""
+import os
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import gymnasium as gym
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+from env.batched_vec_env import BatchedVecEnv
+from env.profiler import rss_bytes
+
+BACKENDS = ("dummy", "subproc", "batched")
+
+
+class Candidate(NamedTuple):
+    backend: str
+    num_envs: int
+    n_steps: int
+    batch_size: int
+    env_sps: float
+    update_sec: float
+    sps: float
+    memory_bytes: Optional[int]
+    workers: int
+
+
+def build_vec_env(backend: str, env_fns: Sequence[Callable], envs_per_worker: int = 2, transport: str = "shm"):
+    if backend == "dummy":
+        return DummyVecEnv(env_fns)
+    if backend == "subproc":
+        return SubprocVecEnv(env_fns)
+    if backend == "batched":
+        return BatchedVecEnv(env_fns, envs_per_worker=envs_per_worker, transport=transport)
+    raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+
+
+def worker_processes(backend: str, num_envs: int, envs_per_worker: int) -> int:
+    if backend == "dummy":
+        return 0
+    if backend == "subproc":
+        return num_envs
+    return -(-num_envs // envs_per_worker)
+
+
+def _worker_pids(vec_env) -> List[int]:
+    if isinstance(vec_env, BatchedVecEnv):
+        return [p.pid for p in vec_env.pool.processes]
+    return [p.pid for p in getattr(vec_env, "processes", [])]
+
+
+class SpacesEnv(gym.Env):
+    """Random-observation env with the given spaces, to time PPO updates without an emulator."""
+
+    def __init__(self, observation_space, action_space):
+        self.observation_space = observation_space
+        self.action_space = action_space
+
+    def reset(self, seed=None, options=None):
+        return self.observation_space.sample(), {}
+
+    def step(self, action):
+        return self.observation_space.sample(), 0.0, False, False, {}
+
+
+def measure_rollout(backend: str, env_fn: Callable, num_envs: int, steps_per_env: int, envs_per_worker: int,
+                    ppo_kwargs: Dict):
+    """Return (env steps/sec with policy inference, RSS bytes of this process plus workers, spaces)."""
+    vec_env = build_vec_env(backend, [env_fn] * num_envs, envs_per_worker=envs_per_worker)
+    try:
+        model = PPO("MultiInputPolicy", vec_env, n_steps=steps_per_env, batch_size=steps_per_env, **ppo_kwargs)
+        obs = vec_env.reset()
+        # the first step warms up the emulators and torch
+        obs, _, _, _ = vec_env.step(model.predict(obs)[0])
+        start = time.perf_counter()
+        for _ in range(steps_per_env):
+            obs, _, _, _ = vec_env.step(model.predict(obs)[0])
+        env_sps = steps_per_env * num_envs / (time.perf_counter() - start)
+        rss = [rss_bytes()] + [rss_bytes(pid) for pid in _worker_pids(vec_env)]
+        memory = sum(rss) if None not in rss else None
+        spaces = (vec_env.observation_space, vec_env.action_space)
+    finally:
+        vec_env.close()
+    return env_sps, memory, spaces
+
+
+def measure_update(spaces, num_envs: int, n_steps: int, batch_size: int, ppo_kwargs: Dict, seed: int = 0) -> float:
+    """Wall time of one PPO update on a full rollout buffer collected from a random-observation env."""
+    observation_space, action_space = spaces
+    vec_env = DummyVecEnv([lambda: SpacesEnv(observation_space, action_space)] * num_envs)
+    model = PPO("MultiInputPolicy", vec_env, n_steps=n_steps, batch_size=batch_size, seed=seed, **ppo_kwargs)
+    timings = []
+    train = model.train
+
+    def timed_train():
+        start = time.perf_counter()
+        train()
+        timings.append(time.perf_counter() - start)
+
+    model.train = timed_train
+    model.learn(total_timesteps=n_steps * num_envs)
+    vec_env.close()
+    return timings[0]
+
+
+def autotune(env_fn: Callable, env_counts: Sequence[int] = (1, 2, 4, 8), backends: Sequence[str] = BACKENDS,
+             n_steps_options: Sequence[int] = (512, 1024, 2048), batch_sizes: Sequence[int] = (64, 128, 256, 512),
+             max_memory_bytes: Optional[int] = None, max_workers: Optional[int] = None, envs_per_worker: int = 2,
+             calibration_steps: int = 128, ppo_kwargs: Optional[Dict] = None,
+             verbose: bool = True) -> Tuple[Optional[Candidate], List[Candidate]]:
+    """Measure every candidate and return (best fitting candidate or None, all candidates).
+
+    ``max_workers`` caps the number of env worker processes (default: the CPU count);
+    ``max_memory_bytes`` caps the measured RSS of the process plus its workers.
+    """
+    ppo_kwargs = dict(ppo_kwargs or {})
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    rollouts = {}
+    spaces = None
+    for backend in backends:
+        for num_envs in env_counts:
+            workers = worker_processes(backend, num_envs, envs_per_worker)
+            if workers > max_workers or (backend != "dummy" and num_envs == 1):
+                continue
+            env_sps, memory, spaces = measure_rollout(backend, env_fn, num_envs, calibration_steps, envs_per_worker,
+                                                      ppo_kwargs)
+            rollouts[backend, num_envs] = (env_sps, memory, workers)
+            if verbose:
+                mem = f"{memory / 2**20:.0f} MiB" if memory is not None else "n/a"
+                print(f"[autotune] {backend:<8} num_envs={num_envs:<3} {env_sps:8.1f} env steps/s, {mem}")
+    if not rollouts:
+        return None, []
+
+    updates = {}
+    candidates = []
+    for (backend, num_envs), (env_sps, memory, workers) in rollouts.items():
+        for n_steps in n_steps_options:
+            rollout_size = n_steps * num_envs
+            for batch_size in batch_sizes:
+                if batch_size > rollout_size or rollout_size % batch_size:
+                    continue
+                key = (num_envs, n_steps, batch_size)
+                if key not in updates:
+                    updates[key] = measure_update(spaces, num_envs, n_steps, batch_size, ppo_kwargs)
+                update_sec = updates[key]
+                sps = rollout_size / (rollout_size / env_sps + update_sec)
+                candidates.append(Candidate(backend, num_envs, n_steps, batch_size, env_sps, update_sec, sps,
+                                            memory, workers))
+
+    fitting = [c for c in candidates
+               if max_memory_bytes is None or c.memory_bytes is None or c.memory_bytes <= max_memory_bytes]
+    best = max(fitting, key=lambda c: c.sps) if fitting else None
+    if verbose:
+        for c in sorted(candidates, key=lambda c: -c.sps)[:10]:
+            mark = " <- selected" if c is best else ""
+            print(f"[autotune] {c.backend:<8} num_envs={c.num_envs:<3} n_steps={c.n_steps:<5} "
+                  f"batch_size={c.batch_size:<4} update {c.update_sec:6.2f}s -> {c.sps:8.1f} steps/s{mark}")
+        if best is None:
+            print("[autotune] no configuration fits the memory budget")
+    return best, candidates
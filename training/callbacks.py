@@ -0,0 +1,245 @@
+"""Stable-Baselines3 callbacks shared by the training scripts."""
+import time
+from typing import Optional
+
+from stable_baselines3.common.callbacks import BaseCallback
+
+from env.episode_stats import EpisodeStatsAggregator
+from env.profiler import STEP_PHASES, PhaseProfiler
+from training.checkpointing import CheckpointStore, save_checkpoint
+
+
+class EnvProfileCallback(BaseCallback):
+    """Log the step-phase timings of envs created with ``GenericPyBoyEnv(profile=True)``.
+
+    At the end of every rollout the profilers of all envs are collected (and reset)
+    through ``env_method("get_profile")``, merged, and recorded under ``env_profile/``
+    in the model's logger, i.e. the TensorBoard run when ``tensorboard_log`` is set.
+    The mean step time of each env is recorded as well (``env<i>_step_mean_us``),
+    with the index of the slowest env and its step time relative to the mean over
+    all envs (``slowest_env``, ``slowest_step_ratio``). Envs without profiling
+    return None and are ignored.
+    """
+
+    def __init__(self, verbose: int = 0):
+        super().__init__(verbose)
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self) -> None:
+        profiles = self.training_env.env_method("get_profile", reset=True)
+        snapshots = [s for s in profiles if s is not None]
+        if not snapshots:
+            return
+        profiler = PhaseProfiler(STEP_PHASES)
+        for snapshot in snapshots:
+            profiler.merge(snapshot)
+        for phase, stats in profiler.summary().items():
+            if not stats["count"]:
+                continue
+            self.logger.record(f"env_profile/{phase}_mean_us", stats["mean_ns"] / 1e3)
+            self.logger.record(f"env_profile/{phase}_p99_us", stats["p99_ns"] / 1e3)
+            self.logger.record(f"env_profile/{phase}_fraction", stats["fraction"])
+        steps = profiler.counts[0]
+        if steps:
+            self.logger.record("env_profile/step_mean_us", sum(profiler.totals_ns) / steps / 1e3)
+        # per-env step time, to spot a single slow env (or the worker hosting it)
+        step_means = {index: sum(s["totals_ns"]) / s["counts"][0] / 1e3
+                      for index, s in enumerate(profiles) if s is not None and s["counts"][0]}
+        for index, mean_us in step_means.items():
+            self.logger.record(f"env_profile/env{index}_step_mean_us", mean_us)
+        if step_means:
+            slowest = max(step_means, key=step_means.get)
+            self.logger.record("env_profile/slowest_env", slowest)
+            self.logger.record("env_profile/slowest_step_ratio",
+                               step_means[slowest] / (sum(step_means.values()) / len(step_means)))
+
+
+class TransitionCacheCallback(BaseCallback):
+    """Log the transition caches of envs created with ``GenericPyBoyEnv(transition_cache=...)``.
+
+    At the end of every rollout the counters of all envs (``get_transition_stats()``)
+    are summed and recorded under ``transition_cache/``.
+    """
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self) -> None:
+        snapshots = [s for s in self.training_env.env_method("get_transition_stats") if s is not None]
+        if not snapshots:
+            return
+        totals = {key: sum(s[key] for s in snapshots) for key in snapshots[0] if key != "hit_rate"}
+        lookups = totals["hits"] + totals["misses"]
+        self.logger.record("transition_cache/hit_rate", totals["hits"] / lookups if lookups else 0.0)
+        for key in ("entries", "inserts", "evictions", "verified", "mismatches", "snapshot_bytes"):
+            self.logger.record(f"transition_cache/{key}", totals[key])
+
+
+class ThroughputCallback(BaseCallback):
+    """Log how training time splits between rollout collection and gradient updates.
+
+    Every rollout records under ``throughput/``:
+
+    - ``rollout_sec``: wall time of the rollout (env steps plus policy inference)
+    - ``env_sps``: env steps per second over all envs (``EnvProfileCallback`` breaks
+      the step time down per env)
+    - ``frames_per_sec``: emulator frames per second (env steps x frame_skip)
+
+    The gradient update runs after SB3 dumps the logs of an iteration, so ``update_sec``
+    and ``rollout_fraction`` (rollout time / (rollout + update) time) describe the
+    previous iteration. A ``rollout_fraction`` close to 1 means training is env-bound;
+    close to 0 means it is learner-bound.
+
+    ``frame_skip`` defaults to the envs' own ``frame_skip`` attribute (1 if they have none).
+    With ``start_time`` (a ``time.perf_counter()`` value, e.g. taken when the script
+    started) the cold start, from then until the first env step of training is done,
+    is logged once as ``throughput/cold_start_sec``.
+    """
+
+    def __init__(self, frame_skip: Optional[int] = None, start_time: Optional[float] = None, verbose: int = 0):
+        super().__init__(verbose)
+        self.frame_skip = frame_skip
+        self.start_time = start_time
+        self.cold_start_sec: Optional[float] = None
+        self.rollout_time = 0.0
+        self.update_time = 0.0
+        self._rollout_start: Optional[float] = None
+        self._update_start: Optional[float] = None
+        self._last_rollout = 0.0
+        self._rollout_steps_start = 0
+
+    def _on_training_start(self) -> None:
+        if self.frame_skip is None:
+            try:
+                self.frame_skip = int(self.training_env.get_attr("frame_skip", indices=0)[0])
+            except AttributeError:
+                self.frame_skip = 1
+        self._update_start = None
+
+    def _end_update(self, now: float):
+        if self._update_start is None:
+            return
+        update = now - self._update_start
+        self.update_time += update
+        self._update_start = None
+        self.logger.record("throughput/update_sec", update)
+        if self._last_rollout + update > 0:
+            self.logger.record("throughput/rollout_fraction", self._last_rollout / (self._last_rollout + update))
+
+    def _on_rollout_start(self) -> None:
+        now = time.perf_counter()
+        self._end_update(now)
+        self._rollout_start = now
+        self._rollout_steps_start = self.num_timesteps
+
+    def _on_step(self) -> bool:
+        if self.start_time is not None and self.cold_start_sec is None:
+            self.cold_start_sec = time.perf_counter() - self.start_time
+            self.logger.record("throughput/cold_start_sec", self.cold_start_sec)
+            if self.verbose:
+                print(f"Cold start: first env step after {self.cold_start_sec:.1f}s")
+        return True
+
+    def _on_rollout_end(self) -> None:
+        now = time.perf_counter()
+        rollout = now - self._rollout_start
+        self.rollout_time += rollout
+        self._last_rollout = rollout
+        steps = self.num_timesteps - self._rollout_steps_start
+        self.logger.record("throughput/rollout_sec", rollout)
+        if rollout > 0:
+            self.logger.record("throughput/env_sps", steps / rollout)
+            self.logger.record("throughput/frames_per_sec", steps * self.frame_skip / rollout)
+        self._update_start = now
+
+    def _on_training_end(self) -> None:
+        # the last update is not followed by another rollout
+        self._end_update(time.perf_counter())
+        self.logger.dump(self.num_timesteps)
+        if self.verbose:
+            total = self.rollout_time + self.update_time
+            share = self.rollout_time / total if total else 0.0
+            print(f"Rollouts {self.rollout_time:.1f}s, updates {self.update_time:.1f}s "
+                  f"({share:.0%} of the time collecting experience)")
+
+
+class EpisodeStatsCallback(BaseCallback):
+    """Aggregate the ``info["episode"]`` summaries of ``env.episode_stats.EpisodeStatsWrapper``.
+
+    Every finished episode of every env is appended to one columnar log in
+    ``log_dir`` (see ``EpisodeStatsAggregator``), which is handed to the disk writer
+    once per rollout. At the end of each rollout the means over the last ``window``
+    episodes are recorded under ``episode_stats/``.
+    """
+
+    def __init__(self, log_dir=None, window: int = 100, verbose: int = 0):
+        super().__init__(verbose)
+        self.log_dir = log_dir
+        self.window = window
+        self.stats: Optional[EpisodeStatsAggregator] = None
+
+    def _on_training_start(self) -> None:
+        if self.stats is None:
+            self.stats = EpisodeStatsAggregator(self.log_dir, window=self.window)
+
+    def _on_step(self) -> bool:
+        for i, (info, done) in enumerate(zip(self.locals["infos"], self.locals["dones"])):
+            if done and "episode" in info:
+                self.stats.add(info["episode"], self.num_timesteps, i)
+        return True
+
+    def _on_rollout_end(self) -> None:
+        self.stats.flush()
+        summary = self.stats.summary()
+        if summary is None:
+            return
+        for key, value in summary.items():
+            self.logger.record(f"episode_stats/{key}", value)
+        self.logger.record("episode_stats/episodes", self.stats.episodes)
+
+    def _on_training_end(self) -> None:
+        self.stats.close()
+        self.stats = None
+
+
+class ResumableCheckpointCallback(BaseCallback):
+    """Write resumable checkpoints (see training/checkpointing.py) every ``save_freq`` env steps.
+
+    Checkpoints are taken at the start of a rollout, right after an update, so no
+    collected experience is lost, and once more when training ends. Only the ``keep``
+    newest checkpoints (and the chunks they use) are kept.
+    """
+
+    def __init__(self, save_freq: int, store: CheckpointStore, keep: int = 3, verbose: int = 0):
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.store = store
+        self.keep = keep
+        self._last_save = 0
+
+    def _on_training_start(self) -> None:
+        self._last_save = self.num_timesteps
+
+    def _save(self) -> None:
+        written = self.store.bytes_written
+        start = time.perf_counter()
+        name = save_checkpoint(self.model, self.store)
+        self.store.prune(self.keep)
+        self._last_save = self.num_timesteps
+        self.logger.record("checkpoint/save_sec", time.perf_counter() - start)
+        self.logger.record("checkpoint/bytes_written", self.store.bytes_written - written)
+        if self.verbose:
+            print(f"Saved checkpoint {name} to {self.store.directory}")
+
+    def _on_rollout_start(self) -> None:
+        if self.num_timesteps - self._last_save >= self.save_freq:
+            self._save()
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_training_end(self) -> None:
+        if self.num_timesteps > self._last_save:
+            self._save()
@@ -0,0 +1,248 @@
+"""Resumable training checkpoints.
+
+SB3's ``CheckpointCallback`` saves only the model, so a resumed run starts its
+envs from ``zero_state.state`` with empty exploration memory and a fresh RNG. A
+checkpoint written here holds everything needed to continue where training
+stopped:
+
+- the model zip: policy weights, optimizer state, hyperparameters and ``num_timesteps``
+- ``VecNormalize`` statistics, when the env is wrapped in one
+- the trainer state: last observations and episode starts, the Python, NumPy and
+  torch RNG states, and the recent episode infos
+- per env, ``GenericPyBoyEnv.get_state()``: the emulator snapshot, the episode
+  counters, the exploration bits and the env's RNG
+
+Storage is content addressed. Every binary part is split into fixed-size chunks
+stored once under ``blobs/<2 hex>/<sha256>``, and a checkpoint is a small JSON
+manifest listing the chunks of each part. Most of an emulator snapshot (ROM banks,
+unchanged RAM pages) is identical between checkpoints, so later checkpoints only
+write the chunks that changed. Files are written to a temporary name and moved
+into place with ``os.replace``, and the manifest goes last, so a crash never
+leaves a checkpoint that refers to missing data.
+
+``CheckpointStore`` does not import Stable-Baselines3; ``save_checkpoint`` and
+``load_checkpoint`` do.
+"""
+import hashlib
+import json
+import os
+import pickle
+import random
+import time
+from collections import deque
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+MANIFEST_FORMAT = 1
+# PyBoy save states are ~180 KB and mostly unchanged between checkpoints at this granularity
+DEFAULT_CHUNK_SIZE = 4096
+LATEST = "LATEST"
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CheckpointStore:
+    """A directory of checkpoint manifests sharing one content-addressed chunk store."""
+
+    def __init__(self, directory: Union[str, Path], chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be >= 1, got {chunk_size}")
+        self.directory = Path(directory)
+        self.blob_dir = self.directory / "blobs"
+        self.chunk_size = chunk_size
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        # bytes passed to put() that were written / already present
+        self.bytes_written = 0
+        self.bytes_deduplicated = 0
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def put(self, data: bytes) -> List[str]:
+        """Store ``data`` and return the digests of its chunks; chunks already stored are skipped."""
+        view = memoryview(data)
+        digests = []
+        for start in range(0, len(view), self.chunk_size):
+            chunk = view[start:start + self.chunk_size]
+            digest = hashlib.sha256(chunk).hexdigest()
+            path = self._blob_path(digest)
+            if path.exists():
+                self.bytes_deduplicated += len(chunk)
+            else:
+                path.parent.mkdir(exist_ok=True)
+                _write_atomic(path, chunk)
+                self.bytes_written += len(chunk)
+            digests.append(digest)
+        return digests
+
+    def get(self, digests: List[str]) -> bytes:
+        return b"".join(self._blob_path(digest).read_bytes() for digest in digests)
+
+    def write_manifest(self, name: str, manifest: Dict):
+        _write_atomic(self.directory / f"{name}.json", json.dumps(manifest, indent=1).encode())
+        _write_atomic(self.directory / LATEST, name.encode())
+
+    def read_manifest(self, name: Optional[str] = None) -> Dict:
+        """The manifest of checkpoint ``name``, by default the latest one."""
+        if name is None:
+            name = self.latest()
+            if name is None:
+                raise FileNotFoundError(f"No checkpoint in {self.directory}")
+        return json.loads((self.directory / f"{name}.json").read_text())
+
+    def latest(self) -> Optional[str]:
+        try:
+            name = (self.directory / LATEST).read_text().strip()
+        except FileNotFoundError:
+            return None
+        return name if (self.directory / f"{name}.json").exists() else None
+
+    def checkpoints(self) -> List[str]:
+        """Checkpoint names, oldest first."""
+        manifests = [p for p in self.directory.glob("*.json") if not p.name.startswith(".")]
+        return [p.stem for p in sorted(manifests, key=lambda p: p.stat().st_mtime_ns)]
+
+    def prune(self, keep: int):
+        """Delete all but the ``keep`` newest checkpoints and the chunks no remaining checkpoint uses."""
+        names = self.checkpoints()
+        latest = self.latest()
+        removed = [n for n in names[:max(0, len(names) - keep)] if n != latest]
+        for name in removed:
+            (self.directory / f"{name}.json").unlink()
+        if not removed:
+            return
+        referenced = set()
+        for name in self.checkpoints():
+            referenced.update(_manifest_digests(self.read_manifest(name)))
+        for path in self.blob_dir.glob("*/*"):
+            if path.name not in referenced and not path.name.startswith("."):
+                path.unlink()
+
+    def put_env_state(self, state: Dict) -> Dict:
+        """Store an env state dict: each top-level ``bytes`` value (e.g. the emulator
+        snapshot) is chunked on its own so it deduplicates well, the rest is pickled."""
+        blobs = {key: self.put(value) for key, value in state.items() if isinstance(value, bytes)}
+        rest = {key: value for key, value in state.items() if key not in blobs}
+        return {"blobs": blobs, "rest": self.put(pickle.dumps(rest))}
+
+    def get_env_state(self, entry: Dict) -> Dict:
+        state = pickle.loads(self.get(entry["rest"]))
+        for key, digests in entry["blobs"].items():
+            state[key] = self.get(digests)
+        return state
+
+
+def _manifest_digests(manifest: Dict):
+    for key in ("model", "vec_normalize", "trainer"):
+        yield from manifest.get(key) or []
+    for entry in manifest.get("envs", []):
+        yield from entry["rest"]
+        for digests in entry["blobs"].values():
+            yield from digests
+
+
+def _rng_state() -> Dict:
+    import torch as th
+    state = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": th.get_rng_state()}
+    if th.cuda.is_available():
+        state["cuda"] = th.cuda.get_rng_state_all()
+    return state
+
+
+def _set_rng_state(state: Dict):
+    import torch as th
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    th.set_rng_state(state["torch"])
+    if "cuda" in state and th.cuda.is_available():
+        th.cuda.set_rng_state_all(state["cuda"])
+
+
+def save_checkpoint(model, store: CheckpointStore, name: Optional[str] = None) -> str:
+    """Write a resumable checkpoint of ``model`` and its envs; returns the checkpoint name.
+
+    Call it between rollouts (e.g. from a callback's ``_on_rollout_start``), when the
+    rollout buffer holds nothing that the next update still needs.
+    """
+    from stable_baselines3.common.vec_env import unwrap_vec_normalize
+
+    name = name or f"step_{model.num_timesteps:012d}"
+    vec_env = model.get_env()
+
+    buf = BytesIO()
+    model.save(buf)
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "algo": type(model).__name__,
+        "num_timesteps": model.num_timesteps,
+        "created": time.time(),
+        "model": store.put(buf.getvalue()),
+        "vec_normalize": None,
+    }
+    vec_normalize = unwrap_vec_normalize(vec_env)
+    if vec_normalize is not None:
+        stats = {"obs_rms": vec_normalize.obs_rms, "ret_rms": vec_normalize.ret_rms, "returns": vec_normalize.returns}
+        manifest["vec_normalize"] = store.put(pickle.dumps(stats))
+    trainer = {
+        "last_obs": model._last_obs,
+        "last_original_obs": model._last_original_obs,
+        "last_episode_starts": model._last_episode_starts,
+        "ep_info_buffer": list(model.ep_info_buffer or []),
+        "ep_success_buffer": list(model.ep_success_buffer or []),
+        "rng": _rng_state(),
+    }
+    manifest["trainer"] = store.put(pickle.dumps(trainer))
+    manifest["envs"] = [store.put_env_state(state) for state in vec_env.env_method("get_state")]
+    store.write_manifest(name, manifest)
+    return name
+
+
+def load_checkpoint(store: CheckpointStore, env, name: Optional[str] = None, algo_class=None, **load_kwargs):
+    """Load checkpoint ``name`` (default: the latest) into a new model trained on ``env``.
+
+    ``env`` must have as many envs as the checkpoint; each is restored with
+    ``set_state``. Continue with ``model.learn(..., reset_num_timesteps=False)`` so
+    the restored observations are used instead of a fresh reset.
+    """
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import unwrap_vec_normalize
+
+    manifest = store.read_manifest(name)
+    if manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError(f"Unsupported checkpoint format {manifest.get('format')!r}")
+    if len(manifest["envs"]) != env.num_envs:
+        raise ValueError(f"Checkpoint has {len(manifest['envs'])} envs but the env has {env.num_envs}")
+    algo_class = algo_class or PPO
+    model = algo_class.load(BytesIO(store.get(manifest["model"])), env=env, **load_kwargs)
+
+    # Reset first so wrappers such as EpisodeStatsWrapper start an episode, then overwrite the emulators
+    env.reset()
+    for i, entry in enumerate(manifest["envs"]):
+        env.env_method("set_state", store.get_env_state(entry), indices=[i])
+    if manifest["vec_normalize"] is not None:
+        vec_normalize = unwrap_vec_normalize(env)
+        if vec_normalize is None:
+            raise ValueError("Checkpoint has VecNormalize statistics but the env is not wrapped in VecNormalize")
+        stats = pickle.loads(store.get(manifest["vec_normalize"]))
+        vec_normalize.obs_rms, vec_normalize.ret_rms, vec_normalize.returns = (
+            stats["obs_rms"], stats["ret_rms"], stats["returns"])
+
+    trainer = pickle.loads(store.get(manifest["trainer"]))
+    model._last_obs = trainer["last_obs"]
+    model._last_original_obs = trainer["last_original_obs"]
+    model._last_episode_starts = trainer["last_episode_starts"]
+    # learn(reset_num_timesteps=False) keeps existing buffers, so ep_rew_mean continues smoothly
+    model.ep_info_buffer = deque(trainer["ep_info_buffer"], maxlen=model._stats_window_size)
+    model.ep_success_buffer = deque(trainer["ep_success_buffer"], maxlen=model._stats_window_size)
+    _set_rng_state(trainer["rng"])
+    return model
@@ -0,0 +1,69 @@
+"""Host env workers for training on another machine.
+
+Usage (on each env machine):
+    PYBOY_ENV_AUTHKEY=secret python training/remote_env_server.py --port 7001 --num-envs 16 --envs-per-worker 4
+
+then on the training machine:
+    PYBOY_ENV_AUTHKEY=secret python training/training_ppo_v2.py --remote-envs host1:7001,host2:7001
+
+The envs are built like ``training_ppo_v2.py`` builds them (same ROM, start state
+and frame skip options) and stepped by local worker processes; see
+``env/remote_env.py`` for the protocol. Only clients with the same authkey can
+connect, but traffic is unencrypted: use a trusted network or an SSH tunnel.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from env.remote_env import AUTHKEY_ENV, RemoteEnvServer, resolve_authkey  # noqa: E402
+from training.training_ppo_v2 import ROM_PATH, STATE_PATH, make_env_fn  # noqa: E402
+from training.worker_pool import enable_preload  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve GenericPyBoyEnv workers over TCP")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to listen on (default: all)")
+    parser.add_argument("--port", type=int, default=7001, help="TCP port (default: 7001)")
+    parser.add_argument("--authkey", default=None, help=f"Shared secret (default: ${AUTHKEY_ENV})")
+    parser.add_argument("--num-envs", type=int, default=4, help="Envs hosted by this server (default: 4)")
+    parser.add_argument("--envs-per-worker", type=int, default=1,
+                        help="Envs stepped by each local worker process (default: 1)")
+    parser.add_argument("--transport", choices=["pipe", "shm"], default="pipe",
+                        help="How local workers return step results (default: pipe)")
+    parser.add_argument("--preload-workers", action="store_true",
+                        help="Fork local workers from a preloaded parent (see training/worker_pool.py)")
+    parser.add_argument("--rom", type=str, default=str(ROM_PATH), help="Path to ROM file")
+    parser.add_argument("--frame-skip", type=int, default=60, help="Emulator frames advanced per action (default: 60)")
+    parser.add_argument("--screen-obs", action="store_true", help="Add stacked screen frames to the observations")
+    parser.add_argument("--screen-frames", type=int, default=4)
+    parser.add_argument("--screen-downsample", type=int, default=2)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        authkey = resolve_authkey(args.authkey)
+    except ValueError as e:
+        raise SystemExit(f"{e}: pass --authkey or set {AUTHKEY_ENV}")
+    if args.preload_workers:
+        enable_preload(Path(args.rom), STATE_PATH)
+    make_env = make_env_fn(rom_path=Path(args.rom), frame_skip=args.frame_skip, screen_obs=args.screen_obs,
+                           screen_frames=args.screen_frames, screen_downsample=args.screen_downsample)
+    server = RemoteEnvServer([make_env for _ in range(args.num_envs)], address=(args.host, args.port),
+                             authkey=authkey, envs_per_worker=args.envs_per_worker, transport=args.transport)
+    print(f"Serving {server.num_envs} envs on {server.address[0]}:{server.address[1]}")
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,14 @@
 import argparse
-from pyboy import PyBoy
-from gymnasium.wrappers import TransformObservation
-from stable_baselines3 import PPO
-from stable_baselines3.common.monitor import Monitor
-from gymnasium.spaces import Box, Dict
-import numpy as np
-from env.generic_env import GenericPyBoyEnv
+import sys
+from pathlib import Path
 
+# Ensure repo root is on sys.path so `import env...` works when running this file directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
 
-def make_env(rom_path: str = "MedarotKabuto.gb"):
-    pyboy = PyBoy(rom_path)
-    env = GenericPyBoyEnv(pyboy, debug=False, render_mode=False)
-    env = TransformObservation(env,
-        lambda obs: {"info": obs["info"]},
-        observation_space=Dict({"info": Box(0, 255, (4,), dtype=np.float32)})
-    )
-    return Monitor(env)
-
-
-def evaluate(model_path: str = "ppo_medarot", rom_path: str = "MedarotKabuto.gb", num_episodes: int = 100):
-    """Load the model and run num_episodes episodes, returning the rewards list."""
-    model = PPO.load(model_path)
-    eval_env = make_env(rom_path)
-
-    rewards = []
-    for ep in range(num_episodes):
-        obs, _ = eval_env.reset()
-        total = 0
-        done = False
-        while not done:
-            action, _ = model.predict(obs)
-            obs, reward, done, truncated, _ = eval_env.step(action)
-            total += reward
-        rewards.append(total)
-        print(f"Episode {ep+1}: {total}")
-
-    print("Average reward:", np.mean(rewards))
-    return rewards
+# Evaluation (environment setup, parallel batched rollouts and summary statistics)
+# is shared with evaluation/evaluate_model.py.
+from evaluation.evaluate_model import add_eval_arguments, evaluate, make_env, run_from_args  # noqa: E402,F401
 
 
 def main():
@@ -45,11 +17,8 @@ def main():
                         help="Path to the trained model")
     parser.add_argument("--rom", default="MedarotKabuto.gb",
                         help="Path to ROM file")
-    parser.add_argument("--episodes", type=int, default=100,
-                        help="Number of episodes to run")
-    args = parser.parse_args()
-    evaluate(model_path=args.model, rom_path=args.rom,
-             num_episodes=args.episodes)
+    add_eval_arguments(parser)
+    run_from_args(parser.parse_args())
 
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
+import argparse
 from pathlib import Path
 
 from pyboy import PyBoy
@@ -5,10 +6,12 @@ from gymnasium.wrappers import TransformObservation
 from gymnasium.spaces import Box, Dict
 from stable_baselines3 import PPO
 from stable_baselines3.ppo import MultiInputPolicy
-from stable_baselines3.common.monitor import Monitor
 from stable_baselines3.common.vec_env import SubprocVecEnv
 import numpy as np
+from env.episode_stats import EpisodeStatsWrapper
 from env.generic_env import GenericPyBoyEnv
+from env.batched_vec_env import BatchedVecEnv
+from training.callbacks import EnvProfileCallback, EpisodeStatsCallback, ThroughputCallback
 
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -20,31 +23,49 @@ TBOARD_DIR = ROOT / "logs" / "ppo_tensorboard"
 MODEL_DIR = ROOT / "models"
 
 
-def make_env(rom_path: Path = ROM_PATH):
+def make_env(rom_path: Path = ROM_PATH, profile: bool = False):
     def _init():
         # Each subprocess will create its own PyBoy instance. This is resource intensive
         # — ensure your system can handle `num_envs` separate emulator instances.
         if not rom_path.exists():
             raise FileNotFoundError(f"ROM not found: {rom_path}. Place the ROM in the data/ folder.")
         pyboy = PyBoy(str(rom_path))
-        env = GenericPyBoyEnv(pyboy, debug=False, render_mode=False)
+        env = GenericPyBoyEnv(pyboy, debug=False, render_mode=False, profile=profile)
         # Keep only the 'info' array for the policy input
         env = TransformObservation(
             env,
             lambda obs: {"info": obs["info"]},
             observation_space=Dict({"info": Box(0, 255, (4,), dtype=np.float32)}),
         )
-        LOG_DIR.mkdir(parents=True, exist_ok=True)
-        return Monitor(env, filename=str(LOG_DIR / "monitor.csv"))
+        # Episode summaries travel back with the step infos; EpisodeStatsCallback logs them
+        return EpisodeStatsWrapper(env)
 
     return _init
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="PPO training")
+    parser.add_argument("--num-envs", type=int, default=4, help="Number of parallel environments (default: 4)")
+    parser.add_argument("--envs-per-worker", type=int, default=1,
+                        help="Host this many envs per worker process with BatchedVecEnv (default: 1, SubprocVecEnv)")
+    parser.add_argument("--transport", choices=["pipe", "shm"], default="pipe",
+                        help="How workers return step results; 'shm' uses shared memory (default: pipe)")
+    parser.add_argument("--profile-env", action="store_true",
+                        help="Time each phase of env.step() and log the timings to TensorBoard (env_profile/*)")
+    return parser.parse_args()
+
+
 def main():
-    num_envs = 4
-    # SubprocVecEnv runs multiple independent envs in subprocesses. This helps
-    # collect diverse rollouts in parallel but increases memory/cpu usage.
-    vec_env = SubprocVecEnv([make_env() for _ in range(num_envs)])
+    args = parse_args()
+    num_envs = args.num_envs
+    env_fns = [make_env(profile=args.profile_env) for _ in range(num_envs)]
+    if args.envs_per_worker > 1 or args.transport == "shm":
+        # Each worker process steps a block of envs, so IPC is paid per block rather than per env.
+        vec_env = BatchedVecEnv(env_fns, envs_per_worker=args.envs_per_worker, transport=args.transport)
+    else:
+        # SubprocVecEnv runs multiple independent envs in subprocesses. This helps
+        # collect diverse rollouts in parallel but increases memory/cpu usage.
+        vec_env = SubprocVecEnv(env_fns)
 
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
     TBOARD_DIR.mkdir(parents=True, exist_ok=True)
@@ -65,7 +86,14 @@ def main():
     )
 
     # Start learning — this can take a long time depending on timesteps and env speed.
-    model.learn(total_timesteps=750_000)
+    # Rollout vs. update time and env/emulator throughput, logged under throughput/
+    callbacks = [ThroughputCallback(verbose=1)]
+    # Episode return, length, exploration and target rate from all envs: one log in
+    # LOG_DIR/episodes and rolling means under episode_stats/
+    callbacks.append(EpisodeStatsCallback(LOG_DIR / "episodes"))
+    if args.profile_env:
+        callbacks.append(EnvProfileCallback())
+    model.learn(total_timesteps=750_000, callback=callbacks)
     model.save(str(MODEL_DIR / "ppo_medarot"))
 
 
@@ -0,0 +1,364 @@
+"""Asynchronous actor-learner PPO: emulation overlaps with gradient updates.
+
+With ``model.learn`` the emulators are idle while PPO updates and the learner is
+idle while the emulators run. Here each actor process hosts a block of
+``GenericPyBoyEnv`` instances plus a CPU copy of the policy and keeps collecting
+``n_steps`` rollout segments, which it pushes into a bounded queue. The learner
+takes ``segments_per_update`` segments off the queue, fills the PPO rollout buffer
+with them, runs ``model.train()`` and publishes the new weights. Meanwhile the
+actors keep collecting with the weights they have.
+
+Segments are therefore collected by a slightly stale policy. Every segment carries
+the policy version that collected it. The learner logs the policy lag (its version
+minus the segment's version) and drops segments older than ``--max-policy-lag``.
+The PPO ratio uses the log-probabilities recorded by the actor's behavior policy.
+Values for GAE are recomputed with the current policy.
+
+The queue bound gives backpressure: when the learner falls behind, actors block on
+``put`` instead of piling up stale experience.
+
+Run:
+    python training/training_ppo_async.py --num-actors 4 --envs-per-actor 2 --total-timesteps 1000000
+"""
+import argparse
+import multiprocessing as mp
+import queue
+import sys
+import time
+from pathlib import Path
+
+import cloudpickle
+import numpy as np
+import torch as th
+from stable_baselines3 import PPO
+from stable_baselines3.common.utils import configure_logger, obs_as_tensor
+from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.ppo import MultiInputPolicy
+
+# Ensure repo root is on sys.path so `import env...` works when running this file directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from env.batched_env import build_block, default_start_method  # noqa: E402
+from training.autotune import SpacesEnv  # noqa: E402
+from training.training_ppo_v2 import ROM_PATH, STATE_PATH, TBOARD_DIR, MODEL_DIR, make_env_fn  # noqa: E402
+from training.worker_pool import enable_preload  # noqa: E402
+
+
+def _zero_schedule(_progress_remaining: float) -> float:
+    # Actors never step an optimizer; module level so the policy pickles under spawn
+    return 0.0
+
+
+def _bootstrap_timeouts(policy, rewards: np.ndarray, dones: np.ndarray, infos, gamma: float):
+    """Add ``gamma * V(final observation)`` to the rewards of episodes cut off by the
+    time limit, as SB3 does; ``rewards`` is updated in place."""
+    for i in np.flatnonzero(dones).tolist():
+        info = infos[i]
+        if info.get("TimeLimit.truncated", False):
+            terminal_obs = {key: np.asarray(obs)[None] for key, obs in info["terminal_observation"].items()}
+            with th.no_grad():
+                terminal_value = policy.predict_values(obs_as_tensor(terminal_obs, policy.device))
+            rewards[i] += gamma * float(terminal_value[0, 0])
+
+
+def _actor(actor_id: int, env_fns_bytes: bytes, policy_kwargs: dict, n_steps: int, gamma: float,
+           rollout_queue, param_queue, info_queue, stop_event, seed: int):
+    th.set_num_threads(1)
+    block = build_block(env_fns_bytes)
+    info_queue.put((block.observation_space, block.action_space))
+    policy = MultiInputPolicy(block.observation_space, block.action_space, _zero_schedule, **policy_kwargs)
+    policy.set_training_mode(False)
+    th.manual_seed(seed)
+
+    n = len(block.envs)
+    keys = [key for key, _, _ in block.layout]
+    version = -1
+    block.reset([seed + i for i in range(n)])
+    last_obs = {key: block.obs[key].copy() for key in keys}
+    last_starts = np.ones(n, dtype=bool)
+    episode_returns = np.zeros(n, dtype=np.float64)
+    episode_lengths = np.zeros(n, dtype=np.int64)
+    try:
+        while not stop_event.is_set():
+            # Pick up the newest weights; block only until the first ones arrive
+            try:
+                while True:
+                    version, state = param_queue.get(block=version < 0, timeout=1.0 if version < 0 else None)
+                    policy.load_state_dict({k: th.as_tensor(v) for k, v in state.items()})
+            except queue.Empty:
+                if version < 0:
+                    continue
+
+            seg_obs = {key: np.zeros((n_steps,) + block.obs[key].shape, dtype=block.obs[key].dtype) for key in keys}
+            seg_actions = np.zeros((n_steps, n), dtype=np.int64)
+            seg_rewards = np.zeros((n_steps, n), dtype=np.float32)
+            seg_starts = np.zeros((n_steps, n), dtype=np.float32)
+            seg_log_probs = np.zeros((n_steps, n), dtype=np.float32)
+            episodes = []
+            start = time.perf_counter()
+            for t in range(n_steps):
+                with th.no_grad():
+                    actions, _, log_probs = policy(obs_as_tensor(last_obs, policy.device))
+                actions = actions.cpu().numpy()
+                block.step(actions)
+                rewards = block.rewards.astype(np.float32)
+                dones = block.terminated | block.truncated
+                _bootstrap_timeouts(policy, rewards, dones, block.infos, gamma)
+                for key in keys:
+                    seg_obs[key][t] = last_obs[key]
+                seg_actions[t] = actions
+                seg_rewards[t] = rewards
+                seg_starts[t] = last_starts
+                seg_log_probs[t] = log_probs.cpu().numpy()
+
+                episode_returns += block.rewards
+                episode_lengths += 1
+                for i in np.flatnonzero(dones).tolist():
+                    episodes.append((float(episode_returns[i]), int(episode_lengths[i])))
+                    episode_returns[i] = 0.0
+                    episode_lengths[i] = 0
+                for key in keys:
+                    last_obs[key][:] = block.obs[key]
+                last_starts = dones.copy()
+
+            segment = {
+                "actor": actor_id,
+                "version": version,
+                "obs": seg_obs,
+                "actions": seg_actions,
+                "rewards": seg_rewards,
+                "episode_starts": seg_starts,
+                "log_probs": seg_log_probs,
+                "last_obs": {key: last_obs[key].copy() for key in keys},
+                "last_dones": last_starts.astype(np.float32),
+                "episodes": episodes,
+                "collect_sec": time.perf_counter() - start,
+            }
+            # Bounded queue: wait for the learner, but keep checking for shutdown
+            while not stop_event.is_set():
+                try:
+                    rollout_queue.put(segment, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        block.close()
+
+
+class AsyncPPO:
+    """Learner side: actor processes, queues, and the PPO model that is trained on their segments."""
+
+    def __init__(self, env_fn, num_actors: int = 2, envs_per_actor: int = 2, n_steps: int = 256,
+                 segments_per_update: int = None, queue_size: int = None, max_policy_lag: int = 2,
+                 batch_size: int = 256, start_method: str = None, seed: int = 0, tensorboard_log: str = None,
+                 verbose: int = 1, **ppo_kwargs):
+        self.num_actors = num_actors
+        self.envs_per_actor = envs_per_actor
+        self.n_steps = n_steps
+        self.segments_per_update = segments_per_update or num_actors
+        self.max_policy_lag = max_policy_lag
+        self.version = 0
+        self.dropped_segments = 0
+
+        ctx = mp.get_context(start_method or default_start_method())
+        self.rollout_queue = ctx.Queue(maxsize=queue_size or 2 * num_actors)
+        self.info_queue = ctx.Queue()
+        self.stop_event = ctx.Event()
+        self.param_queues = [ctx.Queue(maxsize=1) for _ in range(num_actors)]
+        gamma = ppo_kwargs.get("gamma", 0.99)
+        policy_kwargs = ppo_kwargs.get("policy_kwargs") or {}
+        env_fns_bytes = cloudpickle.dumps([env_fn] * envs_per_actor)
+        self.processes = []
+        for i in range(num_actors):
+            args = (i, env_fns_bytes, policy_kwargs, n_steps, gamma, self.rollout_queue, self.param_queues[i],
+                    self.info_queue, self.stop_event, seed + 1000 * (i + 1))
+            process = ctx.Process(target=_actor, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+
+        # Actors report their spaces once their envs are built
+        for _ in range(num_actors):
+            observation_space, action_space = self.info_queue.get()
+
+        # The learner's PPO model sees one "env" column per actor env in a training batch
+        n_envs = self.envs_per_actor * self.segments_per_update
+        stub = DummyVecEnv([lambda: SpacesEnv(observation_space, action_space)] * n_envs)
+        self.model = PPO(MultiInputPolicy, stub, n_steps=n_steps, batch_size=batch_size, seed=seed,
+                         tensorboard_log=tensorboard_log, verbose=verbose, **ppo_kwargs)
+        self.model.set_logger(configure_logger(verbose, tensorboard_log, "PPO_async"))
+        self.publish()
+
+    def publish(self):
+        """Send the current weights to every actor, replacing any it has not picked up yet."""
+        # numpy arrays pickle by value; torch tensors would be shared through file descriptors
+        state = {k: v.detach().cpu().numpy() for k, v in self.model.policy.state_dict().items()}
+        for q in self.param_queues:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put((self.version, state))
+
+    def _next_segments(self):
+        segments, lags = [], []
+        while len(segments) < self.segments_per_update:
+            segment = self.rollout_queue.get()
+            lag = self.version - segment["version"]
+            if lag > self.max_policy_lag:
+                self.dropped_segments += 1
+                continue
+            segments.append(segment)
+            lags.append(lag)
+        return segments, lags
+
+    def _fill_buffer(self, segments):
+        buffer = self.model.rollout_buffer
+        policy = self.model.policy
+        buffer.reset()
+        e = self.envs_per_actor
+        for j, segment in enumerate(segments):
+            cols = slice(j * e, (j + 1) * e)
+            for key, obs in segment["obs"].items():
+                buffer.observations[key][:, cols] = obs
+            buffer.actions[:, cols] = segment["actions"].reshape(self.n_steps, e, -1)
+            buffer.rewards[:, cols] = segment["rewards"]
+            buffer.episode_starts[:, cols] = segment["episode_starts"]
+            # behavior-policy log-probs: the PPO ratio is taken against the policy that acted
+            buffer.log_probs[:, cols] = segment["log_probs"]
+        with th.no_grad():
+            flat = {key: obs.reshape((-1,) + obs.shape[2:]) for key, obs in buffer.observations.items()}
+            buffer.values[:] = policy.predict_values(obs_as_tensor(flat, policy.device)).cpu().numpy().reshape(
+                self.n_steps, -1)
+            last_obs = {key: np.concatenate([s["last_obs"][key] for s in segments]) for key in buffer.observations}
+            last_values = policy.predict_values(obs_as_tensor(last_obs, policy.device))
+        dones = np.concatenate([s["last_dones"] for s in segments])
+        buffer.pos = buffer.buffer_size
+        buffer.full = True
+        buffer.compute_returns_and_advantage(last_values=last_values, dones=dones)
+
+    def learn(self, total_timesteps: int, checkpoint_freq: int = 0, checkpoint_dir: str = None):
+        model = self.model
+        logger = model.logger
+        steps_per_update = self.n_steps * self.envs_per_actor * self.segments_per_update
+        next_checkpoint = checkpoint_freq
+        start = time.perf_counter()
+        while model.num_timesteps < total_timesteps:
+            wait_start = time.perf_counter()
+            segments, lags = self._next_segments()
+            wait = time.perf_counter() - wait_start
+
+            self._fill_buffer(segments)
+            model.num_timesteps += steps_per_update
+            model._update_current_progress_remaining(model.num_timesteps, total_timesteps)
+            update_start = time.perf_counter()
+            model.train()
+            update = time.perf_counter() - update_start
+            self.version += 1
+            self.publish()
+
+            episodes = [ep for s in segments for ep in s["episodes"]]
+            if episodes:
+                logger.record("rollout/ep_rew_mean", float(np.mean([r for r, _ in episodes])))
+                logger.record("rollout/ep_len_mean", float(np.mean([n for _, n in episodes])))
+            elapsed = time.perf_counter() - start
+            logger.record("async/policy_lag_mean", float(np.mean(lags)))
+            logger.record("async/policy_lag_max", int(max(lags)))
+            logger.record("async/dropped_segments", self.dropped_segments)
+            logger.record("async/learner_wait_sec", wait)
+            logger.record("async/update_sec", update)
+            logger.record("async/queue_size", self._queue_size())
+            logger.record("time/fps", int(model.num_timesteps / elapsed))
+            logger.record("time/total_timesteps", model.num_timesteps)
+            logger.dump(model.num_timesteps)
+
+            if checkpoint_freq and checkpoint_dir and model.num_timesteps >= next_checkpoint:
+                model.save(str(Path(checkpoint_dir) / f"ppo_async_{model.num_timesteps}_steps"))
+                next_checkpoint += checkpoint_freq
+        return model
+
+    def _queue_size(self):
+        try:
+            return self.rollout_queue.qsize()
+        except NotImplementedError:  # macOS
+            return -1
+
+    def close(self):
+        self.stop_event.set()
+        # Drain so actors blocked on a full queue can see the stop event
+        deadline = time.time() + 10
+        while any(p.is_alive() for p in self.processes) and time.time() < deadline:
+            try:
+                self.rollout_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Asynchronous actor-learner PPO")
+    parser.add_argument("--num-actors", type=int, default=2, help="Actor processes collecting rollouts (default: 2)")
+    parser.add_argument("--envs-per-actor", type=int, default=2, help="Envs stepped by each actor (default: 2)")
+    parser.add_argument("--n-steps", type=int, default=256, help="Steps per env in one rollout segment (default: 256)")
+    parser.add_argument("--segments-per-update", type=int, default=None,
+                        help="Segments per PPO update (default: one per actor)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="Max segments waiting for the learner (default: 2 x actors)")
+    parser.add_argument("--max-policy-lag", type=int, default=2,
+                        help="Drop segments collected by a policy more than this many updates old (default: 2)")
+    parser.add_argument("--batch-size", type=int, default=256, help="PPO minibatch size (default: 256)")
+    parser.add_argument("--learner-threads", type=int, default=None, help="torch threads for the learner")
+    parser.add_argument("--total-timesteps", type=int, default=100_000, help="Total env steps (default: 100k)")
+    parser.add_argument("--checkpoint-freq", type=int, default=50_000, help="Save a checkpoint every N steps")
+    parser.add_argument("--tensorboard-log", type=str, default=str(TBOARD_DIR), help="Tensorboard log dir")
+    parser.add_argument("--model-dir", type=str, default=str(MODEL_DIR), help="Where to save models")
+    parser.add_argument("--rom", type=str, default=str(ROM_PATH), help="Path to ROM file")
+    parser.add_argument("--frame-skip", type=int, default=60, help="Emulator frames advanced per action (default: 60)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--preload-workers", action="store_true",
+                        help="Fork actors from a parent that has already loaded the emulator stack, ROM and "
+                             "start state")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.learner_threads:
+        th.set_num_threads(args.learner_threads)
+    Path(args.model_dir).mkdir(parents=True, exist_ok=True)
+    if args.preload_workers:
+        enable_preload(Path(args.rom), STATE_PATH)
+    trainer = AsyncPPO(
+        make_env_fn(rom_path=Path(args.rom), frame_skip=args.frame_skip),
+        num_actors=args.num_actors,
+        envs_per_actor=args.envs_per_actor,
+        n_steps=args.n_steps,
+        segments_per_update=args.segments_per_update,
+        queue_size=args.queue_size,
+        max_policy_lag=args.max_policy_lag,
+        batch_size=args.batch_size,
+        seed=args.seed,
+        tensorboard_log=args.tensorboard_log,
+        learning_rate=1e-4,
+        gamma=0.999,
+        device="cpu",
+    )
+    try:
+        start = time.time()
+        model = trainer.learn(args.total_timesteps, checkpoint_freq=args.checkpoint_freq,
+                              checkpoint_dir=args.model_dir)
+        final_path = Path(args.model_dir) / "ppo_medarot_async"
+        model.save(str(final_path))
+        print(f"Training finished. Trained for {model.num_timesteps} timesteps in {time.time() - start:.1f}s. "
+              f"Model saved to {final_path}")
+    finally:
+        trainer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,31 @@ from pathlib import Path
 import sys
 import argparse
 import time
+from functools import partial
 from typing import Callable
 
 import numpy as np
 from stable_baselines3 import PPO
 from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
-from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.callbacks import CheckpointCallback
+from stable_baselines3.common.callbacks import CallbackList
 from stable_baselines3.ppo import MultiInputPolicy
 
 # Ensure repo root is on sys.path so `import env...` works when running this file directly
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
+from env.episode_stats import EpisodeStatsWrapper
 from env.generic_env import GenericPyBoyEnv
-from pyboy import PyBoy
+from env.batched_vec_env import BatchedVecEnv
+from env.remote_env import AUTHKEY_ENV, resolve_authkey
+from env.remote_vec_env import RemoteVecEnv
+from env.state_cache import SHARED_STATE_CACHE
+from env.transition_cache import TransitionCache, volatile_addresses
+from training.autotune import BACKENDS, autotune, build_vec_env
+from training.callbacks import (EnvProfileCallback, EpisodeStatsCallback, ResumableCheckpointCallback,
+                                ThroughputCallback, TransitionCacheCallback)
+from training.checkpointing import CheckpointStore, load_checkpoint
+from training.worker_pool import enable_preload, make_pyboy, release_pyboy
 
 
 DATA_DIR = ROOT / "data"
@@ -25,17 +35,31 @@ STATE_PATH = DATA_DIR / "zero_state.state"
 LOG_DIR = ROOT / "logs" / "ppo_medarot_v2"
 TBOARD_DIR = ROOT / "logs" / "ppo_tensorboard_v2"
 MODEL_DIR = ROOT / "models"
+CHECKPOINT_DIR = MODEL_DIR / "checkpoints_v2"
 
 
-def make_env_fn(rom_path: Path = ROM_PATH, render: bool = False) -> Callable:
+def make_env_fn(rom_path: Path = ROM_PATH, render: bool = False, frame_skip: int = 60,
+                profile: bool = False, screen_obs: bool = False, screen_frames: int = 4,
+                screen_downsample: int = 2, transition_cache: int = 0) -> Callable:
     def _init():
         if not rom_path.exists():
             raise FileNotFoundError(f"ROM not found: {rom_path}. Place the ROM in the data/ folder.")
-        # Each environment creates its own PyBoy instance. Keep num_envs small by default.
-        pyboy = PyBoy(str(rom_path))
-        env = GenericPyBoyEnv(pyboy, debug=False, render_mode=None, state_path=STATE_PATH)
-        LOG_DIR.mkdir(parents=True, exist_ok=True)
-        return Monitor(env, filename=str(LOG_DIR / "monitor.csv"))
+        # Each environment owns a PyBoy instance. Keep num_envs small by default.
+        # Headless unless rendering; the SDL window also cannot share a process with torch.
+        # make_pyboy takes a preloaded emulator or ROM when --preload-workers set them up.
+        pyboy = make_pyboy(rom_path, window="SDL2" if render else "null")
+        cache = None
+        if transition_cache:
+            # frame counters and other bytes that change on their own from the start state
+            # stay out of the state key
+            pyboy.load_state(SHARED_STATE_CACHE.open(STATE_PATH))
+            cache = TransitionCache(transition_cache, ignore=volatile_addresses(pyboy))
+        env = GenericPyBoyEnv(pyboy, debug=False, render_mode=None, state_path=STATE_PATH, frame_skip=frame_skip,
+                              profile=profile, screen_obs=screen_obs, screen_frames=screen_frames,
+                              screen_downsample=screen_downsample, transition_cache=cache,
+                              release_emulator=None if render else partial(release_pyboy, rom_path=rom_path))
+        # Episode summaries travel back with the step infos; EpisodeStatsCallback logs them
+        return EpisodeStatsWrapper(env)
 
     return _init
 
@@ -44,58 +68,169 @@ def parse_args():
     parser = argparse.ArgumentParser(description="PPO training v2 - remote-friendly defaults")
     parser.add_argument("--num-envs", type=int, default=1, help="Number of parallel environments (default: 1)")
     parser.add_argument("--use-subproc", action="store_true", help="Use SubprocVecEnv (heavier) instead of DummyVecEnv")
+    parser.add_argument("--envs-per-worker", type=int, default=1,
+                        help="Host this many envs per worker process with BatchedVecEnv (default: 1, disabled)")
+    parser.add_argument("--transport", choices=["pipe", "shm"], default="pipe",
+                        help="How subprocess workers return step results; 'shm' uses shared memory (default: pipe)")
+    parser.add_argument("--remote-envs", type=str, default=None,
+                        help="Comma-separated host:port list of training/remote_env_server.py instances; their envs "
+                             "replace the local ones (--num-envs is then the servers' total)")
+    parser.add_argument("--authkey", type=str, default=None,
+                        help=f"Shared secret of the env servers (default: ${AUTHKEY_ENV})")
+    parser.add_argument("--preload-workers", action="store_true",
+                        help="Fork subprocess envs from a parent that has already imported the emulator stack and "
+                             "loaded the ROM, the start state and an emulator (faster startup, shared memory)")
     parser.add_argument("--total-timesteps", type=int, default=10000, help="Total timesteps to train (default: 10k for quick tests)")
     parser.add_argument("--checkpoint-freq", type=int, default=5000, help="Save checkpoint every N steps (default: 5k)")
+    parser.add_argument("--checkpoint-dir", type=str, default=str(CHECKPOINT_DIR),
+                        help="Where resumable checkpoints (model, optimizer, env states, RNG) are written")
+    parser.add_argument("--keep-checkpoints", type=int, default=3, help="Resumable checkpoints to keep (default: 3)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the latest checkpoint in --checkpoint-dir; --total-timesteps counts "
+                             "the steps already trained")
     parser.add_argument("--device", type=str, default="cpu", help="Training device: cpu or cuda (default: cpu)")
     parser.add_argument("--tensorboard-log", type=str, default=str(TBOARD_DIR), help="Tensorboard log dir")
     parser.add_argument("--model-dir", type=str, default=str(MODEL_DIR), help="Where to save models")
     parser.add_argument("--rom", type=str, default=str(ROM_PATH), help="Path to ROM file")
+    parser.add_argument("--frame-skip", type=int, default=60,
+                        help="Emulator frames advanced per action (default: 60)")
     parser.add_argument("--render", action="store_true", help="Enable render mode (slower)")
+    parser.add_argument("--profile-env", action="store_true",
+                        help="Time each phase of env.step() and log the timings to TensorBoard (env_profile/*)")
+    parser.add_argument("--transition-cache", type=int, default=0, metavar="ENTRIES",
+                        help="Replay up to this many memoized step results per env instead of emulating them "
+                             "(default: 0, off); hit rates are logged under transition_cache/")
+    parser.add_argument("--screen-obs", action="store_true",
+                        help="Add stacked grayscale screen frames to the observations (policy gets a CNN branch)")
+    parser.add_argument("--screen-frames", type=int, default=4,
+                        help="Screen frames stacked with --screen-obs (default: 4)")
+    parser.add_argument("--screen-downsample", type=int, default=2,
+                        help="Screen downsampling factor with --screen-obs: 2 gives 80x72 frames (default: 2)")
     parser.add_argument("--smoke", action="store_true", help="Run a single quick iteration and exit (for CI/smoke tests)")
+    parser.add_argument("--n-steps", type=int, default=2048, help="Rollout steps per env per update (default: 2048)")
+    parser.add_argument("--batch-size", type=int, default=256, help="PPO minibatch size (default: 256)")
+    parser.add_argument("--autotune", action="store_true",
+                        help="Measure short calibration runs and pick num_envs, backend, n_steps and batch_size "
+                             "that give the highest throughput within the budget below")
+    parser.add_argument("--autotune-envs", type=str, default="1,2,4,8",
+                        help="Comma-separated env counts to try (default: 1,2,4,8)")
+    parser.add_argument("--autotune-backends", type=str, default=",".join(BACKENDS),
+                        help=f"Comma-separated vec-env backends to try (default: {','.join(BACKENDS)})")
+    parser.add_argument("--autotune-n-steps", type=str, default="512,1024,2048",
+                        help="Comma-separated n_steps values to try (default: 512,1024,2048)")
+    parser.add_argument("--autotune-batch-sizes", type=str, default="64,128,256,512",
+                        help="Comma-separated batch sizes to try (default: 64,128,256,512)")
+    parser.add_argument("--max-memory-gb", type=float, default=None,
+                        help="Autotune budget: max resident memory of training plus env workers")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="Autotune budget: max env worker processes (default: CPU count)")
     return parser.parse_args()
 
 
+def parse_ints(text: str):
+    return [int(v) for v in text.split(",") if v]
+
+
 def main():
+    launch = time.perf_counter()
     args = parse_args()
 
     rom_path = Path(args.rom)
     num_envs = max(1, args.num_envs)
 
-    make_env = make_env_fn(rom_path=rom_path, render=args.render)
-
-    if args.use_subproc and num_envs > 1:
-        env_fns = [make_env for _ in range(num_envs)]
+    make_env = make_env_fn(rom_path=rom_path, render=args.render, frame_skip=args.frame_skip,
+                           profile=args.profile_env, screen_obs=args.screen_obs, screen_frames=args.screen_frames,
+                           screen_downsample=args.screen_downsample, transition_cache=args.transition_cache)
+    if args.preload_workers:
+        # before any worker process (autotune's included) is started
+        enable_preload(rom_path, STATE_PATH)
+
+    n_steps, batch_size = args.n_steps, args.batch_size
+    tuned = None
+    store = CheckpointStore(args.checkpoint_dir)
+    if args.resume:
+        latest = store.latest()
+        if latest is None:
+            raise SystemExit(f"--resume: no checkpoint in {args.checkpoint_dir}")
+        # the env states in the checkpoint fix the number of envs
+        num_envs = len(store.read_manifest(latest)["envs"])
+    elif args.autotune:
+        max_memory = int(args.max_memory_gb * 2**30) if args.max_memory_gb else None
+        tuned, _ = autotune(make_env, env_counts=parse_ints(args.autotune_envs),
+                            backends=args.autotune_backends.split(","),
+                            n_steps_options=parse_ints(args.autotune_n_steps),
+                            batch_sizes=parse_ints(args.autotune_batch_sizes),
+                            max_memory_bytes=max_memory, max_workers=args.max_workers,
+                            envs_per_worker=max(2, args.envs_per_worker),
+                            ppo_kwargs={"learning_rate": 1e-4, "gamma": 0.999, "device": args.device})
+        if tuned is None:
+            raise SystemExit("Autotune found no configuration within the budget")
+        num_envs, n_steps, batch_size = tuned.num_envs, tuned.n_steps, tuned.batch_size
+        print(f"Autotune selected backend={tuned.backend} num_envs={num_envs} n_steps={n_steps} "
+              f"batch_size={batch_size} (predicted {tuned.sps:.0f} steps/s)")
+
+    env_fns = [make_env for _ in range(num_envs)]
+    if args.remote_envs:
+        try:
+            authkey = resolve_authkey(args.authkey)
+        except ValueError as e:
+            raise SystemExit(f"{e}: pass --authkey or set {AUTHKEY_ENV}")
+        # Envs hosted on other machines, stepped over TCP
+        vec_env = RemoteVecEnv(args.remote_envs.split(","), authkey)
+        num_envs = vec_env.num_envs
+    elif tuned is not None:
+        vec_env = build_vec_env(tuned.backend, env_fns, envs_per_worker=max(2, args.envs_per_worker))
+    elif args.envs_per_worker > 1 or (args.use_subproc and args.transport == "shm"):
+        # Each worker process steps a block of envs and returns the block as arrays
+        # (through shared memory with --transport shm)
+        vec_env = BatchedVecEnv(env_fns, envs_per_worker=args.envs_per_worker, transport=args.transport)
+    elif args.use_subproc and num_envs > 1:
         vec_env = SubprocVecEnv(env_fns)
     else:
-        env_fns = [make_env for _ in range(num_envs)]
         vec_env = DummyVecEnv(env_fns)
+    print(f"{num_envs} env(s) ready in {time.perf_counter() - launch:.1f}s")
 
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
     TBOARD_DIR.mkdir(parents=True, exist_ok=True)
     LOG_DIR.mkdir(parents=True, exist_ok=True)
 
-    # Checkpoint callback saves intermediate models to allow resuming and remote-safe behavior
-    checkpoint_cb = CheckpointCallback(save_freq=args.checkpoint_freq, save_path=str(MODEL_DIR), name_prefix="ppo_v2")
-
-    # Build model with conservative defaults to avoid overheating user's hardware
-    model = PPO(
-        MultiInputPolicy,
-        vec_env,
-        verbose=1,
-        learning_rate=1e-4,
-        n_steps=2048,
-        batch_size=256,
-        gamma=0.999,
-        tensorboard_log=args.tensorboard_log,
-        device=args.device,
-    )
+    # Resumable checkpoints: model and optimizer plus every env's emulator state, exploration memory and RNG
+    checkpoint_cb = ResumableCheckpointCallback(args.checkpoint_freq, store, keep=args.keep_checkpoints, verbose=1)
+    # Rollout vs. update time and env/emulator throughput, logged under throughput/
+    callbacks = [checkpoint_cb, ThroughputCallback(frame_skip=args.frame_skip, start_time=launch, verbose=1)]
+    # Episode return, length, exploration and target rate from all envs: one log in
+    # LOG_DIR/episodes and rolling means under episode_stats/
+    callbacks.append(EpisodeStatsCallback(LOG_DIR / "episodes"))
+    if args.profile_env:
+        callbacks.append(EnvProfileCallback())
+    if args.transition_cache:
+        callbacks.append(TransitionCacheCallback())
+
+    if args.resume:
+        model = load_checkpoint(store, vec_env, device=args.device, tensorboard_log=args.tensorboard_log)
+        print(f"Resuming from checkpoint {store.latest()} at {model.num_timesteps} timesteps")
+    else:
+        # Build model with conservative defaults to avoid overheating user's hardware
+        model = PPO(
+            MultiInputPolicy,
+            vec_env,
+            verbose=1,
+            learning_rate=1e-4,
+            n_steps=n_steps,
+            batch_size=batch_size,
+            gamma=0.999,
+            tensorboard_log=args.tensorboard_log,
+            device=args.device,
+        )
 
     timesteps = args.total_timesteps
     if args.smoke:
         timesteps = 256
 
     start = time.time()
-    model.learn(total_timesteps=timesteps, callback=checkpoint_cb)
+    # On resume the restored observations are kept and the step counter continues
+    model.learn(total_timesteps=max(0, timesteps - model.num_timesteps), callback=CallbackList(callbacks),
+                reset_num_timesteps=not args.resume)
     elapsed = time.time() - start
 
     final_path = Path(args.model_dir) / "ppo_medarot_v2"
@@ -0,0 +1,148 @@
+"""Env worker processes forked from a preloaded parent.
+
+By default every subprocess env starts from scratch: the forkserver starts a bare
+interpreter for each worker, which re-imports the training script (NumPy, torch,
+Stable-Baselines3, PyBoy), reads the ROM and the start state from disk and boots
+a new emulator. With many workers this makes startup slow, and none of that memory
+is shared.
+
+``enable_preload(rom_path, state_path)`` moves that work into the forkserver
+process itself, which every worker is forked from:
+
+- the training script (``__main__``) is imported there once, so workers inherit
+  its modules instead of importing them again
+- the ROM bytes and the start-state buffer (put into ``SHARED_STATE_CACHE``) are
+  read once and shared copy-on-write by all workers
+- optionally one emulator is booted and restored to the start state, so each
+  worker's first env takes a ready emulator instead of building one
+
+Env factories get emulators from ``make_pyboy()``, which uses the preloaded
+emulator or ROM bytes when there are any and falls back to ``PyBoy(rom_path)``
+otherwise, so the same ``make_env`` works with and without preloading. Passing
+``release_pyboy`` as ``GenericPyBoyEnv(release_emulator=...)`` returns an env's
+emulator to this process's free list on ``close()``, and the next env built in
+the worker reuses it instead of booting another one. (Within an env, ``reset()``
+already only restores the cached start state into the existing emulator.)
+
+``enable_preload`` must be called before the first worker process is started:
+the forkserver is started once per program and keeps its preloaded modules.
+PyBoy is imported lazily, so this module can be imported without it.
+"""
+import json
+import multiprocessing as mp
+import os
+import runpy
+import sys
+import time
+import types
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Union
+
+from env.state_cache import SHARED_STATE_CACHE
+
+PRELOAD_ENV = "PYBOY_WORKER_PRELOAD"
+
+# resolved ROM path -> ROM contents, filled by the preload
+_roms: Dict[str, bytes] = {}
+# resolved ROM path -> emulators ready to be handed to the next env in this process
+_free: Dict[str, List] = {}
+_preload_sec = 0.0
+
+
+def _rom_key(rom_path: Union[str, Path]) -> str:
+    return str(Path(rom_path).resolve())
+
+
+def enable_preload(rom_path: Union[str, Path], state_path: Union[str, Path], emulator: bool = True,
+                   main_module: bool = True):
+    """Preload the ROM, the start state and (with ``main_module``) the training script's
+    imports in the forkserver that subprocess envs are forked from.
+
+    With ``emulator=True`` one headless emulator is also booted there and loaded with
+    the start state. Affects ``SubprocVecEnv``, ``BatchedVecEnv`` and any other user of
+    the ``forkserver`` start method.
+    """
+    if "forkserver" not in mp.get_all_start_methods():
+        raise RuntimeError("Worker preloading needs the 'forkserver' start method, which this platform lacks")
+    main = sys.modules["__main__"]
+    main_path = getattr(main, "__file__", None) if getattr(main, "__spec__", None) is None else None
+    config = {"rom": _rom_key(rom_path), "state": str(Path(state_path).resolve()), "emulator": emulator,
+              "main": os.path.normpath(main_path) if main_module and main_path else None, "parent": os.getpid()}
+    # read by the forkserver when it imports this module (the environment is inherited)
+    os.environ[PRELOAD_ENV] = json.dumps(config)
+    mp.set_forkserver_preload([__name__])
+
+
+def _import_main(main_path: str):
+    # What multiprocessing does in every child before unpickling its target. Done once
+    # here, the children find the script already imported and skip it. (Passing
+    # "__main__" to set_forkserver_preload is meant to do this, but Python 3.11 never
+    # hands the script's path to the forkserver.)
+    process = mp.current_process()
+    process._inheriting = True
+    try:
+        module = types.ModuleType("__mp_main__")
+        module.__dict__.update(runpy.run_path(main_path, run_name="__mp_main__"))
+    finally:
+        del process._inheriting
+    sys.modules["__main__"] = sys.modules["__mp_main__"] = module
+
+
+def _preload(config: Dict):
+    global _preload_sec
+    start = time.perf_counter()
+    if config["main"]:
+        _import_main(config["main"])
+    key = config["rom"]
+    _roms[key] = Path(key).read_bytes()
+    SHARED_STATE_CACHE.get(config["state"])
+    if config["emulator"]:
+        from pyboy import PyBoy
+
+        pyboy = PyBoy(BytesIO(_roms[key]), window="null")
+        pyboy.load_state(SHARED_STATE_CACHE.open(config["state"]))
+        _free.setdefault(key, []).append(pyboy)
+    _preload_sec = time.perf_counter() - start
+
+
+def make_pyboy(rom_path: Union[str, Path], window: str = "null", **kwargs):
+    """A PyBoy instance for ``rom_path``: a free (preloaded or released) headless
+    emulator if this process has one, else a new one, booted from the preloaded ROM
+    bytes when available."""
+    key = _rom_key(rom_path)
+    free = _free.get(key)
+    if free and window == "null" and not kwargs:
+        return free.pop()
+    from pyboy import PyBoy
+
+    rom = _roms.get(key)
+    return PyBoy(BytesIO(rom) if rom is not None else key, window=window, **kwargs)
+
+
+def release_pyboy(pyboy, rom_path: Union[str, Path]):
+    """Keep ``pyboy`` for the next ``make_pyboy(rom_path)`` call in this process."""
+    _free.setdefault(_rom_key(rom_path), []).append(pyboy)
+
+
+def preload_info() -> Dict:
+    """What this process inherited or holds: preloaded ROMs, free emulators, preload time."""
+    return {
+        "roms": sorted(_roms),
+        "free_emulators": {key: len(pyboys) for key, pyboys in _free.items()},
+        "cached_states": len(SHARED_STATE_CACHE),
+        "preload_sec": _preload_sec,
+    }
+
+
+def _preload_from_environ():
+    raw = os.environ.get(PRELOAD_ENV)
+    if not raw:
+        return
+    config = json.loads(raw)
+    # the launching process only configures the preload; its children do it
+    if config["parent"] != os.getpid():
+        _preload(config)
+
+
+_preload_from_environ()